@@ -1,15 +1,84 @@
 from celery import Celery
+from kombu.serialization import register
+import ormsgpack
+import os
 import warnings
 warnings.filterwarnings("ignore")
 
+from app.services.worker_lifecycle import configure_worker
+
+# Compact binary encoding for task arguments and result metadata; image bytes
+# themselves live in the blob store (app.services.blob_store)
+register(
+    "ormsgpack",
+    lambda obj: ormsgpack.packb(obj, option=ormsgpack.OPT_NON_STR_KEYS | ormsgpack.OPT_SERIALIZE_NUMPY),
+    ormsgpack.unpackb,
+    content_type="application/x-ormsgpack",
+    content_encoding="binary"
+)
+
 celery_app = Celery(
     "worker",
     broker="redis://localhost:6379/0",
     backend="redis://localhost:6379/0"
 )
 
+celery_app.conf.update(
+    task_serializer="ormsgpack",
+    result_serializer="ormsgpack",
+    accept_content=["ormsgpack", "json"],
+    result_accept_content=["ormsgpack", "json"],
+    # Results are only polled shortly after completion; let Redis drop them
+    result_expires=int(os.getenv("CELERY_RESULT_EXPIRES_S", "3600"))
+)
+
+# Preload/recycling hooks (WORKER_PRELOAD_MODE, CELERY_MAX_TASKS_PER_CHILD, CELERY_MAX_MEMORY_PER_CHILD_MB)
+configure_worker(celery_app)
+
 celery_app.conf.task_routes = {
-    "app.services.image_tasks.generate_image_task": {"queue": "image_queue"}
+    "app.services.image_tasks.generate_image_task": {"queue": "image_queue"},
+    "app.services.image_tasks.generate_image_batched_task": {"queue": "image_queue"},
+    "app.services.caption_tasks.generate_caption_task": {"queue": "caption_queue"},
+    "app.services.caption_tasks.generate_multi_persona_captions_task": {"queue": "caption_queue"}
 }
 
-import app.services.image_tasks
\ No newline at end of file
+# Priority lanes inside every queue. With the Redis transport 0 is served first,
+# so interactive requests overtake bulk campaign jobs waiting in the same queue
+PRIORITY_LANES = {
+    "interactive": 0,
+    "default": 5,
+    "bulk": 9
+}
+
+celery_app.conf.update(
+    broker_transport_options={
+        "priority_steps": sorted(PRIORITY_LANES.values()),
+        "sep": ":",
+        "queue_order_strategy": "priority"
+    },
+    task_default_priority=PRIORITY_LANES["default"],
+    # Prefetched messages skip the priority order, so only reserve one at a time
+    worker_prefetch_multiplier=1,
+    # Per-worker rate limits; captions are cheap, image renders are throttled by concurrency instead
+    task_annotations={
+        "app.services.caption_tasks.generate_caption_task": {
+            "rate_limit": os.getenv("CAPTION_TASK_RATE_LIMIT", "120/m")
+        },
+        "app.services.caption_tasks.generate_multi_persona_captions_task": {
+            "rate_limit": os.getenv("CAPTION_FANOUT_RATE_LIMIT", "30/m")
+        },
+        "app.services.image_tasks.generate_image_task": {
+            "rate_limit": os.getenv("IMAGE_TASK_RATE_LIMIT")
+        }
+    }
+)
+
+
+def send_task_in_lane(task, data: dict, lane: str = "interactive"):
+    """Queue a task with the priority of the given lane (interactive, default or bulk)"""
+    if lane not in PRIORITY_LANES:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    return task.apply_async(args=[data], priority=PRIORITY_LANES[lane])
+
+import app.services.image_tasks
+import app.services.caption_tasks
@@ -1,31 +1,279 @@
-from fastapi import FastAPI
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from app.services.week4_image_generator import generate_image
+from starlette.concurrency import iterate_in_threadpool
+from app.services.week4_image_generator import generate_image, generate_image_exports
+from app.utils.output_profiles import FORMAT_EXTENSIONS, PLATFORM_PROFILES
+from app.services.image_writer import get_image_writer
+from app.services.output_store import KEY_PATTERN, THUMBNAIL_SIZES, get_output_store
+from app.services.job_queue import get_job_queue, QueueFullError
+from app.services.caption_generator import get_caption_generator
+from app.services.model_warmup import get_model_warmup
+from app.services.quality_policy import get_quality_policy
+from app.services.semantic_cache import flush_semantic_cache
+from app.utils.brand_personas import get_persona
+from app.utils.metrics import get_metrics
+from app.utils.model_pool import get_model_pool
+from app.utils.generation_engine import shutdown_generation_engine
 
-app = FastAPI(title="Multi-Modal Social Media Generator API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load models in the background so liveness checks answer while they warm up
+    get_model_warmup().start()
+    yield
+    # Write out images still queued in the background writer before exiting
+    get_image_writer().flush()
+    flush_semantic_cache()
+    shutdown_generation_engine()
+
+app = FastAPI(title="Multi-Modal Social Media Generator API", lifespan=lifespan)
 
 # Input model
 class ImageRequest(BaseModel):
     brief: str
     style: str = "product_ad"
     quality: str = "high"
+    profiles: List[str] = []
+
+def _register_metrics():
+    """Gauges sampled at scrape time, so the request path never touches them"""
+    metrics = get_metrics()
+    metrics.register_callback("job_queue_depth", "Jobs queued or running", lambda: get_job_queue().depth())
+    metrics.register_callback("image_writer_pending", "Images waiting to be written",
+                              lambda: get_image_writer().get_stats()["pending"])
+    metrics.register_callback("model_pool_memory_bytes", "Estimated memory of loaded models",
+                              lambda: get_model_pool().memory_bytes())
+    metrics.register_callback(
+        "model_loaded", "1 if the model is loaded",
+        lambda: {key: int(model["loaded"]) for key, model in get_model_pool().get_stats()["models"].items()},
+        ("model",)
+    )
+
+_register_metrics()
 
 # Root endpoint
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Multi-Modal Social Media Generator API!"}
 
+# Liveness endpoint
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+# Metrics endpoint
+@app.get("/metrics")
+def metrics():
+    """
+    Output: Prometheus text format with per-stage latency histograms, request
+    and token counters, queue depth and model gauges (404 unless METRICS_ENABLED)
+    """
+    registry = get_metrics()
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (set METRICS_ENABLED=1)")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Readiness endpoint
+@app.get("/health/ready")
+def health_ready():
+    """
+    Output: 200 once every configured model is loaded and warmed,
+    503 before that (or if a model failed), with per-model load/warm-up times
+    """
+    status = get_model_warmup().get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def _run_generation(brief: str, style: str, quality: str, profiles: Optional[list] = None) -> dict:
+    """Background job body for /result"""
+    # Under queue pressure the policy may serve a cheaper tier to stay within the latency target
+    policy = get_quality_policy()
+    plan = policy.plan(quality, queue_depth=max(0, get_job_queue().depth() - 1))
+    # The served tier's steps and resolution go to the model, so degrading actually saves render time
+    render_settings = {name: plan[name] for name in ("num_inference_steps", "height", "width")}
+    started = time.perf_counter()
+    exports = None
+    if profiles:
+        # Exports land next to the render in the output store
+        rendered = generate_image_exports(brief, style=style, quality=plan["quality"],
+                                          output_profiles=profiles, render_settings=render_settings)
+        image_path, exports = rendered["image_path"], rendered["exports"]
+    else:
+        image_path = generate_image(brief, style=style, quality=plan["quality"], render_settings=render_settings)
+    policy.record(plan["quality"], time.perf_counter() - started)
+    result = {
+        "brief": brief,
+        "style": style,
+        "quality": plan["quality"],
+        "requested_quality": plan["requested_quality"],
+        "quality_degraded": plan["degraded"],
+        "image_path": image_path
+    }
+    if exports is not None:
+        result["exports"] = exports
+    key = get_output_store().key_for_path(image_path)
+    if key is not None:
+        result["image_url"] = f"/images/{key}"
+        result["thumbnail_url"] = f"/images/{key}/thumbnail"
+        for name, export in (exports or {}).items():
+            export["url"] = f"/images/{key}/exports/{name}"
+    return result
+
 # Result endpoint
-@app.post("/result")
-def generate_result(request: ImageRequest):
+@app.post("/result", status_code=202)
+async def generate_result(request: ImageRequest):
     """
-    Input: User brief, style, quality
-    Output: Path to generated image
+    Input: User brief, style, quality and optional platform profiles
+    (e.g. ["instagram_square", "linkedin"]) exported from the same render
+    Output: Job id to poll at GET /result/{job_id}
     """
-    image_path = generate_image(request.brief, style=request.style, quality=request.quality)
+    unknown = [name for name in request.profiles if name not in PLATFORM_PROFILES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown output profiles: {unknown}")
+    try:
+        job_id = get_job_queue().submit(
+            _run_generation, request.brief, request.style, request.quality, request.profiles
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     return {
-        "brief": request.brief,
-        "style": request.style,
-        "quality": request.quality,
-        "image_path": image_path
-    }
\ No newline at end of file
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/result/{job_id}"
+    }
+
+# Job status endpoint
+@app.get("/result/{job_id}")
+async def get_result(job_id: str):
+    """
+    Output: Job status (queued, running, done, failed) and, once done,
+    the brief, style, quality, path to the generated image and its
+    image_url / thumbnail_url (plus a url for each platform export)
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+# Stored renders are content-addressed, so a URL never changes content
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def _image_response(request: Request, path: str, etag: str, media_type: str):
+    """Chunked file response with a strong ETag; FileResponse answers Range/If-Range requests"""
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def _stored_image_path(key: str) -> str:
+    if not KEY_PATTERN.match(key) or get_output_store().get(key) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image: {key}")
+    path = get_output_store().path_for(key)
+    # The render may still be in the background writer's queue
+    try:
+        get_image_writer().wait(path, timeout=30)
+    except Exception as e:
+        print(f"[API] Image {key} was not written: {e}")
+    # The index row is added before the write, so a failed or lost write leaves no file
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Unknown image: {key}")
+    return path
+
+# Image endpoint
+@app.get("/images/{key}")
+def get_image(key: str, request: Request):
+    """
+    Input: Image key from image_url in a job result
+    Output: The PNG, with a strong ETag (304 on If-None-Match), Range support
+    and a one-year immutable Cache-Control
+    """
+    return _image_response(request, _stored_image_path(key), f'"{key}"', "image/png")
+
+# Thumbnail endpoint
+@app.get("/images/{key}/thumbnail")
+def get_thumbnail(key: str, request: Request, size: int = 256):
+    """
+    Input: Image key and edge length (128, 256 or 512)
+    Output: WebP preview, rendered on the first request and served from disk afterwards
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(THUMBNAIL_SIZES)}")
+    _stored_image_path(key)
+    path = get_output_store().thumbnail(key, size)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image: {key}")
+    return _image_response(request, path, f'"{key}-{size}"', "image/webp")
+
+# Platform export endpoint
+@app.get("/images/{key}/exports/{profile}")
+def get_export(key: str, profile: str, request: Request):
+    """
+    Input: Image key and a profile the job was submitted with (see "url" in its exports)
+    Output: The exported file, cached like the full image
+    """
+    if not KEY_PATTERN.match(key) or profile not in PLATFORM_PROFILES:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {key}/{profile}")
+    image_format = PLATFORM_PROFILES[profile].format
+    path = get_output_store().export_path(key, profile, FORMAT_EXTENSIONS[image_format])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Unknown export: {key}/{profile}")
+    return _image_response(request, path, f'"{key}-{profile}"', f"image/{image_format.lower()}")
+
+def _sse(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+# Streaming caption endpoint
+@app.get("/captions/stream")
+async def stream_caption(request: Request, product_description: str, persona_key: str):
+    """
+    Input: Product description and brand persona key
+    Output: text/event-stream of caption tokens as they are generated,
+    followed by a "done" event with the full caption
+    """
+    if not get_persona(persona_key):
+        raise HTTPException(status_code=404, detail=f"Unknown persona: {persona_key}")
+
+    cancel_event = threading.Event()
+    tokens = get_caption_generator().stream_caption(
+        product_description, persona_key, cancel_event=cancel_event
+    )
+
+    async def event_stream():
+        parts = []
+        try:
+            async for token in iterate_in_threadpool(tokens):
+                if await request.is_disconnected():
+                    break
+                parts.append(token)
+                yield _sse({"token": token})
+            else:
+                yield _sse({"caption": "".join(parts).strip()}, event="done")
+        except Exception as e:
+            yield _sse({"error": str(e)}, event="error")
+        finally:
+            # Stop burning CPU on generations nobody is listening to
+            cancel_event.set()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
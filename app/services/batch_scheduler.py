@@ -0,0 +1,204 @@
+"""
+Micro-batching scheduler for the Stable Diffusion pipeline
+Collects concurrent render requests that share the same generation parameters
+and runs them as a single batched pipeline call
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+# What each caller gets back from a batched render
+BatchedImage = namedtuple("BatchedImage", ["image", "batch_size", "queue_wait_ms"])
+
+
+class _PendingRender:
+    """A single render request waiting to be batched"""
+
+    def __init__(self, prompt: str, seed=None):
+        self.prompt = prompt
+        self.seed = seed
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """Group concurrent render requests into batched pipeline calls"""
+
+    def __init__(self, render_fn, max_batch_size: int = 4, max_wait_ms: float = 50.0,
+                 isolate_failures: bool = True):
+        """
+        Args:
+            render_fn: Callable(prompts, height, width, num_inference_steps, guidance_scale, seeds)
+                returning one image per prompt
+            max_batch_size: Maximum number of prompts per pipeline call
+            max_wait_ms: How long the first request of a batch waits for company
+            isolate_failures: When a batched call fails, retry its requests one by one
+                so a single bad prompt only fails its own caller
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.render_fn = render_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.isolate_failures = isolate_failures
+
+        # Pending requests grouped by (height, width, steps, guidance_scale)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._worker = None
+        self._stopped = False
+
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._requests = 0
+        self._batch_size_counts = {}
+        self._total_wait_ms = 0.0
+        self._max_wait_seen_ms = 0.0
+        self._failed_batches = 0
+
+    def submit(self,
+               prompt: str,
+               height: int = 512,
+               width: int = 512,
+               num_inference_steps: int = 50,
+               guidance_scale: float = 7.5,
+               seed=None) -> Future:
+        """
+        Queue a prompt for rendering
+
+        Requests are only batched with others that share size, steps and
+        guidance scale; seeds are per request
+
+        Returns:
+            Future resolving to a BatchedImage
+        """
+        key = (height, width, num_inference_steps, guidance_scale)
+        request = _PendingRender(prompt, seed)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Batch scheduler has been shut down")
+            self._pending.setdefault(key, []).append(request)
+            self._ensure_worker()
+            self._cond.notify()
+        return request.future
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="image-batch-scheduler", daemon=True
+            )
+            self._worker.start()
+
+    def _next_batch(self):
+        """Block until a batch is ready; returns (key, requests) or None on shutdown"""
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            # Serve the group whose oldest request has waited the longest
+            key = min(self._pending, key=lambda k: self._pending[k][0].enqueued_at)
+            deadline = self._pending[key][0].enqueued_at + self.max_wait_ms / 1000.0
+            while len(self._pending[key]) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            group = self._pending[key]
+            batch = group[:self.max_batch_size]
+            del group[:self.max_batch_size]
+            if not group:
+                del self._pending[key]
+            return key, batch
+
+    def _run(self):
+        while True:
+            item = self._next_batch()
+            if item is None:
+                return
+            key, batch = item
+            self._execute(key, batch)
+
+    def _execute(self, key, batch):
+        height, width, steps, guidance_scale = key
+        started = time.monotonic()
+        waits = [(started - request.enqueued_at) * 1000.0 for request in batch]
+        self._record(len(batch), waits)
+
+        try:
+            images = self.render_fn(
+                [request.prompt for request in batch],
+                height, width, steps, guidance_scale,
+                [request.seed for request in batch]
+            )
+            if len(images) != len(batch):
+                raise RuntimeError(
+                    f"Pipeline returned {len(images)} images for {len(batch)} prompts"
+                )
+        except Exception as e:
+            with self._stats_lock:
+                self._failed_batches += 1
+            if self.isolate_failures and len(batch) > 1:
+                print(f"Batched render of {len(batch)} prompts failed ({e}), retrying one by one")
+                for request, wait_ms in zip(batch, waits):
+                    self._execute_single(key, request, wait_ms)
+                return
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, image, wait_ms in zip(batch, images, waits):
+            request.future.set_result(BatchedImage(image, len(batch), round(wait_ms, 2)))
+
+    def _execute_single(self, key, request, wait_ms: float):
+        height, width, steps, guidance_scale = key
+        try:
+            image = self.render_fn([request.prompt], height, width, steps, guidance_scale, [request.seed])[0]
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.future.set_result(BatchedImage(image, 1, round(wait_ms, 2)))
+
+    def _record(self, batch_size: int, waits: list):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += batch_size
+            self._batch_size_counts[batch_size] = self._batch_size_counts.get(batch_size, 0) + 1
+            self._total_wait_ms += sum(waits)
+            self._max_wait_seen_ms = max([self._max_wait_seen_ms] + waits)
+
+    def queue_depth(self) -> int:
+        """Number of requests waiting to be batched"""
+        with self._cond:
+            return sum(len(group) for group in self._pending.values())
+
+    def get_stats(self) -> dict:
+        """Batch size and queue wait statistics"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "batch_size_counts": dict(self._batch_size_counts),
+                "avg_queue_wait_ms": round(self._total_wait_ms / self._requests, 2) if self._requests else 0.0,
+                "max_queue_wait_ms": round(self._max_wait_seen_ms, 2),
+                "failed_batches": self._failed_batches,
+                "queue_depth": self.queue_depth()
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the scheduler; already queued requests are still rendered"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait and self._worker is not None:
+            self._worker.join()
@@ -0,0 +1,163 @@
+"""
+Pluggable blob storage for rendered images
+Workers upload the image bytes here and hand back a small reference, so the
+Celery result backend only carries metadata and the API can fetch the bytes
+from any host that sees the same store
+"""
+
+import mimetypes
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import xxhash
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp"
+}
+
+
+class BlobNotFoundError(KeyError):
+    """Raised when a blob key is not in the store"""
+
+
+class BlobStore(ABC):
+    """Content-addressed blob store interface"""
+
+    @staticmethod
+    def make_key(data: bytes, content_type: str) -> str:
+        """Key derived from the content, so identical renders are stored once"""
+        return xxhash.xxh3_128_hexdigest(data) + CONTENT_TYPE_EXTENSIONS.get(content_type, ".bin")
+
+    def put(self, data: bytes, content_type: str = "image/png") -> dict:
+        """
+        Store bytes
+
+        Returns:
+            Reference dictionary with key, bytes and content_type
+        """
+        key = self.make_key(data, content_type)
+        self._write(key, data)
+        return {"key": key, "bytes": len(data), "content_type": content_type}
+
+    def put_file(self, path: str, content_type: Optional[str] = None) -> dict:
+        """Store the contents of a local file"""
+        content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as f:
+            return self.put(f.read(), content_type)
+
+    @abstractmethod
+    def _write(self, key: str, data: bytes):
+        """Store data under key (a no-op if the key already exists)"""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Bytes of a blob; raises BlobNotFoundError for unknown keys"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a blob is stored under key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a blob (a no-op for unknown keys)"""
+
+
+class FilesystemBlobStore(BlobStore):
+    """Blobs as files under a (typically shared/NFS) directory, fanned out by key prefix"""
+
+    def __init__(self, root: str = "generated_images/blobs"):
+        """
+        Args:
+            root: Directory every worker and API host can reach
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if os.sep in key or "/" in key or key.startswith("."):
+            raise ValueError(f"Invalid blob key: {key}")
+        return os.path.join(self.root, key[:2], key)
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file in the same directory, then rename, so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def path(self, key: str) -> str:
+        """Local path of a blob (for sendfile-style responses)"""
+        return self._path(key)
+
+
+class InMemoryBlobStore(BlobStore):
+    """Process-local stand-in for tests and single-host development"""
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def _write(self, key: str, data: bytes):
+        with self._lock:
+            self._blobs[key] = data
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            if key not in self._blobs:
+                raise BlobNotFoundError(key)
+            return self._blobs[key]
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return key in self._blobs
+
+    def delete(self, key: str):
+        with self._lock:
+            self._blobs.pop(key, None)
+
+
+# Create a global instance
+_blob_store = None
+
+def get_blob_store() -> BlobStore:
+    """Get or create the blob store selected by BLOB_STORE (filesystem or memory)"""
+    global _blob_store
+    if _blob_store is None:
+        kind = os.getenv("BLOB_STORE", "filesystem")
+        if kind == "memory":
+            _blob_store = InMemoryBlobStore()
+        elif kind == "filesystem":
+            _blob_store = FilesystemBlobStore(os.getenv("BLOB_STORE_DIR", "generated_images/blobs"))
+        else:
+            raise ValueError(f"Unknown blob store: {kind}")
+    return _blob_store
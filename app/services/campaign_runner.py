@@ -0,0 +1,316 @@
+"""
+Offline bulk campaign runner
+Streams a JSONL file of briefs, generates captions and images with bounded
+concurrency and writes the results incrementally as Parquet part files.
+A checkpoint records every finished row, so a crashed run resumes where it
+stopped instead of starting over. Rows that failed are only tried again with
+--retry-errors; the retry lands in a newer part, and read_campaign() keeps
+the latest record of every row
+
+Input rows:
+    {"brief": "Red running shoes", "persona": "luxury_brand", "style": "product_ad",
+     "quality": "high", "num_captions": 2}
+
+Usage:
+    python -m app.services.campaign_runner campaign.jsonl campaign_out/ --concurrency 4 [--retry-errors]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("row", pa.int64()),
+        ("brief", pa.string()),
+        ("persona", pa.string()),
+        ("style", pa.string()),
+        ("quality", pa.string()),
+        ("captions", pa.list_(pa.string())),
+        ("image_path", pa.string()),
+        ("error", pa.string()),
+        ("seconds", pa.float64())
+    ])
+
+
+def _default_caption_fn(brief: str, persona: str, num_captions: int) -> list:
+    from app.services.caption_generator import get_caption_generator
+    captions = get_caption_generator().generate_caption(brief, persona, num_captions=num_captions)
+    if isinstance(captions, dict):
+        raise RuntimeError(captions.get("error", "caption generation failed"))
+    return captions
+
+
+def _default_image_fn(brief: str, style: str, quality: str) -> str:
+    from app.services.image_generator import get_image_generator
+    from app.services.image_writer import get_image_writer
+    result = get_image_generator().generate_image(brief, style=style, quality=quality)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    # The render is written in the background; a row is only done once its file is on disk
+    return get_image_writer().wait(result["image_path"])
+
+
+def _read_rows(input_path: str):
+    """Yield (row index, row dict, error) for every non-empty line; lines that do not parse have row None"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        index = 0
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row, error = None, None
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+            except ValueError as e:  # JSONDecodeError included
+                row = None
+                error = f"Invalid row on line {line_number}: {e}"
+            yield index, row, error
+            index += 1
+
+
+def _count_rows(input_path: str) -> int:
+    with open(input_path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+class _Checkpoint:
+    """Finished rows and the part files holding them, rewritten atomically after each part"""
+
+    def __init__(self, output_dir: str, retry_errors: bool = False):
+        self.path = os.path.join(output_dir, CHECKPOINT_FILE)
+        self.parts = []
+        self.done = set()
+        self.failed = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.parts = state["parts"]
+            for part in self.parts:
+                self._record(part["rows"], part.get("errors", []))
+        if retry_errors:
+            self.done -= self.failed
+        # A part written just before a crash is not in the checkpoint; its rows get redone
+        known = {part["file"] for part in self.parts}
+        for name in os.listdir(output_dir):
+            if name.startswith("part-") and name not in known:
+                os.remove(os.path.join(output_dir, name))
+
+    def _record(self, rows: list, errors: list):
+        # Later parts supersede earlier ones, so a retried row that succeeded is no longer failed
+        self.done.update(rows)
+        self.failed.difference_update(rows)
+        self.failed.update(errors)
+
+    def next_part_name(self) -> str:
+        return f"part-{len(self.parts):05d}.parquet"
+
+    def commit(self, part_name: str, rows: list, errors: list):
+        self.parts.append({"file": part_name, "rows": rows, "errors": errors})
+        self._record(rows, errors)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"parts": self.parts}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def _new_record(index: int, row: dict) -> dict:
+    return {
+        "row": index,
+        "brief": str(row.get("brief") or ""),
+        "persona": row.get("persona"),
+        "style": row.get("style") or "product_ad",
+        "quality": row.get("quality") or "high",
+        "captions": [],
+        "image_path": None,
+        "error": None
+    }
+
+
+def _invalid_record(index: int, error: str) -> dict:
+    """Output row for an input line that could not be parsed, so the checkpoint moves past it"""
+    record = _new_record(index, {})
+    record["error"] = error
+    record["seconds"] = 0.0
+    return record
+
+
+def _process_row(index: int, row: dict, caption_fn, image_fn) -> dict:
+    started = time.perf_counter()
+    record = _new_record(index, row)
+    try:
+        if caption_fn is not None and record["persona"]:
+            record["captions"] = list(caption_fn(record["brief"], record["persona"], int(row.get("num_captions", 1))))
+        if image_fn is not None:
+            record["image_path"] = image_fn(record["brief"], record["style"], record["quality"])
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_campaign(input_path: str,
+                 output_dir: str,
+                 concurrency: int = 2,
+                 flush_rows: int = 100,
+                 captions: bool = True,
+                 images: bool = True,
+                 progress: bool = True,
+                 caption_fn=None,
+                 image_fn=None,
+                 retry_errors: bool = False) -> dict:
+    """
+    Run every row of a campaign file, resuming from the checkpoint in output_dir
+
+    Args:
+        input_path: JSONL file with one brief per row
+        output_dir: Directory for Parquet part files and the checkpoint
+        concurrency: Rows processed at the same time
+        flush_rows: Finished rows per Parquet part (and checkpoint)
+        captions: Generate captions for rows that name a persona
+        images: Generate an image for every row
+        progress: Print throughput and ETA while running
+        caption_fn: Optional callable(brief, persona, num_captions) -> list of captions
+        image_fn: Optional callable(brief, style, quality) -> image path
+        retry_errors: Also redo rows whose last attempt failed
+
+    Returns:
+        Dictionary with rows (processed now), skipped (already done), errors,
+        parts, seconds and rows_per_sec
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    caption_fn = (caption_fn or _default_caption_fn) if captions else None
+    image_fn = (image_fn or _default_image_fn) if images else None
+    checkpoint = _Checkpoint(output_dir, retry_errors=retry_errors)
+    skipped = len(checkpoint.done)
+    total = _count_rows(input_path) - skipped
+    schema = _schema()
+
+    started = time.perf_counter()
+    last_report = started
+    processed = 0
+    errors = 0
+    buffer = []
+
+    def flush():
+        if not buffer:
+            return
+        buffer.sort(key=lambda record: record["row"])
+        part_name = checkpoint.next_part_name()
+        part_path = os.path.join(output_dir, part_name)
+        pq.write_table(pa.Table.from_pylist(buffer, schema=schema), f"{part_path}.tmp")
+        os.replace(f"{part_path}.tmp", part_path)
+        checkpoint.commit(part_name, [record["row"] for record in buffer],
+                          [record["row"] for record in buffer if record["error"] is not None])
+        buffer.clear()
+
+    def report(force=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if not progress or (not force and now - last_report < 5.0):
+            return
+        last_report = now
+        rate = processed / (now - started) if now > started else 0.0
+        eta = (total - processed) / rate if rate > 0 else float("inf")
+        print(f"[Campaign] {processed}/{total} rows, {rate:.2f} rows/sec, ETA {eta:.0f}s, {errors} errors")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+
+        def add(record):
+            nonlocal processed, errors
+            buffer.append(record)
+            processed += 1
+            errors += record["error"] is not None
+            if len(buffer) >= flush_rows:
+                flush()
+
+        def collect(done):
+            for future in done:
+                add(future.result())
+            report()
+
+        for index, row, error in _read_rows(input_path):
+            if index in checkpoint.done:
+                continue
+            if error is not None:
+                # Recorded like a failed generation instead of aborting every resume at this line
+                add(_invalid_record(index, error))
+                continue
+            # Keep a bounded window in flight so memory stays flat on large campaigns
+            if len(in_flight) >= concurrency * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(pool.submit(_process_row, index, row, caption_fn, image_fn))
+
+        done, _ = wait(in_flight)
+        collect(done)
+    flush()
+    report(force=True)
+
+    seconds = time.perf_counter() - started
+    return {
+        "rows": processed,
+        "skipped": skipped,
+        "errors": errors,
+        "parts": len(checkpoint.parts),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(processed / seconds, 2) if seconds > 0 else 0.0
+    }
+
+
+def read_campaign(output_dir: str):
+    """
+    Load a campaign's results as one pyarrow Table, ordered by row
+
+    Parts are read in checkpoint order and only the latest record of each row is
+    kept, so rows redone with retry_errors replace their failed attempt
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+        parts = json.load(f)["parts"]
+    latest = {}
+    for part in parts:
+        for record in pq.read_table(os.path.join(output_dir, part["file"])).to_pylist():
+            latest[record["row"]] = record
+    return pa.Table.from_pylist([latest[row] for row in sorted(latest)], schema=_schema())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate captions and images for a campaign file")
+    parser.add_argument("input_path", help="JSONL file of briefs")
+    parser.add_argument("output_dir", help="Directory for Parquet parts and the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--flush-rows", type=int, default=100)
+    parser.add_argument("--no-captions", action="store_true")
+    parser.add_argument("--no-images", action="store_true")
+    parser.add_argument("--retry-errors", action="store_true", help="Redo rows that failed in an earlier run")
+    args = parser.parse_args()
+
+    stats = run_campaign(
+        args.input_path,
+        args.output_dir,
+        concurrency=args.concurrency,
+        flush_rows=args.flush_rows,
+        captions=not args.no_captions,
+        images=not args.no_images,
+        retry_errors=args.retry_errors
+    )
+    print(f"[Campaign] Done: {stats['rows']} rows ({stats['skipped']} already done, "
+          f"{stats['errors']} errors) in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,41 @@
 Caption Generation Service
 """
 
+import os
+import queue
+import threading
 from app.utils.llm_loader import get_llm
-from app.utils.brand_personas import get_persona
+from app.utils.model_pool import get_model_pool
+from app.utils.generation_engine import get_generation_engine
+from app.utils.brand_personas import get_persona, get_all_personas
 
 class CaptionGenerator:
-    def __init__(self):
+    def __init__(self, use_engine=False):
+        """
+        Args:
+            use_engine: Serve captions from the shared continuous-batching engine, so
+                concurrent requests decode together instead of queueing for the model
+        """
         self.llm = None
+        self.use_engine = use_engine
+        self.engine = None
     
     def initialize(self):
         """Initialize the LLM for caption generation"""
-        self.llm = get_llm()
+        if self.use_engine:
+            # The engine prefills persona preambles from the same prefix cache
+            self.engine = get_generation_engine()
+            self.llm = self.engine.loader
+        else:
+            self.llm = get_llm()
+        
+        # Precompute the KV state of every persona preamble
+        try:
+            self.llm.warm_prefix_cache(
+                [self._persona_prefix(persona) for persona in get_all_personas().values()]
+            )
+        except Exception as e:
+            print(f"Could not warm persona prefix cache: {e}")
     
     def generate_caption(self, product_description, persona_key, num_captions=1):
         """
@@ -35,44 +60,143 @@ class CaptionGenerator:
         if not persona:
             return {"error": f"Unknown persona: {persona_key}"}
         
-        captions = []
+        try:
+            if self.engine is not None:
+                captions = self._generate_with_engine([persona], product_description, num_captions)[0]
+            else:
+                # The persona preamble is served from the prefix KV cache; only the product part is prefilled
+                with get_model_pool().pin(self.llm):
+                    captions = self.llm.generate_with_prefix(
+                        self._persona_prefix(persona),
+                        self._product_suffix(product_description),
+                        num_return_sequences=num_captions,
+                        max_length=150,
+                        temperature=0.8,
+                        top_p=0.9
+                    )
+        except Exception as e:
+            print(f"Error generating caption: {e}")
+            return [f"[Generated using {persona_key} persona] Demo caption based on {product_description[:50]}..."] * num_captions
+        
+        if captions is None:
+            return []
+        return [caption.strip() for caption in captions]
+    
+    def _generate_for_personas(self, personas, persona_keys, product_description, num_captions):
+        """
+        Generate num_captions captions for every persona with one batched call
+        
+        Returns:
+            One list of captions per persona
+        """
+        try:
+            if self.engine is not None:
+                batches = self._generate_with_engine(personas, product_description, num_captions)
+            else:
+                with get_model_pool().pin(self.llm):
+                    batches = self.llm.generate_batch(
+                        [self._craft_prompt(product_description, persona) for persona in personas],
+                        num_return_sequences=num_captions,
+                        max_length=150,
+                        temperature=0.8,
+                        top_p=0.9
+                    )
+        except Exception as e:
+            print(f"Error generating caption: {e}")
+            return [
+                [f"[Generated using {persona_key} persona] Demo caption based on {product_description[:50]}..."] * num_captions
+                for persona_key in persona_keys
+            ]
         
-        for i in range(num_captions):
-            # Craft the prompt based on persona and product description
-            prompt = self._craft_prompt(product_description, persona)
+        if batches is None:
+            return [[] for _ in personas]
+        
+        return [[caption.strip() for caption in captions] for captions in batches]
+    
+    def _generate_with_engine(self, personas, product_description, num_captions):
+        """Submit num_captions sequences per persona to the engine; they join its running batch"""
+        suffix = self._product_suffix(product_description)
+        futures = [
+            [
+                self.engine.submit(suffix, prefix=self._persona_prefix(persona), max_length=150,
+                                   temperature=0.8, top_p=0.9)
+                for _ in range(num_captions)
+            ]
+            for persona in personas
+        ]
+        return [[future.result() for future in row] for row in futures]
+    
+    def stream_caption(self, product_description, persona_key, cancel_event=None):
+        """
+        Stream a single marketing caption as it is generated
+        
+        Args:
+            product_description: Description of the product
+            persona_key: Key of the brand persona to use
+            cancel_event: Optional threading.Event that aborts generation when set
             
-            try:
-                # Generate caption
-                caption = self.llm.generate_text(
-                    prompt,
-                    max_length=150,
-                    temperature=0.8,
-                    top_p=0.9
-                )
-                
-                if caption:
-                    # Extract just the caption part (remove the prompt)
-                    caption_text = caption.replace(prompt, "").strip()
-                    captions.append(caption_text)
-            except Exception as e:
-                print(f"Error generating caption: {e}")
-                captions.append(f"[Generated using {persona_key} persona] Demo caption based on {product_description[:50]}...")
+        Yields:
+            Caption text fragments in generation order
+        """
+        persona = get_persona(persona_key)
+        if not persona:
+            raise ValueError(f"Unknown persona: {persona_key}")
         
-        return captions
+        if self.llm is None:
+            self.initialize()
+        
+        if self.engine is not None:
+            yield from self._stream_with_engine(persona, product_description, cancel_event or threading.Event())
+            return
+        with get_model_pool().pin(self.llm):
+            yield from self.llm.stream_text(
+                self._craft_prompt(product_description, persona),
+                max_length=150,
+                temperature=0.8,
+                top_p=0.9,
+                cancel_event=cancel_event
+            )
+    
+    def _stream_with_engine(self, persona, product_description, cancel_event):
+        fragments = queue.Queue()
+        done = object()
+        future = self.engine.submit(
+            self._product_suffix(product_description), prefix=self._persona_prefix(persona),
+            max_length=150, temperature=0.8, top_p=0.9,
+            on_text=fragments.put, cancel_event=cancel_event
+        )
+        future.add_done_callback(lambda _: fragments.put(done))
+        try:
+            while True:
+                fragment = fragments.get()
+                if fragment is done:
+                    break
+                yield fragment
+            if not future.cancelled():
+                future.result()  # re-raise generation errors
+        finally:
+            # The consumer went away: free the slot in the batch
+            cancel_event.set()
     
     def _craft_prompt(self, product_description, persona):
         """Craft a prompt for caption generation"""
+        return self._persona_prefix(persona) + self._product_suffix(product_description)
+    
+    def _persona_prefix(self, persona):
+        """Persona preamble shared by every prompt for that persona"""
         tone = persona.get("tone", "")
         style = persona.get("style", "")
         
-        prompt = f"""You are a {persona['name']} brand. Your tone is {tone}.
+        return f"""You are a {persona['name']} brand. Your tone is {tone}.
 Your writing style is {style}.
-
+"""
+    
+    def _product_suffix(self, product_description):
+        """Product-specific part of the prompt"""
+        return f"""
 Product: {product_description}
 
 Generate a compelling marketing caption for social media:"""
-        
-        return prompt
     
     def generate_multi_persona_captions(self, product_description, personas_list=None):
         """
@@ -89,16 +213,36 @@ Generate a compelling marketing caption for social media:"""
             from app.utils.brand_personas import list_personas
             personas_list = list_personas()
         
+        if self.llm is None:
+            try:
+                self.initialize()
+            except Exception as e:
+                return {persona_key: {"error": f"Model not available: {str(e)}"} for persona_key in personas_list}
+        
         result = {}
+        personas = []
+        valid_keys = []
         for persona_key in personas_list:
-            captions = self.generate_caption(product_description, persona_key, num_captions=2)
-            result[persona_key] = captions
+            persona = get_persona(persona_key)
+            if not persona:
+                result[persona_key] = {"error": f"Unknown persona: {persona_key}"}
+                continue
+            personas.append(persona)
+            valid_keys.append(persona_key)
+        
+        # One batched generate() call for every persona instead of one per caption
+        if personas:
+            captions = self._generate_for_personas(personas, valid_keys, product_description, 2)
+            result.update(zip(valid_keys, captions))
         
-        return result
+        # Keep the caller's persona order
+        return {persona_key: result[persona_key] for persona_key in personas_list}
 
 
 # Create a global instance
-caption_generator = CaptionGenerator()
+caption_generator = CaptionGenerator(
+    use_engine=os.getenv("CAPTION_CONTINUOUS_BATCHING", "1").lower() in ("1", "true", "yes")
+)
 
 def initialize_caption_generator():
     """Initialize the caption generator"""
@@ -0,0 +1,29 @@
+from app.celery_worker import celery_app
+from app.services.caption_generator import get_caption_generator
+
+@celery_app.task(name="app.services.caption_tasks.generate_caption_task")
+def generate_caption_task(data: dict):
+    """Captions for one product and persona: {"product_description", "persona_key", "num_captions"}"""
+    generator = get_caption_generator()
+    captions = generator.generate_caption(
+        data.get("product_description"),
+        data.get("persona_key"),
+        num_captions=data.get("num_captions", 1)
+    )
+    return {
+        "product_description": data.get("product_description"),
+        "persona_key": data.get("persona_key"),
+        "captions": captions
+    }
+
+@celery_app.task(name="app.services.caption_tasks.generate_multi_persona_captions_task")
+def generate_multi_persona_captions_task(data: dict):
+    """Captions for one product across personas: {"product_description", "personas"}"""
+    generator = get_caption_generator()
+    return {
+        "product_description": data.get("product_description"),
+        "captions": generator.generate_multi_persona_captions(
+            data.get("product_description"),
+            data.get("personas")
+        )
+    }
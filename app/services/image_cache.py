@@ -0,0 +1,158 @@
+"""
+Content-addressed on-disk cache for generated images
+Keys are hashes of everything that determines the rendered pixels, so a
+repeated brief is served from disk without touching the pipeline
+"""
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import xxhash
+
+
+class ImageResultCache:
+    """Size-bounded LRU cache of rendered images stored as PNG files"""
+
+    def __init__(self, cache_dir: str = "generated_images/.cache", max_bytes: int = 2 * 1024 ** 3):
+        """
+        Args:
+            cache_dir: Directory holding the cached PNG files
+            max_bytes: Total size budget; least recently used files are evicted beyond it
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> file size, least recently used first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files already on disk (mtime = last use)"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".png"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def make_key(enhanced_prompt: str,
+                 style: str,
+                 quality: str,
+                 num_inference_steps: int,
+                 guidance_scale: float,
+                 height: int,
+                 width: int,
+                 seed: Optional[int],
+                 model_id: str) -> str:
+        """Hash every parameter that influences the rendered image"""
+        payload = json.dumps({
+            "prompt": enhanced_prompt,
+            "style": style,
+            "quality": quality,
+            "steps": num_inference_steps,
+            "guidance_scale": float(guidance_scale),
+            "height": height,
+            "width": width,
+            "seed": seed,
+            "model_id": model_id
+        }, sort_keys=True)
+        return xxhash.xxh3_128_hexdigest(payload.encode("utf-8"))
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached image path for a key, or None on a miss"""
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                try:
+                    os.utime(path)  # persist the LRU position across restarts
+                except OSError:
+                    pass
+                return path
+            if key in self._entries:
+                # File was removed behind our back
+                self._total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, source_path: str) -> str:
+        """
+        Add a rendered image file to the cache
+
+        Args:
+            key: Cache key from make_key()
+            source_path: Path of the already saved PNG; it is hard-linked when
+                possible so the image is not encoded twice
+
+        Returns:
+            Path of the cached file
+        """
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached image"""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self.path_for(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        """Hit, miss and eviction counters plus current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
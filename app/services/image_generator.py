@@ -3,36 +3,107 @@ Image Generation Service using Stable Diffusion
 """
 
 from diffusers import StableDiffusionPipeline
+import contextlib
 import torch
 from PIL import Image
 import os
+import threading
+import time
 from datetime import datetime
+from typing import Optional
 from app.utils.prompt_enhancer import get_prompt_enhancer
+from app.services.batch_scheduler import BatchScheduler
+from app.services.image_cache import ImageResultCache
+from app.services.semantic_cache import SemanticImageCache
+from app.services.quality_policy import QualityPolicy
+from app.utils.cpu_acceleration import CpuAcceleration
+from app.utils.output_profiles import export_profiles
+from app.services.image_writer import ImageWriter
+from app.services.output_store import OutputStore
+from app.utils.model_pool import estimate_module_bytes, get_model_pool
+from app.utils.metrics import get_metrics, observe_stage, stage_timer
+
+DEFAULT_MODEL_ID = "runwayml/stable-diffusion-v1-5"
 
 class ImageGenerator:
     """Generate images from text prompts using Stable Diffusion"""
     
-    def __init__(self, model_id: str = "runwayml/stable-diffusion-v1-5"):
+    def __init__(self,
+                 model_id: str = DEFAULT_MODEL_ID,
+                 max_batch_size: int = 1,
+                 max_batch_wait_ms: float = 50.0,
+                 result_cache: Optional[ImageResultCache] = None,
+                 semantic_cache: Optional[SemanticImageCache] = None,
+                 acceleration: Optional[CpuAcceleration] = None,
+                 quality_policy: Optional[QualityPolicy] = None,
+                 writer: Optional[ImageWriter] = None,
+                 output_store: Optional[OutputStore] = None):
+        """
+        Args:
+            model_id: Hugging Face model id of the Stable Diffusion checkpoint
+            max_batch_size: Largest number of concurrent requests rendered in one
+                pipeline call (1 disables cross-request batching)
+            max_batch_wait_ms: How long a request waits for others to join its batch
+            result_cache: Optional on-disk cache of previously rendered images
+            semantic_cache: Optional similarity cache that reuses renders of paraphrased
+                briefs (only consulted for unseeded requests)
+            acceleration: Optional CPU speed-ups (scheduler, bf16, channels_last,
+                torch.compile, threads) applied when running on CPU
+            quality_policy: Optional policy mapping quality tiers to steps/resolution
+                and stepping requests down a tier under load
+            writer: Optional background writer; renders are then encoded and saved off
+                the request path and the returned image_path appears once the write lands
+            output_store: Optional content-addressed store; renders are then saved under
+                its sharded directories and indexed by brief/style/date instead of output_dir
+        """
         self.model_id = model_id
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.pipeline = None
         self.prompt_enhancer = get_prompt_enhancer()
+        self.result_cache = result_cache
+        self.semantic_cache = semantic_cache
+        self.acceleration = acceleration if self.device == "cpu" else None
+        self.quality_policy = quality_policy
+        self.writer = writer
+        self.output_store = output_store
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self.scheduler = None
+        if max_batch_size > 1:
+            self.enable_batching(max_batch_size, max_batch_wait_ms)
+    
+    def enable_batching(self, max_batch_size: int, max_batch_wait_ms: float = 50.0) -> BatchScheduler:
+        """Route renders through a batch scheduler (kept if one is already running)"""
+        with self._inflight_lock:
+            if self.scheduler is None:
+                self.scheduler = self.create_scheduler(max_batch_size, max_batch_wait_ms)
+            return self.scheduler
+    
+    def create_scheduler(self, max_batch_size: int, max_batch_wait_ms: float = 50.0) -> BatchScheduler:
+        """
+        A batch scheduler over this generator's pipeline, for callers that pass it to
+        generate_image(scheduler=...) without switching every other request to batching
+        """
+        return BatchScheduler(self._run_pipeline, max_batch_size=max_batch_size, max_wait_ms=max_batch_wait_ms)
         
     def initialize(self):
         """Initialize the Stable Diffusion pipeline"""
         try:
             print(f"Loading Stable Diffusion model on device: {self.device}")
             
-            self.pipeline = StableDiffusionPipeline.from_pretrained(
-                self.model_id,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                safety_checker=None  # Disable safety checker for faster inference
-            )
-            self.pipeline.to(self.device)
-            
-            # Enable memory optimization
-            if self.device == "cuda":
-                self.pipeline.enable_attention_slicing()
+            with stage_timer("image", "model_load"):
+                self.pipeline = StableDiffusionPipeline.from_pretrained(
+                    self.model_id,
+                    torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+                    safety_checker=None  # Disable safety checker for faster inference
+                )
+                self.pipeline.to(self.device)
+                
+                # Enable memory optimization
+                if self.device == "cuda":
+                    self.pipeline.enable_attention_slicing()
+                elif self.acceleration is not None:
+                    self.acceleration.apply(self.pipeline)
             
             print("Stable Diffusion model loaded successfully!")
             return True
@@ -40,13 +111,28 @@ class ImageGenerator:
             print(f"Error loading Stable Diffusion model: {e}")
             return False
     
+    def ensure_loaded(self) -> bool:
+        """Load the pipeline unless it is already loaded"""
+        if self.pipeline is not None:
+            return True
+        return self.initialize()
+    
+    def memory_bytes(self) -> int:
+        """Estimated memory held by the pipeline weights"""
+        if self.pipeline is None:
+            return 0
+        return estimate_module_bytes(*self.pipeline.components.values())
+    
     def generate_image(self, 
                       user_brief: str,
                       style: str = "product_ad",
                       quality: str = "high",
-                      num_inference_steps: int = 50,
+                      num_inference_steps: Optional[int] = None,
                       guidance_scale: float = 7.5,
-                      output_dir: str = "generated_images") -> dict:
+                      output_dir: str = "generated_images",
+                      seed: Optional[int] = None,
+                      output_profiles: Optional[list] = None,
+                      scheduler: Optional[BatchScheduler] = None) -> dict:
         """
         Generate an image from a user brief
         
@@ -54,74 +140,172 @@ class ImageGenerator:
             user_brief: User's product description (e.g., "Red running shoes")
             style: Image style (product_ad, lifestyle, minimalist, vibrant, luxury)
             quality: Quality level (low, medium, high, ultra)
-            num_inference_steps: Number of inference steps (higher = better quality, slower)
+            num_inference_steps: Number of inference steps (higher = better quality, slower);
+                defaults to the served quality tier's steps (50 without a quality policy)
             guidance_scale: Guidance scale for prompt adherence (7.5 is default)
             output_dir: Directory to save generated images
+            seed: Optional random seed for reproducible renders
+            output_profiles: Optional platform profiles (names from PLATFORM_PROFILES or
+                OutputProfile objects) exported from the same render
+            scheduler: Optional batch scheduler (see create_scheduler) to render through
+                instead of the generator's own
             
         Returns:
-            Dictionary with image path, prompt, and metadata
+            Dictionary with image path, prompt, and metadata, including the quality
+            tier actually served and the one requested; with output_profiles, "exports"
+            maps each profile name to its file
         """
+        plan = self._plan_quality(quality, num_inference_steps)
+        metrics = get_metrics()
+        inflight_gauge = metrics.gauge("image_requests_in_flight", "Image generations in progress")
+        started = time.perf_counter()
+        with self._inflight_lock:
+            self._inflight += 1
+        inflight_gauge.inc()
+        try:
+            result = self._generate_image(
+                user_brief, style, plan["quality"], self._effective_steps(plan["num_inference_steps"]),
+                guidance_scale, output_dir, seed, plan["height"], plan["width"], output_profiles,
+                scheduler or self.scheduler
+            )
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+            inflight_gauge.dec()
         
-        if self.pipeline is None:
-            try:
-                self.initialize()
-            except Exception as e:
-                return {"error": f"Image generator not available: {str(e)}"}
+        if "error" in result:
+            outcome = "error"
+        else:
+            outcome = "cache_hit" if result.get("cache_hit") else "rendered"
+        metrics.counter("image_requests", "Image generations by outcome", ("outcome",)).labels(outcome).inc()
+        observe_stage("image", "total", time.perf_counter() - started)
         
+        # Only fresh renders say anything about how long the current tier takes
+        if self.quality_policy is not None and "error" not in result and not result.get("cache_hit"):
+            self.quality_policy.record(plan["quality"], time.perf_counter() - started)
+        result["requested_quality"] = plan["requested_quality"]
+        result["quality_degraded"] = plan["degraded"]
+        return result
+    
+    def _plan_quality(self, quality: str, num_inference_steps: Optional[int]) -> dict:
+        """Served tier, steps and resolution for a request"""
+        if self.quality_policy is None:
+            plan = {"requested_quality": quality, "quality": quality, "degraded": False,
+                    "num_inference_steps": 50, "height": 512, "width": 512}
+        else:
+            queue_depth = self._inflight + (self.scheduler.queue_depth() if self.scheduler is not None else 0)
+            plan = self.quality_policy.plan(quality, queue_depth)
+        if num_inference_steps is not None:
+            plan["num_inference_steps"] = num_inference_steps
+        return plan
+    
+    def _generate_image(self, user_brief, style, quality, num_inference_steps, guidance_scale,
+                        output_dir, seed, height, width, output_profiles=None, scheduler=None) -> dict:
+        """Cache lookups, render and save for an already planned request"""
+        image_size = f"{width}x{height}"
         try:
             # Enhance the prompt
-            enhanced_prompt = self.prompt_enhancer.enhance_prompt(
-                user_brief, 
-                style=style,
-                quality=quality
-            )
+            with stage_timer("image", "prompt_enhance"):
+                enhanced_prompt = self.prompt_enhancer.enhance_prompt(
+                    user_brief, 
+                    style=style,
+                    quality=quality
+                )
             
             print(f"User Brief: {user_brief}")
             print(f"Enhanced Prompt: {enhanced_prompt}")
             
-            # Generate image
-            with torch.no_grad():
-                image = self.pipeline(
-                    prompt=enhanced_prompt,
-                    height=512,
-                    width=512,
-                    num_inference_steps=num_inference_steps,
-                    guidance_scale=guidance_scale
-                ).images[0]
+            # Serve repeated briefs from the result cache without touching the pipeline
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = self.result_cache.make_key(
+                    enhanced_prompt, style, quality, num_inference_steps,
+                    guidance_scale, height, width, seed, self._cache_model_id()
+                )
+                cached_path = self.result_cache.get(cache_key)
+                if cached_path is not None:
+                    result = self._build_result(
+                        cached_path, user_brief, enhanced_prompt, style, quality,
+                        num_inference_steps, guidance_scale, image_size,
+                        {"cache_hit": True, "batch_size": 0, "queue_wait_ms": 0.0}
+                    )
+                    return self._export(result, None, output_profiles, output_dir)
             
-            # Create output directory if it doesn't exist
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Save image
-            import re
-            safe_brief = re.sub(r'[<>''/\\|?*{}]','',user_brief)
-                                
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{safe_brief[:30].replace(' ', '_')}_{timestamp}.png"
-            filepath = os.path.join(output_dir, filename)
-            image.save(filepath)
-            
-            return {
-                "success": True,
-                "user_brief": user_brief,
-                "enhanced_prompt": enhanced_prompt,
-                "image_path": filepath,
-                "style": style,
-                "quality": quality,
-                "image_format": "PNG",
-                "image_size": "512x512",
-                "inference_steps": num_inference_steps,
-                "guidance_scale": guidance_scale
-            }
+            # Then look for a prior render of a paraphrased brief
+            variant = self._semantic_variant(num_inference_steps, guidance_scale, height, width)
+            if self.semantic_cache is not None and seed is None:
+                match = self.semantic_cache.lookup(user_brief, style, quality, variant)
+                if match is not None:
+                    result = self._semantic_result(match, user_brief, enhanced_prompt, style, quality,
+                                                   num_inference_steps, guidance_scale, image_size)
+                    return self._export(result, None, output_profiles, output_dir)
+        except Exception as e:
+            print(f"Error generating image: {e}")
+            return {"error": str(e), "user_brief": user_brief, "enhanced_prompt": None}
+        
+        if self.pipeline is None:
+            try:
+                self.initialize()
+            except Exception as e:
+                return {"error": f"Image generator not available: {str(e)}"}
+        
+        try:
+            image, batch_info = self._render(
+                enhanced_prompt, height, width, num_inference_steps, guidance_scale, seed, scheduler
+            )
+            result, _ = self._save_result(
+                image, user_brief, enhanced_prompt, style, quality,
+                num_inference_steps, guidance_scale, output_dir, batch_info, cache_key,
+                self._semantic_registration(user_brief, style, quality, variant) if seed is None else None
+            )
+            return self._export(result, image, output_profiles, output_dir)
             
         except Exception as e:
             print(f"Error generating image: {e}")
             return {
                 "error": str(e),
                 "user_brief": user_brief,
-                "enhanced_prompt": enhanced_prompt if hasattr(self, 'enhanced_prompt') else None
+                "enhanced_prompt": enhanced_prompt
             }
     
+    def _export(self, result: dict, image, output_profiles: Optional[list], output_dir: str) -> dict:
+        """Add platform exports to a result, from the in-memory render or the cached file"""
+        if not output_profiles:
+            return result
+        if image is None:
+            # Cache hits have no render in memory; decode the stored file once for every profile
+            # and close it when the exports are written
+            with Image.open(result["image_path"]) as stored:
+                stored.load()
+                return self._export(result, stored, output_profiles, output_dir)
+        basename = os.path.splitext(os.path.basename(result["image_path"]))[0]
+        if self.output_store is not None and self.output_store.key_for_path(result["image_path"]) is not None:
+            # Next to the render in the store, where gc() removes them and the API serves them
+            output_dir = self.output_store.export_dir(basename)
+        with stage_timer("image", "export"):
+            result["exports"] = export_profiles(image, output_profiles, output_dir, basename)
+        return result
+    
+    def _render(self, enhanced_prompt: str, height: int, width: int,
+                num_inference_steps: int, guidance_scale: float, seed: Optional[int] = None,
+                scheduler: Optional[BatchScheduler] = None):
+        """Render one prompt, through a batch scheduler when one is given"""
+        if scheduler is not None:
+            rendered = scheduler.submit(
+                enhanced_prompt,
+                height=height,
+                width=width,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                seed=seed
+            ).result()
+            return rendered.image, {"batch_size": rendered.batch_size, "queue_wait_ms": rendered.queue_wait_ms}
+        
+        image = self._run_pipeline(
+            [enhanced_prompt], height, width, num_inference_steps, guidance_scale, [seed]
+        )[0]
+        return image, {"batch_size": 1, "queue_wait_ms": 0.0}
+    
     def batch_generate_images(self,
                              briefs: list,
                              style: str = "product_ad",
@@ -141,6 +325,11 @@ class ImageGenerator:
         Returns:
             List of generation results
         """
+        if self.scheduler is not None:
+            return self._batch_generate_scheduled(
+                briefs, style, quality, num_inference_steps, output_dir
+            )
+        
         results = []
         for i, brief in enumerate(briefs):
             print(f"Generating image {i+1}/{len(briefs)}: {brief}")
@@ -155,6 +344,283 @@ class ImageGenerator:
         
         return results
     
+    def _batch_generate_scheduled(self, briefs, style, quality, num_inference_steps, output_dir):
+        """Submit all briefs to the batch scheduler at once so they share pipeline calls"""
+        guidance_scale = 7.5
+        plan = self._plan_quality(quality, num_inference_steps)
+        quality, height, width = plan["quality"], plan["height"], plan["width"]
+        num_inference_steps = self._effective_steps(plan["num_inference_steps"])
+        variant = self._semantic_variant(num_inference_steps, guidance_scale, height, width)
+        pending = []
+        results = [None] * len(briefs)
+        for i, brief in enumerate(briefs):
+            # A brief that cannot be prepared fails alone instead of taking the batch down
+            try:
+                enhanced_prompt = self.prompt_enhancer.enhance_prompt(brief, style=style, quality=quality)
+                cache_key = None
+                if self.result_cache is not None:
+                    cache_key = self.result_cache.make_key(
+                        enhanced_prompt, style, quality, num_inference_steps,
+                        guidance_scale, height, width, None, self._cache_model_id()
+                    )
+                    cached_path = self.result_cache.get(cache_key)
+                    if cached_path is not None:
+                        results[i] = self._build_result(
+                            cached_path, brief, enhanced_prompt, style, quality,
+                            num_inference_steps, guidance_scale, f"{width}x{height}",
+                            {"cache_hit": True, "batch_size": 0, "queue_wait_ms": 0.0}
+                        )
+                        continue
+            except Exception as e:
+                print(f"Error generating image: {e}")
+                results[i] = {"error": str(e), "user_brief": brief, "enhanced_prompt": None}
+                continue
+            pending.append((i, brief, enhanced_prompt, cache_key))
+        
+        # Embed every remaining brief in one call for the semantic lookup
+        if pending and self.semantic_cache is not None:
+            matches = self.semantic_cache.lookup_batch([item[1] for item in pending], style, quality, variant)
+            remaining = []
+            for (i, brief, enhanced_prompt, cache_key), match in zip(pending, matches):
+                if match is None:
+                    remaining.append((i, brief, enhanced_prompt, cache_key))
+                else:
+                    results[i] = self._semantic_result(match, brief, enhanced_prompt, style, quality,
+                                                       num_inference_steps, guidance_scale, f"{width}x{height}")
+            pending = remaining
+        
+        if pending and self.pipeline is None:
+            self.initialize()
+        
+        futures = [
+            self.scheduler.submit(
+                enhanced_prompt,
+                height=height,
+                width=width,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale
+            )
+            for _, _, enhanced_prompt, _ in pending
+        ]
+        
+        for (i, brief, enhanced_prompt, cache_key), future in zip(pending, futures):
+            try:
+                rendered = future.result()
+                result, _ = self._save_result(
+                    rendered.image, brief, enhanced_prompt, style, quality,
+                    num_inference_steps, guidance_scale, output_dir,
+                    {"batch_size": rendered.batch_size, "queue_wait_ms": rendered.queue_wait_ms},
+                    cache_key, self._semantic_registration(brief, style, quality, variant)
+                )
+                results[i] = result
+            except Exception as e:
+                print(f"Error generating image: {e}")
+                results[i] = {
+                    "error": str(e),
+                    "user_brief": brief,
+                    "enhanced_prompt": enhanced_prompt
+                }
+        
+        for result in results:
+            result["requested_quality"] = plan["requested_quality"]
+            result["quality_degraded"] = plan["degraded"]
+        return results
+    
+    def warm_up(self, size: int = 256, steps: int = 2):
+        """Run one small render so the first request does not pay for lazy initialisation"""
+        self._run_pipeline(["product photo"], size, size, steps, 7.5)
+    
+    def _run_pipeline(self, prompts: list, height: int, width: int,
+                      num_inference_steps: int, guidance_scale: float,
+                      seeds: Optional[list] = None) -> list:
+        """Run the pipeline once for a list of prompts and return one image per prompt"""
+        # Pinned so the model pool cannot unload the pipeline mid-render
+        with get_model_pool().pin(self):
+            return self._call_pipeline(prompts, height, width, num_inference_steps, guidance_scale, seeds)
+    
+    def _call_pipeline(self, prompts, height, width, num_inference_steps, guidance_scale, seeds):
+        if self.pipeline is None and not self.initialize():
+            raise RuntimeError(f"Could not load {self.model_id}")
+        generator = None
+        if seeds is not None and any(seed is not None for seed in seeds):
+            # One generator per prompt so seeded requests stay reproducible inside a batch
+            generator = [
+                torch.Generator(device=self.device).manual_seed(
+                    # A fresh generator's seed(), unlike torch.seed(), leaves the global RNG alone
+                    seed if seed is not None else torch.Generator().seed()
+                )
+                for seed in seeds
+            ]
+        autocast = self.acceleration.autocast() if self.acceleration is not None else contextlib.nullcontext()
+        metrics = get_metrics()
+        extra = {}
+        if metrics.enabled:
+            # The pipeline decodes the latents after its last step; the step callback splits the two
+            last_step = []
+            
+            def on_step_end(pipeline, step, timestep, callback_kwargs):
+                last_step[:] = [time.perf_counter()]
+                return callback_kwargs
+            
+            extra["callback_on_step_end"] = on_step_end
+        started = time.perf_counter()
+        with torch.no_grad(), autocast:
+            images = self.pipeline(
+                prompt=prompts,
+                height=height,
+                width=width,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                generator=generator,
+                **extra
+            ).images
+        if metrics.enabled:
+            finished = time.perf_counter()
+            denoised = last_step[0] if last_step else finished
+            observe_stage("image", "denoise", denoised - started)
+            observe_stage("image", "decode", finished - denoised)
+            metrics.counter("diffusion_steps", "Denoising steps run (steps x images)").inc(
+                num_inference_steps * len(prompts)
+            )
+            metrics.histogram("image_batch_size", "Images per pipeline call",
+                              buckets=(1, 2, 4, 8, 16)).observe(len(prompts))
+        return images
+    
+    def _effective_steps(self, num_inference_steps: int) -> int:
+        """Steps actually run, capped in accelerated mode"""
+        if self.acceleration is None:
+            return num_inference_steps
+        return self.acceleration.steps(num_inference_steps)
+    
+    def _cache_model_id(self) -> str:
+        """Model id for cache keys; accelerated renders differ from baseline ones"""
+        if self.acceleration is None:
+            return self.model_id
+        return f"{self.model_id}|{self.acceleration.describe()}"
+    
+    def _save_result(self, image, user_brief, enhanced_prompt, style, quality,
+                     num_inference_steps, guidance_scale, output_dir, batch_info, cache_key=None,
+                     on_stored=None):
+        """
+        Save a rendered image and build the result dictionary
+
+        Args:
+            on_stored: Optional callable(stored path) run once the stored copy exists
+
+        Returns:
+            (result, path of the stored copy: the result cache entry when cache_key is set)
+        """
+        if self.output_store is not None:
+            # Content-addressed path plus an index row; output_dir is not used
+            filepath = self.output_store.reserve(
+                image, user_brief, enhanced_prompt, style, quality,
+                {"num_inference_steps": num_inference_steps, "guidance_scale": guidance_scale,
+                 "image_size": f"{image.width}x{image.height}", "model_id": self.model_id}
+            )
+        else:
+            # Create output directory if it doesn't exist
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # Save image
+            import re
+            safe_brief = re.sub(r'[<>''/\\|?*{}]','',user_brief)
+                                
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{safe_brief[:30].replace(' ', '_')}_{timestamp}.png"
+            filepath = os.path.join(output_dir, filename)
+        stored_path = self._persist(image, filepath, cache_key, on_stored)
+        
+        result = self._build_result(
+            filepath, user_brief, enhanced_prompt, style, quality,
+            num_inference_steps, guidance_scale, f"{image.width}x{image.height}", batch_info
+        )
+        if cache_key is not None:
+            result["cache_hit"] = False
+        return result, stored_path
+    
+    def _persist(self, image, filepath: str, cache_key: Optional[str], on_stored=None) -> str:
+        """Write the render (in the background when a writer is set), then index and cache it"""
+        stored_path = filepath if cache_key is None else self.result_cache.path_for(cache_key)
+        
+        def finish(path):
+            self._on_written(path, cache_key)
+            if on_stored is not None:
+                on_stored(stored_path)
+        
+        if self.writer is None:
+            image.save(filepath)
+            finish(filepath)
+        else:
+            def on_written(handle):
+                if handle.error is None:
+                    finish(handle.path)
+            
+            self.writer.submit(image, filepath).add_done_callback(on_written)
+        return stored_path
+    
+    def _on_written(self, filepath: str, cache_key: Optional[str]):
+        if self.output_store is not None:
+            self.output_store.mark_written(filepath)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, filepath)
+    
+    def _semantic_variant(self, num_inference_steps, guidance_scale, height, width) -> str:
+        """Semantic cache partition for everything besides style/quality that changes a render"""
+        return f"{self._cache_model_id()}|{num_inference_steps}|{guidance_scale}|{width}x{height}"
+    
+    def _semantic_registration(self, user_brief, style, quality, variant):
+        """on_stored callback adding a render to the semantic cache once its file exists"""
+        if self.semantic_cache is None:
+            return None
+        return lambda stored_path: self.semantic_cache.add(user_brief, style, quality, stored_path, variant)
+    
+    def _build_result(self, image_path, user_brief, enhanced_prompt, style, quality,
+                      num_inference_steps, guidance_scale, image_size, extra) -> dict:
+        """Build the result dictionary returned to callers"""
+        return {
+            "success": True,
+            "user_brief": user_brief,
+            "enhanced_prompt": enhanced_prompt,
+            "image_path": image_path,
+            "style": style,
+            "quality": quality,
+            "image_format": "PNG",
+            "image_size": image_size,
+            "inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            **extra
+        }
+    
+    def _semantic_result(self, match, user_brief, enhanced_prompt, style, quality,
+                         num_inference_steps, guidance_scale, image_size="512x512") -> dict:
+        """Result dictionary for a render reused from the semantic cache"""
+        return self._build_result(
+            match["image_path"], user_brief, enhanced_prompt, style, quality,
+            num_inference_steps, guidance_scale, image_size,
+            {
+                "cache_hit": True,
+                "semantic_match": {"brief": match["text"], "similarity": match["similarity"]},
+                "batch_size": 0,
+                "queue_wait_ms": 0.0
+            }
+        )
+    
+    def get_cache_stats(self) -> dict:
+        """Result cache hit/miss/eviction counters (empty when caching is disabled)"""
+        if self.result_cache is None:
+            stats = {"enabled": False}
+        else:
+            stats = {"enabled": True, **self.result_cache.get_stats()}
+        if self.semantic_cache is not None:
+            stats["semantic"] = self.semantic_cache.get_stats()
+        return stats
+    
+    def get_batching_stats(self) -> dict:
+        """Batch size and queue wait statistics (empty when batching is disabled)"""
+        if self.scheduler is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.scheduler.get_stats()}
+    
     def unload_model(self):
         """Unload the model to free memory"""
         self.pipeline = None
@@ -162,15 +628,13 @@ class ImageGenerator:
         print("Model unloaded and memory cleared.")
 
 
-# Create a global instance
-_image_generator = None
+def get_image_generator(model_id: str = DEFAULT_MODEL_ID) -> ImageGenerator:
+    """Get the pooled image generator for a checkpoint (the pipeline loads on first render)"""
+    return get_model_pool().get(("image", model_id), load=False)
 
-def get_image_generator() -> ImageGenerator:
-    """Get or create the image generator instance"""
-    global _image_generator
-    if _image_generator is None:
-        _image_generator = ImageGenerator()
-    return _image_generator
+def checkout_image_generator(model_id: str = DEFAULT_MODEL_ID):
+    """Context manager that pins the image generator for a checkpoint while in use"""
+    return get_model_pool().checkout(("image", model_id))
 
 def initialize_image_generator():
     """Initialize the image generator"""
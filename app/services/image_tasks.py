@@ -1,5 +1,39 @@
+import os
+import threading
+import weakref
 from app.celery_worker import celery_app
-from app.services.image_generator import get_image_generator
+from app.services.blob_store import get_blob_store
+from app.services.image_generator import DEFAULT_MODEL_ID, get_image_generator
+from app.services.image_writer import get_image_writer
+
+# Batched consumer settings: how many image_queue messages share one pipeline
+# call, and how long the first one waits for company
+IMAGE_TASK_BATCH_SIZE = int(os.getenv("IMAGE_TASK_BATCH_SIZE", "4"))
+IMAGE_TASK_FLUSH_MS = float(os.getenv("IMAGE_TASK_FLUSH_MS", "200"))
+# Longest a task waits for the background writer before failing instead of hanging
+IMAGE_PUBLISH_TIMEOUT_S = float(os.getenv("IMAGE_PUBLISH_TIMEOUT_S", "60"))
+
+# One scheduler per pooled generator, used only by the batched task; the
+# generator itself keeps rendering other tasks' prompts immediately
+_task_schedulers = weakref.WeakKeyDictionary()
+_task_schedulers_lock = threading.Lock()
+
+def _task_scheduler(generator):
+    with _task_schedulers_lock:
+        scheduler = _task_schedulers.get(generator)
+        if scheduler is None:
+            scheduler = _task_schedulers[generator] = generator.create_scheduler(
+                IMAGE_TASK_BATCH_SIZE, IMAGE_TASK_FLUSH_MS
+            )
+        return scheduler
+
+def _publish(result: dict) -> dict:
+    """Move the rendered file into the blob store; the task result keeps only its reference"""
+    image_path = result.pop("image_path", None)
+    if image_path is not None and "error" not in result:
+        get_image_writer().wait(image_path, timeout=IMAGE_PUBLISH_TIMEOUT_S)
+        result["image"] = get_blob_store().put_file(image_path, "image/png")
+    return result
 
 @celery_app.task(name="app.services.image_tasks.generate_image_task")
 def generate_image_task(data: dict):
@@ -9,4 +43,25 @@ def generate_image_task(data: dict):
     generator = get_image_generator()
     result = generator.generate_image(user_prompt)
     
-    return result
\ No newline at end of file
+    return _publish(result)
+
+@celery_app.task(name="app.services.image_tasks.generate_image_batched_task")
+def generate_image_batched_task(data: dict):
+    """
+    Batched variant of generate_image_task
+
+    Run the worker with a thread pool as wide as the batch, e.g.
+        celery -A app.celery_worker worker -Q image_queue -P threads -c 4
+    Up to IMAGE_TASK_BATCH_SIZE messages that are in flight together (or that
+    arrive within IMAGE_TASK_FLUSH_MS of the first) are rendered in one
+    pipeline call. Each task still stores its own result under its task id,
+    and a failing prompt is retried alone so it only fails its own message.
+    """
+    generator = get_image_generator(data.get("model_id") or DEFAULT_MODEL_ID)
+    return _publish(generator.generate_image(
+        data.get("prompt"),
+        style=data.get("style", "product_ad"),
+        quality=data.get("quality", "high"),
+        seed=data.get("seed"),
+        scheduler=_task_scheduler(generator)
+    ))
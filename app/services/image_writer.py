@@ -0,0 +1,261 @@
+"""
+Background image writer
+Encoding and writing rendered images happens on a small pool of writer
+threads fed by a bounded queue, so callers get the final path back as soon
+as the render is done. Files are written to a temp file and renamed into
+place, so a path either does not exist yet or holds the complete image.
+Pending writes are flushed on shutdown
+"""
+
+import atexit
+import os
+import queue
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Optional
+
+from PIL import Image
+
+from app.utils.metrics import get_metrics, observe_stage
+
+_STOP = object()
+
+# Every live writer, so the fork hook below can reset the ones a child inherits
+_writers = weakref.WeakSet()
+
+
+class WriteHandle:
+    """Pending write of one image; wait() returns the path once it is durable"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.error = None
+        self._future = Future()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """Block until the file is in place; re-raises the write error if it failed"""
+        self._future.result(timeout)
+        return self.path
+
+    def add_done_callback(self, fn):
+        """
+        Call fn(handle) on the writer thread once the write finished (immediately if it has);
+        callbacks run before wait() returns, so waiters see their side effects.
+        Check handle.error inside the callback; calling wait() there would block
+        """
+        with self._lock:
+            if self._callbacks is not None:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _resolve(self, error: Optional[BaseException] = None):
+        self.error = error
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, None
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"[Image Writer] Callback for {self.path} failed: {e}")
+        if error is None:
+            self._future.set_result(self.path)
+        else:
+            self._future.set_exception(error)
+
+
+def write_image_atomic(image: Image.Image, path: str, **save_kwargs):
+    """Encode into a temp file next to path, then rename it into place"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    image_format = save_kwargs.pop("format", None) or Image.registered_extensions()[os.path.splitext(path)[1].lower()]
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format=image_format, **save_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ImageWriter:
+    """Bounded queue of image writes served by a pool of encoder/writer threads"""
+
+    def __init__(self, num_threads: int = 2, max_pending: int = 32):
+        """
+        Args:
+            num_threads: Writer threads (PNG encoding releases the GIL, so a few help)
+            max_pending: Writes allowed to wait in the queue; submit() blocks beyond
+                this, which keeps memory bounded when the disk falls behind
+        """
+        self._num_threads = num_threads
+        self._max_pending = max_pending
+        self._closed = False
+        self._reset()
+        self._start()
+        _writers.add(self)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self._max_pending)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._written = 0
+        self._failed = 0
+        self._write_ms_total = 0.0
+        self._threads = []
+
+    def _start(self):
+        self._threads = [
+            threading.Thread(target=self._work, name=f"image-writer-{i}", daemon=True)
+            for i in range(self._num_threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _after_fork(self):
+        # Threads do not survive fork: a writer built in a pre-fork parent (WORKER_PRELOAD_MODE=parent)
+        # would queue writes nobody serves, so the child gets an empty queue and starts its own threads
+        self._reset()
+
+    def submit(self, image: Image.Image, path: str, **save_kwargs) -> WriteHandle:
+        """
+        Queue an image for writing; the image must not be modified afterwards
+
+        Args:
+            image: Rendered image
+            path: Final file path; the format follows the extension unless format= is given
+            **save_kwargs: Extra arguments for PIL's Image.save
+
+        Returns:
+            WriteHandle for the pending write
+        """
+        handle = WriteHandle(path)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Image writer is shut down")
+            if not self._threads:
+                self._start()
+            self._pending[path] = handle
+        self._queue.put((image, handle, save_kwargs))
+        return handle
+
+    def wait(self, path: str, timeout: Optional[float] = None) -> str:
+        """Wait for a pending write of path; returns at once if none is pending"""
+        with self._lock:
+            handle = self._pending.get(path)
+        if handle is not None:
+            handle.wait(timeout)
+        return path
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued write finished
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                handles = list(self._pending.values())
+            if not handles:
+                return True
+            for handle in handles:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    handle.wait(remaining)
+                except TimeoutError:
+                    return False
+                except Exception:
+                    pass  # failures are counted and logged by the writer thread
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting writes, flush the queue and stop the writer threads"""
+        with self._lock:
+            if self._closed:
+                return True
+            self._closed = True
+        flushed = self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        return flushed
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            image, handle, save_kwargs = item
+            started = time.perf_counter()
+            try:
+                write_image_atomic(image, handle.path, **save_kwargs)
+            except Exception as e:
+                print(f"[Image Writer] Failed to write {handle.path}: {e}")
+                get_metrics().counter("image_write_failures", "Background image writes that failed").inc()
+                with self._lock:
+                    self._failed += 1
+                handle._resolve(e)
+                self._finish(handle)
+                continue
+            seconds = time.perf_counter() - started
+            observe_stage("writer", "write", seconds)
+            with self._lock:
+                self._written += 1
+                self._write_ms_total += seconds * 1000.0
+            handle._resolve()
+            self._finish(handle)
+
+    def _finish(self, handle: WriteHandle):
+        with self._lock:
+            if self._pending.get(handle.path) is handle:
+                del self._pending[handle.path]
+
+    def get_stats(self) -> dict:
+        """Queue depth and write counters"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "written": self._written,
+                "failed": self._failed,
+                "avg_write_ms": round(self._write_ms_total / self._written, 3) if self._written else 0.0
+            }
+
+
+def _reset_writers_after_fork():
+    global _image_writer_lock
+    _image_writer_lock = threading.Lock()
+    for writer in list(_writers):
+        writer._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_writers_after_fork)
+
+
+# Create a global instance
+_image_writer = None
+_image_writer_lock = threading.Lock()
+
+def get_image_writer() -> ImageWriter:
+    """Get or create the process-wide writer (IMAGE_WRITER_THREADS, IMAGE_WRITER_MAX_PENDING)"""
+    global _image_writer
+    with _image_writer_lock:
+        if _image_writer is None:
+            _image_writer = ImageWriter(
+                num_threads=int(os.getenv("IMAGE_WRITER_THREADS", "2")),
+                max_pending=int(os.getenv("IMAGE_WRITER_MAX_PENDING", "32"))
+            )
+            atexit.register(_image_writer.shutdown)
+    return _image_writer
@@ -0,0 +1,158 @@
+"""
+Bounded background job queue for long-running generation requests
+Submissions return a job id immediately; the work runs on a fixed-size
+thread pool and callers poll for the status/result
+"""
+
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """Run generation jobs on a bounded executor and track their status"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, max_finished: int = 1000):
+        """
+        Args:
+            max_workers: Number of jobs that run at the same time
+            max_pending: Number of jobs allowed to wait for a worker
+            max_finished: Number of finished jobs kept for status lookups
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._active = 0  # queued + running
+        self._total_duration = 0.0
+        self._completed = 0
+
+    def submit(self, fn, *args, **kwargs) -> str:
+        """
+        Queue fn(*args, **kwargs) for execution
+
+        Returns:
+            Job id
+
+        Raises:
+            QueueFullError: When max_workers + max_pending jobs are already active
+        """
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                raise QueueFullError("Job queue is full, try again later", self._retry_after())
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._active += 1
+
+        try:
+            self._executor.submit(self._run, job_id, fn, args, kwargs)
+        except RuntimeError:
+            with self._lock:
+                del self._jobs[job_id]
+                self._active -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+
+        try:
+            result = fn(*args, **kwargs)
+            status, error = DONE, None
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            result, status, error = None, FAILED, str(e)
+
+        with self._lock:
+            job["status"] = status
+            job["result"] = result
+            job["error"] = error
+            job["finished_at"] = time.time()
+            self._active -= 1
+            self._completed += 1
+            self._total_duration += job["finished_at"] - job["started_at"]
+
+            self._finished[job_id] = True
+            while len(self._finished) > self.max_finished:
+                old_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_id, None)
+
+    def _retry_after(self) -> int:
+        """Rough number of seconds until a slot frees up (lock must be held)"""
+        if not self._completed:
+            return 5
+        # With every worker busy, one of them finishes roughly every avg/max_workers seconds
+        avg_duration = self._total_duration / self._completed
+        return max(1, math.ceil(avg_duration / self.max_workers))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def depth(self) -> int:
+        """Number of jobs that are queued or running"""
+        with self._lock:
+            return self._active
+
+    def get_stats(self) -> dict:
+        """Queue occupancy and completion counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": self._active,
+                "completed": self._completed,
+                "avg_duration_s": round(self._total_duration / self._completed, 3) if self._completed else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for running ones"""
+        self._executor.shutdown(wait=wait)
+
+
+# Create a global instance
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    """Get or create the job queue instance"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            max_workers=int(os.getenv("JOB_MAX_WORKERS", "2")),
+            max_pending=int(os.getenv("JOB_MAX_PENDING", "16"))
+        )
+    return _job_queue
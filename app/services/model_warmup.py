@@ -0,0 +1,151 @@
+"""
+Eager model loading and warm-up for the API process
+Loads the configured models when the app starts, runs one small inference
+through each so the first real request does not pay for lazy initialisation,
+and reports when the process is ready to take traffic
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+def _load_llm():
+    from app.utils.llm_loader import get_llm
+    llm = get_llm()
+    if llm.model is None:
+        raise RuntimeError(f"Could not load {llm.model_name}")
+
+
+def _warm_llm():
+    from app.services.caption_generator import get_caption_generator
+    from app.utils.model_pool import get_model_pool
+    generator = get_caption_generator()
+    # Prefills every persona preamble into the loader's prefix cache in either mode;
+    # the engine's prefixed admissions read the same cache
+    generator.initialize()
+    if generator.engine is not None:
+        # Warm the engine's decode loop; it keeps its model checked out
+        generator.engine.submit("Write a short caption:", max_length=16).result()
+        return
+    # Pinned so the model pool cannot unload the LLM mid-generation
+    with get_model_pool().pin(generator.llm) as llm:
+        if llm.generate_batch(["Write a short caption:"], max_length=16) is None:
+            raise RuntimeError("Warm-up generation failed")
+
+
+def _load_image():
+    from app.services.image_generator import checkout_image_generator
+    with checkout_image_generator() as generator:
+        if generator.pipeline is None:
+            raise RuntimeError(f"Could not load {generator.model_id}")
+
+
+def _warm_image():
+    from app.services.image_generator import get_image_generator
+    size = int(os.getenv("WARMUP_IMAGE_SIZE", "256"))
+    steps = int(os.getenv("WARMUP_IMAGE_STEPS", "2"))
+    get_image_generator().warm_up(size=size, steps=steps)
+
+
+# name -> (load, warm-up)
+WARMERS = {
+    "llm": (_load_llm, _warm_llm),
+    "image": (_load_image, _warm_image)
+}
+
+
+class ModelWarmup:
+    """Load and warm a list of models on a background thread and track readiness"""
+
+    def __init__(self, models: list, warmers: Optional[dict] = None):
+        """
+        Args:
+            models: Names of the models to load, in order (keys of warmers)
+            warmers: Mapping of model name to (load_fn, warmup_fn), defaults to WARMERS
+        """
+        self.models = list(models)
+        self.warmers = warmers if warmers is not None else WARMERS
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {
+            name: {"status": PENDING, "load_s": None, "warmup_s": None, "error": None}
+            for name in self.models
+        }
+
+    def start(self):
+        """Start loading in the background (no-op if already started)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, daemon=True, name="model-warmup")
+        self._thread.start()
+
+    def run(self):
+        """Load and warm every model in turn"""
+        for name in self.models:
+            self._warm(name)
+
+    def _warm(self, name: str):
+        if name not in self.warmers:
+            self._update(name, status=FAILED, error=f"Unknown model: {name}")
+            print(f"[Warmup] Unknown model: {name}")
+            return
+        load_fn, warmup_fn = self.warmers[name]
+        try:
+            self._update(name, status=LOADING)
+            started = time.perf_counter()
+            load_fn()
+            self._update(name, status=WARMING, load_s=round(time.perf_counter() - started, 3))
+
+            started = time.perf_counter()
+            warmup_fn()
+            self._update(name, status=READY, warmup_s=round(time.perf_counter() - started, 3))
+            status = self.get_status()["models"][name]
+            print(f"[Warmup] {name} ready: load {status['load_s']}s, warm-up {status['warmup_s']}s")
+        except Exception as e:
+            self._update(name, status=FAILED, error=str(e))
+            print(f"[Warmup] {name} failed: {e}")
+
+    def _update(self, name: str, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading has finished; returns whether every model is ready"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_ready()
+
+    def is_ready(self) -> bool:
+        """True once every configured model is loaded and warmed"""
+        with self._lock:
+            return all(status["status"] == READY for status in self._status.values())
+
+    def get_status(self) -> dict:
+        """Readiness flag plus per-model status and timings"""
+        with self._lock:
+            models = {name: dict(status) for name, status in self._status.items()}
+        return {
+            "ready": all(status["status"] == READY for status in models.values()),
+            "models": models
+        }
+
+
+# Create a global instance
+_model_warmup = None
+
+def get_model_warmup() -> ModelWarmup:
+    """Get or create the warm-up tracker for the models listed in WARMUP_MODELS"""
+    global _model_warmup
+    if _model_warmup is None:
+        models = [name.strip() for name in os.getenv("WARMUP_MODELS", "llm,image").split(",") if name.strip()]
+        _model_warmup = ModelWarmup(models)
+    return _model_warmup
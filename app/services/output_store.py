@@ -0,0 +1,315 @@
+"""
+Content-addressed output store for rendered images
+Files are named by a hash of their pixels and sharded into two levels of
+subdirectories, so names never collide and no directory grows past a few
+thousand entries. Metadata lives in an indexed SQLite table (via SQLAlchemy)
+for lookups by brief, style and date, and gc() enforces age and size quotas
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+import xxhash
+from sqlalchemy import Index, Integer, String, Text, DateTime, create_engine, event, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+from PIL import Image
+
+from app.services.image_writer import write_image_atomic
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Thumbnail edge lengths served by the API; anything else would let clients fill the disk
+THUMBNAIL_SIZES = (128, 256, 512)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class ImageRecord(Base):
+    """One stored render"""
+
+    __tablename__ = "images"
+
+    key: Mapped[str] = mapped_column(String(32), primary_key=True)
+    path: Mapped[str] = mapped_column(String(255))
+    brief: Mapped[str] = mapped_column(Text)
+    enhanced_prompt: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    style: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    quality: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    params: Mapped[str] = mapped_column(Text, default="{}")
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    size_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_images_brief_created", "brief", "created_at"),
+        Index("ix_images_style_created", "style", "created_at"),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "path": self.path,
+            "brief": self.brief,
+            "enhanced_prompt": self.enhanced_prompt,
+            "style": self.style,
+            "quality": self.quality,
+            "params": json.loads(self.params or "{}"),
+            "created_at": self.created_at.isoformat(),
+            "size_bytes": self.size_bytes
+        }
+
+
+class OutputStore:
+    """Sharded image files plus a SQLite metadata index"""
+
+    def __init__(self, root: str = "generated_images/store", db_url: Optional[str] = None,
+                 extension: str = ".png"):
+        """
+        Args:
+            root: Directory holding the shards
+            db_url: SQLAlchemy URL of the index (default: SQLite file inside root)
+            extension: File extension, which also picks the encoding
+        """
+        self.root = os.path.abspath(root)
+        self.extension = extension
+        os.makedirs(root, exist_ok=True)
+        db_url = db_url or f"sqlite:///{os.path.join(self.root, 'index.db')}"
+        self.engine = create_engine(db_url, connect_args={"check_same_thread": False}
+                                    if db_url.startswith("sqlite") else {})
+        if db_url.startswith("sqlite"):
+            @event.listens_for(self.engine, "connect")
+            def _sqlite_pragmas(connection, _):
+                # WAL lets API and worker processes read while one of them writes
+                cursor = connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+        Base.metadata.create_all(self.engine)
+        self._session = sessionmaker(self.engine, expire_on_commit=False)
+        self._gc_lock = threading.Lock()
+
+    @staticmethod
+    def key_for(image) -> str:
+        """Hash of the decoded pixels, so the path is known before the file is encoded"""
+        digest = xxhash.xxh3_128()
+        digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        """Sharded file path for a key: root/ab/cd/abcd....png"""
+        return os.path.join(self.root, key[:2], key[2:4], key + self.extension)
+
+    def key_for_path(self, path: str) -> Optional[str]:
+        """Key of a file inside the store, None for paths outside it"""
+        key = os.path.splitext(os.path.basename(path))[0]
+        if KEY_PATTERN.match(key) and self.path_for(key) == os.path.abspath(path):
+            return key
+        return None
+
+    def thumbnail_path(self, key: str, size: int) -> str:
+        return os.path.join(self.root, "thumbs", str(size), key[:2], f"{key}.webp")
+
+    def export_dir(self, key: str) -> str:
+        """Directory for the platform exports of a render, removed with it by gc()"""
+        return os.path.join(self.root, "exports", key[:2], key)
+
+    def export_path(self, key: str, profile: str, extension: str) -> str:
+        """Path export_profiles() writes a profile to when given export_dir(key) and the key"""
+        return os.path.join(self.export_dir(key), f"{key}_{profile}{extension}")
+
+    def thumbnail(self, key: str, size: int = 256) -> Optional[str]:
+        """
+        Path of a WebP preview no larger than size x size, rendered on first use
+
+        Returns:
+            Path of the thumbnail, or None if the render is not in the store
+        """
+        if size not in THUMBNAIL_SIZES:
+            raise ValueError(f"Thumbnail size must be one of {THUMBNAIL_SIZES}")
+        path = self.thumbnail_path(key, size)
+        if os.path.exists(path):
+            return path
+        source = self.path_for(key)
+        if not os.path.exists(source):
+            return None
+        with Image.open(source) as image:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            # Concurrent first requests both render it; the rename makes the last one win harmlessly
+            write_image_atomic(image, path, quality=80)
+        return path
+
+    def reserve(self, image, brief: str, enhanced_prompt: Optional[str] = None,
+                style: Optional[str] = None, quality: Optional[str] = None,
+                params: Optional[dict] = None) -> str:
+        """
+        Record a render and return the path it should be written to
+
+        The caller writes the file (directly or through the background writer) and
+        then calls mark_written(); an identical render maps to the same path and row
+
+        Returns:
+            Path of the stored file
+        """
+        key = self.key_for(image)
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        row = {
+            "key": key,
+            "path": path,
+            "brief": brief,
+            "enhanced_prompt": enhanced_prompt,
+            "style": style,
+            "quality": quality,
+            "params": json.dumps(params or {}, sort_keys=True),
+            "created_at": datetime.now(),
+            "size_bytes": None
+        }
+        # Concurrent identical renders race for the row; the first insert wins and the rest are no-ops
+        if self.engine.dialect.name == "sqlite":
+            with self._session.begin() as session:
+                session.execute(sqlite_insert(ImageRecord).values(**row).on_conflict_do_nothing(index_elements=["key"]))
+        else:
+            try:
+                with self._session.begin() as session:
+                    session.add(ImageRecord(**row))
+            except IntegrityError:
+                pass
+        return path
+
+    def mark_written(self, path: str):
+        """Record the on-disk size once the file for path is in place"""
+        key = os.path.basename(path)[:-len(self.extension)]
+        size = os.path.getsize(path)
+        with self._session.begin() as session:
+            session.execute(update(ImageRecord).where(ImageRecord.key == key).values(size_bytes=size))
+
+    def get(self, key: str) -> Optional[dict]:
+        """Metadata for one key"""
+        with self._session() as session:
+            record = session.get(ImageRecord, key)
+            return record.to_dict() if record is not None else None
+
+    def find(self, brief: Optional[str] = None, style: Optional[str] = None,
+             quality: Optional[str] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, limit: int = 100) -> list:
+        """
+        Look up renders, newest first
+
+        Args:
+            brief: Exact brief
+            style: Image style
+            quality: Quality tier
+            since: Only renders created at or after this time
+            until: Only renders created before this time
+            limit: Maximum number of rows
+
+        Returns:
+            List of metadata dictionaries
+        """
+        query = select(ImageRecord)
+        if brief is not None:
+            query = query.where(ImageRecord.brief == brief)
+        if style is not None:
+            query = query.where(ImageRecord.style == style)
+        if quality is not None:
+            query = query.where(ImageRecord.quality == quality)
+        if since is not None:
+            query = query.where(ImageRecord.created_at >= since)
+        if until is not None:
+            query = query.where(ImageRecord.created_at < until)
+        query = query.order_by(ImageRecord.created_at.desc()).limit(limit)
+        with self._session() as session:
+            return [record.to_dict() for record in session.scalars(query)]
+
+    def gc(self, max_age_days: Optional[float] = None, max_total_bytes: Optional[int] = None) -> dict:
+        """
+        Delete renders older than max_age_days, then the oldest ones until the store
+        fits in max_total_bytes
+
+        Returns:
+            Dictionary with removed (rows) and freed_bytes
+        """
+        removed = 0
+        freed = 0
+        with self._gc_lock, self._session.begin() as session:
+            victims = []
+            if max_age_days is not None:
+                cutoff = datetime.now() - timedelta(days=max_age_days)
+                victims.extend(session.scalars(
+                    select(ImageRecord).where(ImageRecord.created_at < cutoff)
+                ))
+            if max_total_bytes is not None:
+                expired = {record.key for record in victims}
+                total = session.scalar(select(func.coalesce(func.sum(ImageRecord.size_bytes), 0)))
+                total -= sum(record.size_bytes or 0 for record in victims)
+                oldest_first = session.scalars(
+                    select(ImageRecord).where(ImageRecord.size_bytes.is_not(None))
+                    .order_by(ImageRecord.created_at)
+                )
+                for record in oldest_first:
+                    if total <= max_total_bytes:
+                        break
+                    if record.key in expired:
+                        continue
+                    victims.append(record)
+                    total -= record.size_bytes
+            for record in victims:
+                for path in [record.path] + [self.thumbnail_path(record.key, size) for size in THUMBNAIL_SIZES]:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                shutil.rmtree(self.export_dir(record.key), ignore_errors=True)
+                freed += record.size_bytes or 0
+                removed += 1
+                session.delete(record)
+        if removed:
+            print(f"[Output Store] GC removed {removed} images ({freed / 1024 ** 2:.1f} MB)")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def get_stats(self) -> dict:
+        """Number of stored renders and their total size"""
+        with self._session() as session:
+            count, total = session.execute(
+                select(func.count(ImageRecord.key), func.coalesce(func.sum(ImageRecord.size_bytes), 0))
+            ).one()
+        return {"images": count, "total_bytes": total}
+
+
+# Create a global instance
+_output_store = None
+
+def get_output_store() -> OutputStore:
+    """Get or create the output store (OUTPUT_STORE_DIR, OUTPUT_STORE_DB)"""
+    global _output_store
+    if _output_store is None:
+        _output_store = OutputStore(
+            root=os.getenv("OUTPUT_STORE_DIR", "generated_images/store"),
+            db_url=os.getenv("OUTPUT_STORE_DB") or None
+        )
+    return _output_store
+
+
+def run_gc() -> dict:
+    """Apply the quotas from OUTPUT_STORE_MAX_AGE_DAYS and OUTPUT_STORE_MAX_GB"""
+    max_age = os.getenv("OUTPUT_STORE_MAX_AGE_DAYS")
+    max_gb = os.getenv("OUTPUT_STORE_MAX_GB")
+    return get_output_store().gc(
+        max_age_days=float(max_age) if max_age else None,
+        max_total_bytes=int(float(max_gb) * 1024 ** 3) if max_gb else None
+    )
+
+
+if __name__ == "__main__":
+    stats = run_gc()
+    print(f"[Output Store] {stats['removed']} removed, {stats['freed_bytes']} bytes freed; "
+          f"{get_output_store().get_stats()}")
@@ -0,0 +1,149 @@
+"""
+Load-adaptive quality policy
+Maps each quality tier to a step count and resolution, and steps requests
+down a tier when the estimated latency under the current queue depth would
+miss the p95 latency target
+"""
+
+import math
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+# Ordered from cheapest to most expensive
+QUALITY_TIERS = ["low", "medium", "high", "ultra"]
+
+DEFAULT_TIER_SETTINGS = {
+    "low": {"num_inference_steps": 15, "height": 384, "width": 384},
+    "medium": {"num_inference_steps": 25, "height": 512, "width": 512},
+    "high": {"num_inference_steps": 40, "height": 512, "width": 512},
+    "ultra": {"num_inference_steps": 50, "height": 768, "width": 768}
+}
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class QualityPolicy:
+    """Pick the served quality tier for each request from recent latencies and queue depth"""
+
+    def __init__(self,
+                 p95_target_s: Optional[float] = None,
+                 concurrency: int = 1,
+                 window: int = 100,
+                 min_samples: int = 5,
+                 tier_settings: Optional[dict] = None):
+        """
+        Args:
+            p95_target_s: Latency target in seconds (None never degrades)
+            concurrency: Number of requests served in parallel
+            window: Number of recent latencies kept per tier
+            min_samples: Observations needed before a tier's own p95 is trusted
+            tier_settings: Tier -> num_inference_steps/height/width, defaults to DEFAULT_TIER_SETTINGS
+        """
+        self.p95_target_s = p95_target_s
+        self.concurrency = max(1, concurrency)
+        self.min_samples = min_samples
+        self.tier_settings = tier_settings or DEFAULT_TIER_SETTINGS
+        self._latencies = {tier: deque(maxlen=window) for tier in QUALITY_TIERS}
+        self._lock = threading.Lock()
+        self.served = {tier: 0 for tier in QUALITY_TIERS}
+        self.degraded = 0
+
+    @classmethod
+    def from_env(cls, concurrency: int = 1) -> "QualityPolicy":
+        """Policy with the target from QUALITY_P95_TARGET_S (unset disables degradation)"""
+        target = os.getenv("QUALITY_P95_TARGET_S")
+        return cls(p95_target_s=float(target) if target else None, concurrency=concurrency)
+
+    def _cost(self, tier: str) -> int:
+        settings = self.tier_settings[tier]
+        return settings["num_inference_steps"] * settings["height"] * settings["width"]
+
+    def estimate_service_s(self, tier: str) -> Optional[float]:
+        """p95 render time of a tier, extrapolated from other tiers by cost if it has too few samples"""
+        with self._lock:
+            own = list(self._latencies[tier])
+            if len(own) >= self.min_samples:
+                return _percentile(own, 95)
+            # Render time scales roughly with steps x pixels
+            for other in sorted(QUALITY_TIERS, key=lambda t: len(self._latencies[t]), reverse=True):
+                samples = list(self._latencies[other])
+                if len(samples) >= self.min_samples:
+                    return _percentile(samples, 95) * self._cost(tier) / self._cost(other)
+        return None
+
+    def estimate_latency_s(self, tier: str, queue_depth: int = 0) -> Optional[float]:
+        """Estimated p95 latency of a new request given the requests ahead of it"""
+        service = self.estimate_service_s(tier)
+        if service is None:
+            return None
+        return service * (1 + queue_depth / self.concurrency)
+
+    def plan(self, quality: str, queue_depth: int = 0) -> dict:
+        """
+        Choose the tier to serve a request at
+
+        Args:
+            quality: Requested quality tier (unknown values are treated as "high")
+            queue_depth: Requests queued or running besides this one
+
+        Returns:
+            Dictionary with requested_quality, quality (served tier), degraded,
+            num_inference_steps, height and width
+        """
+        requested = quality if quality in QUALITY_TIERS else "high"
+        index = QUALITY_TIERS.index(requested)
+        if self.p95_target_s is not None:
+            while index > 0:
+                estimate = self.estimate_latency_s(QUALITY_TIERS[index], queue_depth)
+                if estimate is None or estimate <= self.p95_target_s:
+                    break
+                index -= 1
+
+        served = QUALITY_TIERS[index]
+        with self._lock:
+            self.served[served] += 1
+            if served != requested:
+                self.degraded += 1
+        return {
+            "requested_quality": requested,
+            "quality": served,
+            "degraded": served != requested,
+            **self.tier_settings[served]
+        }
+
+    def record(self, tier: str, seconds: float):
+        """Record how long a request served at a tier took"""
+        if tier in self._latencies:
+            with self._lock:
+                self._latencies[tier].append(seconds)
+
+    def get_stats(self) -> dict:
+        """Served/degraded counters and the current p95 per tier"""
+        with self._lock:
+            p95 = {
+                tier: round(_percentile(list(samples), 95), 3) if samples else None
+                for tier, samples in self._latencies.items()
+            }
+            return {
+                "p95_target_s": self.p95_target_s,
+                "served": dict(self.served),
+                "degraded": self.degraded,
+                "p95_s": p95
+            }
+
+
+# Create a global instance
+_quality_policy = None
+
+def get_quality_policy() -> QualityPolicy:
+    """Get or create the API's quality policy (concurrency from JOB_MAX_WORKERS)"""
+    global _quality_policy
+    if _quality_policy is None:
+        _quality_policy = QualityPolicy.from_env(concurrency=int(os.getenv("JOB_MAX_WORKERS", "2")))
+    return _quality_policy
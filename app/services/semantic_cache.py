@@ -0,0 +1,285 @@
+"""
+Semantic near-duplicate cache for generated images
+Embeds briefs with sentence-transformers and searches a FAISS index of prior
+renders, so paraphrases ("red running shoe" / "Red running shoes for men")
+reuse an existing image instead of rendering a new one
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import xxhash
+
+
+def _partition_key(entry: dict) -> tuple:
+    return entry["style"], entry["quality"], entry.get("variant", "")
+
+
+class SemanticImageCache:
+    """
+    FAISS-backed similarity cache of rendered images
+
+    Partitioned by style, quality and a variant string describing everything else
+    that changes the render (model, steps, resolution), so a paraphrase only
+    matches images produced the same way
+    """
+
+    def __init__(self,
+                 index_dir: str = "generated_images/.semantic_index",
+                 threshold: float = 0.92,
+                 max_entries: int = 10000,
+                 model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 embedder=None,
+                 batch_size: int = 32,
+                 save_every: int = 50):
+        """
+        Args:
+            index_dir: Directory where the indexes and metadata are persisted
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Oldest entries are evicted beyond this many renders
+            model_name: sentence-transformers model used for embeddings
+            embedder: Optional callable(list of texts) -> float array, replaces the model
+            batch_size: Embedding batch size
+            save_every: Persist to disk after this many additions
+        """
+        self.index_dir = index_dir
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.save_every = save_every
+        self._embedder = embedder
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._faiss = None
+        self._lock = threading.RLock()
+
+        self._indexes = {}   # (style, quality, variant) -> faiss.IndexIDMap2
+        self._entries = {}   # id -> metadata, ids grow monotonically so min id = oldest
+        self._next_id = 0
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.enabled = self._load_backends()
+        if self.enabled:
+            self._load()
+
+    def _load_backends(self) -> bool:
+        """Import faiss (and sentence-transformers unless an embedder was given)"""
+        try:
+            import faiss
+            self._faiss = faiss
+            if self._embedder is None:
+                import sentence_transformers  # noqa: F401
+            return True
+        except ImportError as e:
+            print(f"Semantic cache disabled: {e}")
+            return False
+
+    def _embed(self, texts: list) -> np.ndarray:
+        """Embed texts in batches and L2-normalise them for cosine similarity"""
+        if self._embedder is not None:
+            vectors = np.asarray(self._embedder(texts), dtype="float32")
+        else:
+            if self._model is None:
+                with self._model_lock:
+                    if self._model is None:
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+            vectors = self._model.encode(
+                texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+            ).astype("float32")
+        vectors = np.ascontiguousarray(vectors)
+        self._faiss.normalize_L2(vectors)
+        return vectors
+
+    def _index_for(self, key: tuple, dim: int):
+        if key not in self._indexes:
+            self._indexes[key] = self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(dim))
+        return self._indexes[key]
+
+    def lookup(self, text: str, style: str, quality: str, variant: str = "") -> Optional[dict]:
+        """Return the closest prior render with the same style/quality/variant, or None"""
+        return self.lookup_batch([text], style, quality, variant)[0]
+
+    def lookup_batch(self, texts: list, style: str, quality: str, variant: str = "") -> list:
+        """
+        Look up several texts with one embedding call
+
+        Args:
+            texts: Briefs to look up
+            style: Image style
+            quality: Quality tier
+            variant: Render settings beyond style and quality (model, steps, size)
+
+        Returns:
+            One entry (metadata plus "similarity") or None per text
+        """
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+
+        vectors = self._embed(texts)
+        results = []
+        with self._lock:
+            index = self._indexes.get((style, quality, variant))
+            if index is None or index.ntotal == 0:
+                self.misses += len(texts)
+                return [None] * len(texts)
+
+            scores, ids = index.search(vectors, 1)
+            for score, entry_id in zip(scores[:, 0], ids[:, 0]):
+                entry = self._entries.get(int(entry_id))
+                if entry is not None and score >= self.threshold and os.path.exists(entry["image_path"]):
+                    self.hits += 1
+                    results.append({**entry, "similarity": round(float(score), 4)})
+                else:
+                    self.misses += 1
+                    results.append(None)
+        return results
+
+    def add(self, text: str, style: str, quality: str, image_path: str, variant: str = ""):
+        """Record a new render"""
+        self.add_batch([text], style, quality, [image_path], variant)
+
+    def add_batch(self, texts: list, style: str, quality: str, image_paths: list, variant: str = ""):
+        """Record several renders of the same style/quality/variant with one embedding call"""
+        if not self.enabled or not texts:
+            return
+
+        vectors = self._embed(texts)
+        with self._lock:
+            index = self._index_for((style, quality, variant), vectors.shape[1])
+            ids = np.arange(self._next_id, self._next_id + len(texts), dtype="int64")
+            self._next_id += len(texts)
+            index.add_with_ids(vectors, ids)
+            now = time.time()
+            for entry_id, text, image_path in zip(ids.tolist(), texts, image_paths):
+                self._entries[entry_id] = {
+                    "text": text,
+                    "style": style,
+                    "quality": quality,
+                    "variant": variant,
+                    "image_path": image_path,
+                    "created_at": now
+                }
+            self._evict()
+
+            self._unsaved += len(texts)
+            if self._unsaved >= self.save_every:
+                self.save()
+
+    def _evict(self):
+        """Remove the oldest entries beyond max_entries"""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        oldest = sorted(self._entries)[:excess]
+        by_partition = {}
+        for entry_id in oldest:
+            entry = self._entries.pop(entry_id)
+            by_partition.setdefault(_partition_key(entry), []).append(entry_id)
+        for key, entry_ids in by_partition.items():
+            self._indexes[key].remove_ids(np.array(entry_ids, dtype="int64"))
+        self.evictions += excess
+
+    def _partition_file(self, key: tuple) -> str:
+        style, quality, variant = key
+        # Variants hold model ids with slashes, so they are hashed into the file name
+        suffix = f"__{xxhash.xxh64_hexdigest(variant.encode())}" if variant else ""
+        return os.path.join(self.index_dir, f"{style}__{quality}{suffix}.faiss")
+
+    def save(self):
+        """Write every partition index and the metadata to index_dir"""
+        if not self.enabled:
+            return
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            for key, index in self._indexes.items():
+                path = self._partition_file(key)
+                self._faiss.write_index(index, f"{path}.tmp")
+                os.replace(f"{path}.tmp", path)
+
+            meta_path = os.path.join(self.index_dir, "entries.json")
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({
+                    "next_id": self._next_id,
+                    "partitions": [list(key) for key in self._indexes],
+                    "entries": self._entries
+                }, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            self._unsaved = 0
+
+    def flush(self):
+        """Save if entries were added since the last save (for shutdown hooks)"""
+        with self._lock:
+            if self._unsaved:
+                self.save()
+
+    def _load(self):
+        meta_path = os.path.join(self.index_dir, "entries.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._next_id = meta["next_id"]
+        self._entries = {int(entry_id): entry for entry_id, entry in meta["entries"].items()}
+        for partition in meta["partitions"]:
+            # Indexes saved before variants existed have (style, quality) keys
+            key = tuple(partition) + ("",) * (3 - len(partition))
+            path = self._partition_file(key)
+            if os.path.exists(path):
+                self._indexes[key] = self._faiss.read_index(path)
+
+    def get_stats(self) -> dict:
+        """Hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Create a global instance
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> Optional[SemanticImageCache]:
+    """
+    Get or create the process-wide cache, shared by every pooled image generator
+
+    Off (None) unless SEMANTIC_CACHE_DIR is set; SEMANTIC_CACHE_THRESHOLD and
+    SEMANTIC_CACHE_MAX_ENTRIES tune it
+    """
+    global _semantic_cache
+    index_dir = os.getenv("SEMANTIC_CACHE_DIR")
+    if not index_dir:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticImageCache(
+                index_dir=index_dir,
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+            )
+            atexit.register(_semantic_cache.flush)
+    return _semantic_cache
+
+
+def flush_semantic_cache():
+    """Save entries added since the last save, if the cache is in use"""
+    if _semantic_cache is not None:
+        _semantic_cache.flush()
@@ -3,50 +3,106 @@ Week 4: Image Generator with Prompt Enhancer and Post-Processing
 """
 
 import io
-from PIL import Image, ImageDraw, ImageFont
+import os
+from PIL import Image
 from app.utils.prompt_enhancer import get_prompt_enhancer
+from app.utils.post_processing import PostProcessor, resize, watermark
+from app.utils.output_profiles import export_profiles
+from app.services.image_writer import get_image_writer
+from app.services.output_store import get_output_store
+from app.utils.metrics import stage_timer
 
 # Replace this with your actual model import
 # from app.models import image_model as model
 
 # Mock model for demonstration (replace with your model)
 class MockModel:
-    def generate(self, prompt: str):
-        print(f"[Model] Generating image for prompt:\n{prompt}\n")
-        img = Image.new("RGB", (512, 512), color="white")  # blank image
-        bytes_io = io.BytesIO()
-        img.save(bytes_io, format="PNG")
-        return bytes_io.getvalue()
+    def generate(self, prompt: str, num_inference_steps: int = 50, height: int = 512, width: int = 512):
+        print(f"[Model] Generating image for prompt ({num_inference_steps} steps, {width}x{height}):\n{prompt}\n")
+        return Image.new("RGB", (width, height), color="white")  # blank image
 
 model = MockModel()
 
 prompt_enhancer = get_prompt_enhancer()
 
+# Built once per process; stages hand PIL images / arrays straight to each other
+post_processor = PostProcessor([
+    resize(1024, 1024),
+    watermark("My Social Media")
+])
 
-def generate_image(user_brief: str, style: str = "product_ad", quality: str = "high") -> str:
+
+def _to_image(output):
+    """Models may return a PIL image, an array or (legacy) encoded bytes"""
+    if isinstance(output, (bytes, bytearray)):
+        return Image.open(io.BytesIO(output))
+    return output
+
+
+def _render(user_brief: str, style: str, quality: str, render_settings: dict = None):
+    """render_settings: optional num_inference_steps/height/width, e.g. from a QualityPolicy plan"""
     # Step 1: Enhance prompt
-    enhanced_prompt = prompt_enhancer.enhance_prompt(user_brief, style=style, quality=quality)
+    with stage_timer("week4", "prompt_enhance"):
+        enhanced_prompt = prompt_enhancer.enhance_prompt(user_brief, style=style, quality=quality)
     print(f"[Prompt Enhancer] Enhanced Prompt:\n{enhanced_prompt}\n")
 
     # Step 2: Generate image
-    image_bytes = model.generate(enhanced_prompt)
-    image = Image.open(io.BytesIO(image_bytes))
+    with stage_timer("week4", "generate"):
+        image = _to_image(model.generate(enhanced_prompt, **(render_settings or {})))
 
     # Step 3: Post-processing
-    image = image.resize((1024, 1024))
-    draw = ImageDraw.Draw(image)
-    try:
-        font = ImageFont.truetype("arial.ttf", 24)
-    except IOError:
-        font = ImageFont.load_default()
-    draw.text((10, 10), "My Social Media", fill="white", font=font)
-
-    # Step 4: Save final image
-    output_path = f"output_{user_brief.replace(' ', '_')}.png"
-    image.save(output_path)
-    print(f"[Image Generator] Saved final image: {output_path}")
-
-    return output_path
+    image, timings = post_processor.run(image)
+    print(f"[Post-Processing] Stage timings (ms): {timings}")
+
+    # Step 4: Save final image into the output store in the background;
+    # get_image_writer().wait(path) blocks until it is on disk
+    store = get_output_store()
+    output_path = store.reserve(image, user_brief, enhanced_prompt, style, quality)
+
+    def on_written(handle):
+        if handle.error is None:
+            store.mark_written(handle.path)
+
+    get_image_writer().submit(image, output_path).add_done_callback(on_written)
+    print(f"[Image Generator] Queued final image: {output_path}")
+
+    return image, output_path
+
+
+def generate_image(user_brief: str, style: str = "product_ad", quality: str = "high",
+                   render_settings: dict = None) -> str:
+    return _render(user_brief, style, quality, render_settings)[1]
+
+
+def generate_image_exports(user_brief: str, style: str = "product_ad", quality: str = "high",
+                           output_profiles: list = None, output_dir: str = None,
+                           render_settings: dict = None) -> dict:
+    """
+    Generate one image and export it for every platform profile from the same render
+
+    Args:
+        output_dir: Directory for the exports; defaults to the render's export
+            directory in the output store, which GET /images/{key}/exports/{profile} serves
+        render_settings: Optional num_inference_steps/height/width passed to the model
+
+    Returns:
+        Dictionary with image_path and exports (profile name -> file details)
+    """
+    image, output_path = _render(user_brief, style, quality, render_settings)
+    exports = {}
+    if output_profiles:
+        basename = os.path.splitext(os.path.basename(output_path))[0]
+        if output_dir is None:
+            output_dir = get_output_store().export_dir(basename)
+        with stage_timer("week4", "export"):
+            exports = export_profiles(image, output_profiles, output_dir, basename)
+        print(f"[Image Generator] Exported {len(exports)} platform versions")
+    return {"image_path": output_path, "exports": exports}
+
+
+def get_postprocess_stats() -> dict:
+    """Per-stage post-processing timings since process start"""
+    return post_processor.get_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+Celery worker lifecycle hooks
+Loads and warms the models once per worker instead of lazily inside the first
+task of every child process, and recycles children by task count or memory
+
+Modes (WORKER_PRELOAD_MODE):
+    parent  load before the prefork pool starts; children share the weights copy-on-write
+            and recycled children come up already warm
+    child   load in every child at worker_process_init (safer with threaded
+            BLAS/OpenMP runtimes that do not survive fork)
+    lazy    previous behaviour, load inside the first task
+
+Models (WORKER_PRELOAD_MODELS) default to the ones the consumed queues (-Q) need
+"""
+
+import os
+import time
+from typing import Optional
+
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+
+from app.services.image_writer import get_image_writer
+from app.services.model_warmup import ModelWarmup
+from app.services.semantic_cache import flush_semantic_cache
+
+PRELOAD_MODES = ("parent", "child", "lazy")
+
+# Models the tasks routed to each queue use (see task_routes in app.celery_worker)
+QUEUE_MODELS = {
+    "image_queue": ["image"],
+    "caption_queue": ["llm"]
+}
+DEFAULT_MODELS = ["image"]
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def worker_settings() -> dict:
+    """Lifecycle configuration from the environment"""
+    mode = os.getenv("WORKER_PRELOAD_MODE", "child")
+    if mode not in PRELOAD_MODES:
+        raise ValueError(f"WORKER_PRELOAD_MODE must be one of {PRELOAD_MODES}, got {mode}")
+    max_memory_mb = _env_int("CELERY_MAX_MEMORY_PER_CHILD_MB")
+    models = os.getenv("WORKER_PRELOAD_MODELS")
+    return {
+        "mode": mode,
+        # None: decided from the consumed queues once the worker has parsed -Q
+        "models": [name.strip() for name in models.split(",") if name.strip()] if models else None,
+        "max_tasks_per_child": _env_int("CELERY_MAX_TASKS_PER_CHILD"),
+        # Celery counts resident memory in KiB
+        "max_memory_per_child_kb": max_memory_mb * 1024 if max_memory_mb else None,
+        # A child must report alive within this many seconds; loading a checkpoint takes longer than the 4s default
+        "proc_alive_timeout_s": float(os.getenv("WORKER_PROC_ALIVE_TIMEOUT_S", "300")),
+        "writer_flush_timeout_s": float(os.getenv("IMAGE_WRITER_FLUSH_TIMEOUT_S", "30"))
+    }
+
+
+def models_for_queues(queue_names) -> list:
+    """Models needed by the tasks routed to these queues, in queue order"""
+    models = []
+    for queue in queue_names:
+        for name in QUEUE_MODELS.get(queue, []):
+            if name not in models:
+                models.append(name)
+    return models or list(DEFAULT_MODELS)
+
+
+def preload_models(models: list, stage: str, warmers: dict = None) -> dict:
+    """Load and warm models synchronously, logging per-process timings"""
+    started = time.perf_counter()
+    warmup = ModelWarmup(models, warmers)
+    warmup.run()
+    status = warmup.get_status()
+    for name, model in status["models"].items():
+        if model["status"] == "ready":
+            print(f"[Worker {os.getpid()}] {stage}: {name} loaded in {model['load_s']}s, "
+                  f"warmed in {model['warmup_s']}s")
+        else:
+            print(f"[Worker {os.getpid()}] {stage}: {name} {model['status']}: {model['error']}")
+    print(f"[Worker {os.getpid()}] {stage}: preload took {time.perf_counter() - started:.2f}s")
+    return status
+
+
+def configure_worker(celery_app, settings: dict = None) -> dict:
+    """Apply recycling limits and connect the preload hooks for the configured mode"""
+    settings = settings or worker_settings()
+    celery_app.conf.worker_max_tasks_per_child = settings["max_tasks_per_child"]
+    celery_app.conf.worker_max_memory_per_child = settings["max_memory_per_child_kb"]
+    celery_app.conf.worker_proc_alive_timeout = settings["proc_alive_timeout_s"]
+
+    def models():
+        # Read at the hooks: -Q is applied after this module is imported, and
+        # forked children inherit the parent's queue selection
+        if settings["models"] is not None:
+            return settings["models"]
+        queues = celery_app.amqp.queues
+        return models_for_queues(queues.consume_from or queues)
+
+    if settings["mode"] == "parent":
+        def on_worker_init(**kwargs):
+            preload_models(models(), "parent (before fork)")
+
+        def on_process_init(**kwargs):
+            print(f"[Worker {os.getpid()}] child started with models inherited from the parent")
+
+        worker_init.connect(on_worker_init, weak=False)
+        worker_process_init.connect(on_process_init, weak=False)
+    elif settings["mode"] == "child":
+        def on_process_init(**kwargs):
+            preload_models(models(), "child")
+
+        worker_process_init.connect(on_process_init, weak=False)
+
+    # Prefork children leave through os._exit, which skips atexit, so flush queued image writes
+    # (whose callbacks add semantic cache entries) and then the semantic index here
+    def on_shutdown(**kwargs):
+        get_image_writer().flush(timeout=settings["writer_flush_timeout_s"])
+        flush_semantic_cache()
+
+    worker_process_shutdown.connect(on_shutdown, weak=False)
+    worker_shutdown.connect(on_shutdown, weak=False)
+    return settings
@@ -0,0 +1,188 @@
+"""
+Catalog-scale prompt enhancement
+Streams product rows from JSONL or Parquet in chunks, enhances them (optionally
+across a process pool) and writes the rows back with an enhanced_prompt column
+
+Usage:
+    python -m app.utils.catalog_enhancer catalog.parquet enhanced.parquet --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.prompt_enhancer import get_prompt_enhancer
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _read_chunks(path: str, chunk_size: int):
+    """Yield lists of row dicts from a JSONL or Parquet file"""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    chunk = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ChunkWriter:
+    """Append chunks of row dicts to a JSONL or Parquet file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._writer = None
+        self._file = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, rows: list):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                table = pa.Table.from_pylist(rows)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pylist(rows, schema=self._writer.schema)
+            self._writer.write_table(table)
+            return
+
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _enhance_chunk(items: list) -> list:
+    """Worker body: enhance (brief, style, quality) triples with the per-process enhancer"""
+    enhancer = get_prompt_enhancer()
+    return [enhancer.enhance_prompt(brief, style, quality) for brief, style, quality in items]
+
+
+def enhance_catalog(input_path: str,
+                    output_path: str,
+                    style: str = "product_ad",
+                    quality: str = "high",
+                    brief_field: str = "brief",
+                    chunk_size: int = 10000,
+                    workers: int = 1,
+                    progress: bool = True) -> dict:
+    """
+    Enhance every row of a product catalog file
+
+    Rows may carry their own "style"/"quality" fields; the arguments are the defaults.
+
+    Args:
+        input_path: JSONL or Parquet file with one product per row
+        output_path: JSONL or Parquet destination (format picked by extension)
+        style: Default image style
+        quality: Default quality level
+        brief_field: Name of the column holding the product brief
+        chunk_size: Rows read, enhanced and written at a time
+        workers: Number of processes (1 enhances in the current process)
+        progress: Print rows/sec after each chunk
+
+    Returns:
+        Dictionary with rows, chunks, seconds and rows_per_sec
+    """
+    started = time.perf_counter()
+    writer = _ChunkWriter(output_path)
+    rows_done = 0
+    chunks_done = 0
+
+    def to_items(rows):
+        return [
+            (str(row.get(brief_field) or ""), row.get("style") or style, row.get("quality") or quality)
+            for row in rows
+        ]
+
+    def finish(rows, prompts):
+        nonlocal rows_done, chunks_done
+        for row, prompt in zip(rows, prompts):
+            row["enhanced_prompt"] = prompt
+        writer.write(rows)
+        rows_done += len(rows)
+        chunks_done += 1
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"[Catalog Enhancer] {rows_done} rows, {rows_done / elapsed:,.0f} rows/sec")
+
+    try:
+        if workers <= 1:
+            for rows in _read_chunks(input_path, chunk_size):
+                finish(rows, _enhance_chunk(to_items(rows)))
+        else:
+            # Keep a bounded window of chunks in flight so memory stays flat and order is preserved
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                in_flight = deque()
+                for rows in _read_chunks(input_path, chunk_size):
+                    in_flight.append((rows, pool.submit(_enhance_chunk, to_items(rows))))
+                    if len(in_flight) >= workers * 2:
+                        done_rows, future = in_flight.popleft()
+                        finish(done_rows, future.result())
+                while in_flight:
+                    done_rows, future = in_flight.popleft()
+                    finish(done_rows, future.result())
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows_done,
+        "chunks": chunks_done,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows_done / seconds, 1) if seconds > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhance a product catalog into image prompts")
+    parser.add_argument("input_path", help="JSONL or Parquet catalog")
+    parser.add_argument("output_path", help="JSONL or Parquet output")
+    parser.add_argument("--style", default="product_ad")
+    parser.add_argument("--quality", default="high")
+    parser.add_argument("--brief-field", default="brief")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    stats = enhance_catalog(
+        args.input_path,
+        args.output_path,
+        style=args.style,
+        quality=args.quality,
+        brief_field=args.brief_field,
+        chunk_size=args.chunk_size,
+        workers=args.workers
+    )
+    print(f"[Catalog Enhancer] Done: {stats['rows']} rows in {stats['seconds']}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
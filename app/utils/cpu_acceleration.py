@@ -0,0 +1,140 @@
+"""
+Opt-in CPU acceleration for the Stable Diffusion pipeline
+Swaps in a DPM-Solver scheduler so fewer steps are needed, runs the denoising
+loop under bf16 autocast when the CPU has native bf16, converts the UNet/VAE
+to channels_last, optionally torch.compiles them and pins the thread count
+"""
+
+import contextlib
+import os
+from typing import Optional
+
+import torch
+
+SCHEDULERS = {
+    "dpm": "DPMSolverMultistepScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+    "default": None
+}
+
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bf16 matmuls (AVX512-BF16 or AMX)"""
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(torch.cpu, check, lambda: False)() for check in checks)
+
+
+def physical_cpu_count() -> int:
+    """Physical cores (hyperthreads share execution units, so they rarely help SD on CPU)"""
+    try:
+        cores = set()
+        physical_id = None
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                field, _, value = line.partition(":")
+                field = field.strip()
+                if field == "physical id":
+                    physical_id = value.strip()
+                elif field == "core id":
+                    cores.add((physical_id, value.strip()))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+class CpuAcceleration:
+    """Set of CPU speed-ups applied to a loaded pipeline; every knob can be toggled"""
+
+    def __init__(self,
+                 scheduler: str = "dpm",
+                 max_steps: Optional[int] = 20,
+                 bf16: str = "auto",
+                 channels_last: bool = True,
+                 compile: bool = False,
+                 num_threads: Optional[int] = None):
+        """
+        Args:
+            scheduler: "dpm", "euler_a" or "default" (keep the checkpoint's scheduler)
+            max_steps: Cap on inference steps; DPM-Solver reaches the quality of
+                50 PNDM steps in about 20 (None keeps the requested steps)
+            bf16: "auto" (use it when the CPU supports it), "on" or "off"
+            channels_last: Convert the UNet and VAE to channels_last memory format
+            compile: torch.compile the UNet and the VAE decoder
+            num_threads: Intra-op thread count (None keeps the torch default)
+        """
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
+        self.scheduler = scheduler
+        self.max_steps = max_steps
+        self.bf16 = cpu_supports_bf16() if bf16 == "auto" else bf16 == "on"
+        self.channels_last = channels_last
+        self.compile = compile
+        self.num_threads = num_threads
+
+    @classmethod
+    def from_env(cls) -> Optional["CpuAcceleration"]:
+        """Build the configuration from SD_CPU_* variables, or None unless SD_CPU_ACCEL is set"""
+        if not _env_flag("SD_CPU_ACCEL", "0"):
+            return None
+        max_steps = os.getenv("SD_CPU_MAX_STEPS", "20")
+        num_threads = os.getenv("SD_CPU_THREADS")
+        return cls(
+            scheduler=os.getenv("SD_CPU_SCHEDULER", "dpm"),
+            max_steps=int(max_steps) if max_steps else None,
+            bf16=os.getenv("SD_CPU_BF16", "auto"),
+            channels_last=_env_flag("SD_CPU_CHANNELS_LAST", "1"),
+            compile=_env_flag("SD_CPU_COMPILE", "0"),
+            num_threads=int(num_threads) if num_threads else None
+        )
+
+    def apply(self, pipeline):
+        """Apply the configuration to a freshly loaded pipeline (in place)"""
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        scheduler_class = SCHEDULERS[self.scheduler]
+        if scheduler_class is not None:
+            import diffusers
+            pipeline.scheduler = getattr(diffusers, scheduler_class).from_config(pipeline.scheduler.config)
+
+        if self.channels_last:
+            pipeline.unet.to(memory_format=torch.channels_last)
+            pipeline.vae.to(memory_format=torch.channels_last)
+
+        if self.compile:
+            pipeline.unet = torch.compile(pipeline.unet)
+            pipeline.vae.decode = torch.compile(pipeline.vae.decode)
+
+        print(f"CPU acceleration enabled: {self.describe()}")
+        return pipeline
+
+    def steps(self, num_inference_steps: int) -> int:
+        """Number of steps actually run for a requested step count"""
+        if self.max_steps is None:
+            return num_inference_steps
+        return min(num_inference_steps, self.max_steps)
+
+    def autocast(self):
+        """Context manager for the pipeline call"""
+        if self.bf16:
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def describe(self) -> str:
+        """Short tag of the enabled knobs; part of the result cache key"""
+        parts = [f"scheduler={self.scheduler}", f"max_steps={self.max_steps}"]
+        if self.bf16:
+            parts.append("bf16")
+        if self.channels_last:
+            parts.append("channels_last")
+        if self.compile:
+            parts.append("compile")
+        if self.num_threads:
+            parts.append(f"threads={self.num_threads}")
+        return ",".join(parts)
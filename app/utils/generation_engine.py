@@ -0,0 +1,491 @@
+"""
+Continuous-batching text generation engine
+Keeps a running batch of sequences on one model: new requests join at token
+boundaries and finished ones leave, so concurrent callers share every
+forward pass instead of queueing behind each other's generate() calls
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import Optional
+
+import torch
+from transformers import DynamicCache
+
+
+class _Sequence:
+    """One request inside the running batch"""
+
+    def __init__(self, prompt_ids, max_new_tokens, temperature, top_p, stop, on_text, cancel_event,
+                 prefix=None, prefix_length=0):
+        self.prompt_ids = prompt_ids  # without the prefix when one is given
+        self.prefix = prefix
+        self.prompt_length = prefix_length + len(prompt_ids)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop = stop or []
+        self.on_text = on_text
+        self.cancel_event = cancel_event or threading.Event()
+        self.future = Future()
+        self.generated = []
+        self.text = ""
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set() or self.future.cancelled()
+
+
+class ContinuousBatchingEngine:
+    """Serve concurrent generation requests from one continuously refilled batch"""
+
+    def __init__(self, loader, max_batch_size: int = 8):
+        """
+        Args:
+            loader: A loaded Phi2Loader (model + tokenizer)
+            max_batch_size: Maximum number of sequences decoded together
+        """
+        self.loader = loader
+        self.max_batch_size = max_batch_size
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._thread = None
+        self._stopped = False
+
+        # Running batch state
+        self._active = []
+        self._cache = None           # DynamicCache, left-padded to a common length
+        self._attention_mask = None  # [batch, cache_length]
+        self._next_positions = None  # [batch]
+        self._last_tokens = None     # [batch]
+
+        self.steps = 0
+        self.tokens_generated = 0
+        self.completed = 0
+        self._batch_size_sum = 0
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self,
+               prompt: str,
+               max_new_tokens: Optional[int] = None,
+               temperature: float = 0.8,
+               top_p: float = 0.9,
+               stop: Optional[list] = None,
+               on_text=None,
+               cancel_event: Optional[threading.Event] = None,
+               max_length: Optional[int] = None,
+               prefix: Optional[str] = None) -> Future:
+        """
+        Queue a prompt; it joins the running batch at the next token boundary
+
+        Args:
+            prompt: Prompt text (the part after prefix, when one is given)
+            max_new_tokens: Generation budget for this request; defaults to what max_length
+                leaves after the prompt, or 64 without max_length
+            temperature: Sampling temperature (0 means greedy)
+            top_p: Nucleus sampling threshold for this request
+            stop: Optional list of stop strings; output is cut before them
+            on_text: Optional callback receiving each newly decoded text fragment
+            cancel_event: Optional threading.Event; once set the sequence leaves the
+                batch at the next step and the future resolves to the partial text
+            max_length: Optional cap on prompt plus generated tokens, like generate()'s max_length
+            prefix: Optional shared leading part of the prompt (e.g. a persona preamble); its
+                KV state comes from the loader's prefix cache and only the rest is prefilled
+
+        Returns:
+            Future resolving to the generated text (prompt excluded)
+        """
+        tokenizer = self.loader.tokenizer
+        if self.loader.model is None or tokenizer is None:
+            raise Exception("Model not loaded. Call load_model() first.")
+        if prefix is not None and not prompt:
+            prompt, prefix = prefix, None  # nothing to prefill after the prefix
+        prefix_length = 0
+        if prefix is None:
+            prompt_ids = tokenizer(prompt, return_tensors="pt")["input_ids"][0]
+        else:
+            # Tokenized apart from the prompt, like Phi2Loader.generate_with_prefix
+            prefix_length = len(tokenizer(prefix)["input_ids"])
+            prompt_ids = tokenizer(prompt, return_tensors="pt", add_special_tokens=False)["input_ids"][0]
+        prompt_length = prefix_length + len(prompt_ids)
+        if max_new_tokens is None:
+            max_new_tokens = 64 if max_length is None else max_length - prompt_length
+        elif max_length is not None:
+            max_new_tokens = min(max_new_tokens, max_length - prompt_length)
+        sequence = _Sequence(prompt_ids, max(1, max_new_tokens), temperature, top_p, stop, on_text,
+                             cancel_event, prefix, prefix_length)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Generation engine has been shut down")
+            self._waiting.append(sequence)
+            self._ensure_thread()
+            self._cond.notify()
+        return sequence.future
+
+    async def stream(self, prompt: str, **kwargs):
+        """Async iterator over text fragments of one generation"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+        cancel_event = threading.Event()
+
+        future = self.submit(
+            prompt,
+            on_text=lambda text: loop.call_soon_threadsafe(queue.put_nowait, text),
+            cancel_event=cancel_event,
+            **kwargs
+        )
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, done))
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            future.result()  # re-raise generation errors
+        finally:
+            # The consumer went away: free the slot in the batch
+            cancel_event.set()
+
+    def get_stats(self) -> dict:
+        """Throughput and batch occupancy counters"""
+        with self._cond:
+            waiting = len(self._waiting)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "active": len(self._active),
+            "waiting": waiting,
+            "steps": self.steps,
+            "tokens_generated": self.tokens_generated,
+            "completed": self.completed,
+            "avg_batch_size": round(self._batch_size_sum / self.steps, 2) if self.steps else 0.0
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the engine after the current step; unfinished requests fail or are cancelled"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    # ----------------------------------------------------------- internals
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="generation-engine", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._active and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    break
+                free = self.max_batch_size - len(self._active)
+                joining = self._waiting[:free]
+                del self._waiting[:free]
+
+            try:
+                with torch.no_grad():
+                    if joining:
+                        self._admit(joining)
+                    if self._active:
+                        self._step()
+            except Exception as e:
+                print(f"Error in generation engine: {e}")
+                for sequence in self._active + joining:
+                    if not sequence.future.done():
+                        sequence.future.set_exception(e)
+                self._reset_batch()
+
+        with self._cond:
+            waiting, self._waiting = self._waiting, []
+        for sequence in waiting:
+            sequence.future.cancel()
+        for sequence in self._active:
+            if not sequence.future.done():
+                sequence.future.set_exception(RuntimeError("Generation engine has been shut down"))
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._active = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_positions = None
+        self._last_tokens = None
+
+    def _admit(self, joining):
+        """Prefill newly arrived prompts and merge them into the running batch"""
+        joining = [s for s in joining if not s.cancelled and s.future.set_running_or_notify_cancel()]
+        plain = [s for s in joining if s.prefix is None]
+        if plain:
+            self._prefill(plain)
+        by_prefix = {}
+        for sequence in joining:
+            if sequence.prefix is not None:
+                by_prefix.setdefault(sequence.prefix, []).append(sequence)
+        for prefix, group in by_prefix.items():
+            self._prefill_after_prefix(prefix, group)
+
+    def _pad_id(self):
+        pad_id = self.loader.tokenizer.pad_token_id
+        return self.loader.tokenizer.eos_token_id if pad_id is None else pad_id
+
+    def _prefill(self, joining):
+        """Prefill whole prompts as one left-padded batch"""
+        device = self.loader.device
+        pad_id = self._pad_id()
+
+        length = max(len(s.prompt_ids) for s in joining)
+        input_ids = torch.full((len(joining), length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(joining), length), dtype=torch.long)
+        for row, sequence in enumerate(joining):
+            n = len(sequence.prompt_ids)
+            input_ids[row, length - n:] = sequence.prompt_ids
+            attention_mask[row, length - n:] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+        position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)
+
+        outputs = self.loader.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=DynamicCache(),
+            use_cache=True
+        )
+        self._join(joining, outputs, attention_mask)
+
+    def _prefill_after_prefix(self, prefix, joining):
+        """Prefill only the prompts after a shared prefix, on top of its cached KV state"""
+        device = self.loader.device
+        pad_id = self._pad_id()
+        prefix_ids, prefix_layers = self.loader.get_prefix_state(prefix)
+        prefix_length = prefix_ids.shape[1]
+
+        # Left-padding the rest of the prompts puts the padding between prefix and prompt;
+        # the attention mask and position ids skip it
+        length = max(len(s.prompt_ids) for s in joining)
+        input_ids = torch.full((len(joining), length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(joining), prefix_length + length), dtype=torch.long)
+        attention_mask[:, :prefix_length] = 1
+        for row, sequence in enumerate(joining):
+            n = len(sequence.prompt_ids)
+            input_ids[row, length - n:] = sequence.prompt_ids
+            attention_mask[row, prefix_length + length - n:] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+        position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)[:, prefix_length:]
+
+        # The forward pass extends the cache with new tensors, so the stored prefix state is never mutated
+        cache = DynamicCache(ddp_cache_data=prefix_layers)
+        if len(joining) > 1:
+            cache.batch_repeat_interleave(len(joining))
+        outputs = self.loader.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=cache,
+            use_cache=True
+        )
+        self._join(joining, outputs, attention_mask)
+
+    def _join(self, joining, outputs, attention_mask):
+        """Sample the first token of freshly prefilled sequences and add them to the batch"""
+        next_tokens = self._sample(outputs.logits[:, -1, :], joining)
+        self._merge(
+            joining,
+            outputs.past_key_values,
+            attention_mask,
+            attention_mask.sum(dim=1),
+        )
+        offset = len(self._active) - len(joining)
+        self._last_tokens[offset:] = next_tokens
+        self._accept(next_tokens, joining, offset)
+
+    def _merge(self, joining, cache, attention_mask, next_positions):
+        """Concatenate a freshly prefilled batch onto the running one"""
+        if not self._active:
+            self._active = list(joining)
+            self._cache = cache
+            self._attention_mask = attention_mask
+            self._next_positions = next_positions
+            self._last_tokens = torch.zeros(len(joining), dtype=torch.long, device=attention_mask.device)
+            return
+
+        old_len = self._attention_mask.shape[1]
+        new_len = attention_mask.shape[1]
+        length = max(old_len, new_len)
+
+        layers = []
+        for old_layer, new_layer in zip(self._cache.layers, cache.layers):
+            keys = torch.cat([_left_pad(old_layer.keys, length), _left_pad(new_layer.keys, length)], dim=0)
+            values = torch.cat([_left_pad(old_layer.values, length), _left_pad(new_layer.values, length)], dim=0)
+            layers.append((keys, values))
+        self._cache = DynamicCache(ddp_cache_data=layers)
+        self._attention_mask = torch.cat(
+            [_left_pad(self._attention_mask, length, dim=1), _left_pad(attention_mask, length, dim=1)], dim=0
+        )
+        self._next_positions = torch.cat([self._next_positions, next_positions])
+        self._last_tokens = torch.cat([
+            self._last_tokens,
+            torch.zeros(len(joining), dtype=torch.long, device=self._last_tokens.device)
+        ])
+        self._active.extend(joining)
+
+    def _step(self):
+        """Decode one token for every active sequence"""
+        batch_size = len(self._active)
+        ones = torch.ones((batch_size, 1), dtype=self._attention_mask.dtype, device=self._attention_mask.device)
+        self._attention_mask = torch.cat([self._attention_mask, ones], dim=1)
+
+        outputs = self.loader.model(
+            input_ids=self._last_tokens[:, None],
+            attention_mask=self._attention_mask,
+            position_ids=self._next_positions[:, None],
+            past_key_values=self._cache,
+            use_cache=True
+        )
+        self._cache = outputs.past_key_values
+        self._next_positions = self._next_positions + 1
+        next_tokens = self._sample(outputs.logits[:, -1, :], self._active)
+        self._last_tokens = next_tokens
+
+        self.steps += 1
+        self._batch_size_sum += batch_size
+        self._accept(next_tokens, self._active, 0)
+
+    def _accept(self, next_tokens, sequences, offset):
+        """Append sampled tokens, report progress and retire finished sequences"""
+        tokenizer = self.loader.tokenizer
+        eos_id = tokenizer.eos_token_id
+        max_positions = getattr(self.loader.model.config, "max_position_embeddings", None)
+        finished = set()
+        for i, (sequence, token) in enumerate(zip(sequences, next_tokens.tolist())):
+            row = offset + i
+            if sequence.cancelled:
+                finished.add(row)
+                continue
+            if token == eos_id:
+                finished.add(row)
+                continue
+
+            sequence.generated.append(token)
+            self.tokens_generated += 1
+            text = tokenizer.decode(sequence.generated, skip_special_tokens=True)
+
+            stop_at = min((text.find(s) for s in sequence.stop if s in text), default=-1)
+            if stop_at >= 0:
+                text = text[:stop_at]
+                finished.add(row)
+            elif len(sequence.generated) >= sequence.max_new_tokens:
+                finished.add(row)
+            elif max_positions and sequence.prompt_length + len(sequence.generated) >= max_positions:
+                finished.add(row)
+
+            if sequence.on_text is not None and len(text) > len(sequence.text):
+                sequence.on_text(text[len(sequence.text):])
+            sequence.text = text
+
+        if finished:
+            self._retire(finished)
+
+    def _retire(self, rows):
+        """Drop finished sequences from the batch and resolve their futures"""
+        finished = [self._active[row] for row in rows]
+        keep = [row for row in range(len(self._active)) if row not in rows]
+
+        if not keep:
+            self._reset_batch()
+        else:
+            index = torch.tensor(keep, device=self._attention_mask.device)
+            self._active = [self._active[row] for row in keep]
+            self._attention_mask = self._attention_mask.index_select(0, index)
+            self._next_positions = self._next_positions.index_select(0, index)
+            self._last_tokens = self._last_tokens.index_select(0, index)
+
+            # Drop padding columns no remaining sequence needs
+            start = int((self._attention_mask.sum(dim=0) > 0).nonzero()[0])
+            layers = [
+                (layer.keys.index_select(0, index)[:, :, start:], layer.values.index_select(0, index)[:, :, start:])
+                for layer in self._cache.layers
+            ]
+            self._cache = DynamicCache(ddp_cache_data=layers)
+            self._attention_mask = self._attention_mask[:, start:]
+
+        for sequence in finished:
+            self.completed += 1
+            if not sequence.future.done():
+                sequence.future.set_result(sequence.text)
+
+    def _sample(self, logits, sequences):
+        """Sample one token per row with that row's temperature and top_p"""
+        logits = logits.float()
+        temperatures = torch.tensor([s.temperature for s in sequences], device=logits.device)
+        top_ps = torch.tensor([s.top_p for s in sequences], device=logits.device)
+        greedy = temperatures <= 0
+
+        probs = torch.softmax(logits / temperatures.clamp(min=1e-5)[:, None], dim=-1)
+        sorted_probs, sorted_index = probs.sort(dim=-1, descending=True)
+        # Keep the smallest prefix whose mass reaches top_p (always at least one token)
+        outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_ps[:, None]
+        sorted_probs = sorted_probs.masked_fill(outside, 0.0)
+        choice = torch.multinomial(sorted_probs, num_samples=1)
+        sampled = sorted_index.gather(-1, choice).squeeze(-1)
+        return torch.where(greedy, logits.argmax(dim=-1), sampled)
+
+
+def _left_pad(tensor, length: int, dim: int = 2):
+    """Left-pad a cache tensor (dim=2) or attention mask (dim=1) with zeros"""
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+# Create a global instance
+_engine = None
+_engine_checkout = None
+_engine_lock = threading.Lock()
+
+def get_generation_engine(max_batch_size: Optional[int] = None) -> ContinuousBatchingEngine:
+    """
+    Get or create the engine serving the default LLM (batch size from GENERATION_ENGINE_MAX_BATCH)
+
+    The engine keeps its model checked out of the model pool for its whole
+    lifetime, so pool eviction never unloads it under a running batch
+    """
+    global _engine, _engine_checkout
+    with _engine_lock:
+        if _engine is None:
+            from app.utils.llm_loader import checkout_llm
+            if max_batch_size is None:
+                max_batch_size = int(os.getenv("GENERATION_ENGINE_MAX_BATCH", "8"))
+            checkout = ExitStack()
+            loader = checkout.enter_context(checkout_llm())
+            if loader.model is None:
+                checkout.close()
+                raise RuntimeError(f"Could not load {loader.model_name}")
+            _engine = ContinuousBatchingEngine(loader, max_batch_size=max_batch_size)
+            _engine_checkout = checkout
+    return _engine
+
+def shutdown_generation_engine():
+    """Stop the global engine (if one was started) and release its model"""
+    global _engine, _engine_checkout
+    with _engine_lock:
+        engine, checkout = _engine, _engine_checkout
+        _engine = _engine_checkout = None
+    if engine is not None:
+        engine.shutdown()
+        checkout.close()
@@ -4,32 +4,70 @@ For production, you can swap to microsoft/phi-2 or other larger models
 """
 
 from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+from transformers import DynamicCache
+from collections import OrderedDict
+import threading
 import torch
+from app.utils.model_pool import estimate_module_bytes, get_model_pool
+from app.utils.metrics import get_metrics, stage_timer
+
+DEFAULT_MODEL_NAME = "distilgpt2"
+
+
+def _record_tokens(prompt_tokens, generated_tokens):
+    """Count prefilled and generated tokens for the llm_tokens metric"""
+    tokens = get_metrics().counter("llm_tokens", "Tokens processed by the LLM", ("kind",))
+    tokens.labels("prompt").inc(prompt_tokens)
+    tokens.labels("generated").inc(generated_tokens)
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stop generation as soon as the cancel event is set"""
+
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full(
+            (input_ids.shape[0],), self.cancel_event.is_set(),
+            dtype=torch.bool, device=input_ids.device
+        )
+
 
 class Phi2Loader:
-    def __init__(self, model_name="distilgpt2"):
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, max_prefix_entries=16):
         self.model_name = model_name
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.model = None
         self.tokenizer = None
         
+        # Precomputed past_key_values for shared prompt prefixes (e.g. persona preambles)
+        self.max_prefix_entries = max_prefix_entries
+        self._prefix_cache = OrderedDict()
+        self._prefix_lock = threading.Lock()
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.saved_prefill_tokens = 0
+        
     def load_model(self):
         """Load the LLM model and tokenizer"""
         try:
             print(f"Loading model {self.model_name} on device: {self.device}")
             
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.model_name,
-                trust_remote_code=True
-            )
-            
-            # Load model
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                device_map=self.device,
-                trust_remote_code=True
-            )
+            with stage_timer("llm", "model_load"):
+                # Load tokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(
+                    self.model_name,
+                    trust_remote_code=True
+                )
+                
+                # Load model
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    device_map=self.device,
+                    trust_remote_code=True
+                )
             
             print("Model loaded successfully!")
             return True
@@ -37,6 +75,22 @@ class Phi2Loader:
             print(f"Error loading model: {e}")
             return False
     
+    def ensure_loaded(self):
+        """Load the model unless it is already loaded"""
+        if self.model is not None and self.tokenizer is not None:
+            return True
+        return self.load_model()
+    
+    def memory_bytes(self):
+        """Estimated memory held by the model weights and cached prefix states"""
+        if self.model is None:
+            return 0
+        total = estimate_module_bytes(self.model)
+        with self._prefix_lock:
+            for _, layers in self._prefix_cache.values():
+                total += sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+        return total
+    
     def generate_text(self, prompt, max_length=100, temperature=0.7, top_p=0.9):
         """Generate text based on the given prompt"""
         if self.model is None or self.tokenizer is None:
@@ -47,7 +101,7 @@ class Phi2Loader:
             inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
             
             # Generate text
-            with torch.no_grad():
+            with torch.no_grad(), stage_timer("llm", "generate"):
                 outputs = self.model.generate(
                     **inputs,
                     max_length=max_length,
@@ -56,6 +110,8 @@ class Phi2Loader:
                     do_sample=True,
                     pad_token_id=self.tokenizer.eos_token_id
                 )
+            prompt_length = inputs["input_ids"].shape[1]
+            _record_tokens(prompt_length, outputs.shape[1] - prompt_length)
             
             # Decode the output
             generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
@@ -64,27 +120,240 @@ class Phi2Loader:
             print(f"Error generating text: {e}")
             return None
     
+    def generate_batch(self, prompts, num_return_sequences=1, max_length=100, temperature=0.7, top_p=0.9):
+        """
+        Generate text for several prompts with a single generate() call
+
+        Prompts are left-padded into one batch and every prompt gets
+        num_return_sequences samples. As with generate_text, max_length
+        counts the prompt tokens, per prompt.
+
+        Args:
+            prompts: List of prompt strings
+            num_return_sequences: Number of samples per prompt
+            max_length: Maximum total length in tokens, prompt included
+            temperature: Sampling temperature
+            top_p: Nucleus sampling threshold
+
+        Returns:
+            One list of generated continuations (prompt removed) per prompt,
+            or None if generation failed
+        """
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded. Call load_model() first.")
+        
+        try:
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            
+            # Left padding keeps every prompt flush against its generated tokens
+            inputs = self.tokenizer(
+                prompts, return_tensors="pt", padding=True, padding_side="left"
+            ).to(self.device)
+            prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+            padded_length = inputs["input_ids"].shape[1]
+            
+            with torch.no_grad(), stage_timer("llm", "generate"):
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max(1, max_length - min(prompt_lengths)),
+                    temperature=temperature,
+                    top_p=top_p,
+                    do_sample=True,
+                    num_return_sequences=num_return_sequences,
+                    pad_token_id=self.tokenizer.pad_token_id
+                )
+            _record_tokens(sum(prompt_lengths), outputs.shape[0] * (outputs.shape[1] - padded_length))
+            
+            # Rows come back grouped per prompt: prompt 0 samples, prompt 1 samples, ...
+            results = []
+            for i, prompt_length in enumerate(prompt_lengths):
+                budget = max(1, max_length - prompt_length)
+                rows = outputs[i * num_return_sequences:(i + 1) * num_return_sequences, padded_length:]
+                results.append(
+                    self.tokenizer.batch_decode(rows[:, :budget], skip_special_tokens=True)
+                )
+            return results
+        except Exception as e:
+            print(f"Error generating text: {e}")
+            return None
+    
+    def get_prefix_state(self, prefix):
+        """Return (prefix token ids, past_key_values) for a prefix, computing it on a miss"""
+        with self._prefix_lock:
+            entry = self._prefix_cache.get(prefix)
+            if entry is not None:
+                self._prefix_cache.move_to_end(prefix)
+                self.prefix_hits += 1
+                self.saved_prefill_tokens += entry[0].shape[1]
+                return entry
+            self.prefix_misses += 1
+        
+        prefix_ids = self.tokenizer(prefix, return_tensors="pt")["input_ids"].to(self.device)
+        with torch.no_grad():
+            outputs = self.model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        entry = (prefix_ids, [(layer.keys, layer.values) for layer in outputs.past_key_values.layers])
+        
+        with self._prefix_lock:
+            self._prefix_cache[prefix] = entry
+            self._prefix_cache.move_to_end(prefix)
+            while len(self._prefix_cache) > self.max_prefix_entries:
+                self._prefix_cache.popitem(last=False)
+        return entry
+    
+    def warm_prefix_cache(self, prefixes):
+        """Precompute past_key_values for a list of prefixes"""
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded. Call load_model() first.")
+        for prefix in prefixes:
+            with self._prefix_lock:
+                cached = prefix in self._prefix_cache
+            if not cached:
+                self.get_prefix_state(prefix)
+                with self._prefix_lock:
+                    self.prefix_misses -= 1  # warming is not a lookup
+    
+    def generate_with_prefix(self, prefix, suffix, num_return_sequences=1, max_length=100, temperature=0.7, top_p=0.9):
+        """
+        Generate text for prefix + suffix, reusing the cached KV state of the prefix
+
+        Only the suffix tokens are prefilled; the prefix past_key_values are
+        computed once per distinct prefix and kept in an LRU cache.
+
+        Args:
+            prefix: Shared leading part of the prompt (e.g. the persona preamble)
+            suffix: Request-specific rest of the prompt
+            num_return_sequences: Number of samples to return
+            max_length: Maximum total length in tokens, prompt included
+            temperature: Sampling temperature
+            top_p: Nucleus sampling threshold
+
+        Returns:
+            List of generated continuations (prompt removed), or None if generation failed
+        """
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded. Call load_model() first.")
+        
+        try:
+            prefix_ids, prefix_layers = self.get_prefix_state(prefix)
+            suffix_ids = self.tokenizer(
+                suffix, return_tensors="pt", add_special_tokens=False
+            )["input_ids"].to(self.device)
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=1).repeat(num_return_sequences, 1)
+            
+            # generate() extends the cache with new tensors, so the stored prefix state is never mutated
+            past_key_values = DynamicCache(ddp_cache_data=prefix_layers)
+            if num_return_sequences > 1:
+                past_key_values.batch_repeat_interleave(num_return_sequences)
+            
+            with torch.no_grad(), stage_timer("llm", "generate"):
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    max_length=max_length,
+                    temperature=temperature,
+                    top_p=top_p,
+                    do_sample=True,
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+            # Only the suffix is prefilled; the prefix comes from the cache
+            _record_tokens(suffix_ids.shape[1] * num_return_sequences,
+                           outputs.shape[0] * (outputs.shape[1] - input_ids.shape[1]))
+            return self.tokenizer.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
+        except Exception as e:
+            print(f"Error generating text: {e}")
+            return None
+    
+    def get_prefix_cache_stats(self):
+        """Prefix cache hit rate and prefill tokens saved by it"""
+        with self._prefix_lock:
+            lookups = self.prefix_hits + self.prefix_misses
+            return {
+                "entries": len(self._prefix_cache),
+                "max_entries": self.max_prefix_entries,
+                "hits": self.prefix_hits,
+                "misses": self.prefix_misses,
+                "hit_rate": round(self.prefix_hits / lookups, 4) if lookups else 0.0,
+                "saved_prefill_tokens": self.saved_prefill_tokens
+            }
+    
+    def stream_text(self, prompt, max_length=100, temperature=0.7, top_p=0.9, cancel_event=None):
+        """
+        Generate text and yield it piece by piece as tokens are decoded
+
+        Generation runs on a background thread. It stops early when
+        cancel_event is set or when the caller stops iterating.
+
+        Args:
+            prompt: Prompt text (not included in the yielded output)
+            max_length: Maximum total length in tokens, prompt included
+            temperature: Sampling temperature
+            top_p: Nucleus sampling threshold
+            cancel_event: Optional threading.Event used to abort generation
+
+        Yields:
+            Newly decoded text fragments
+        """
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded. Call load_model() first.")
+        
+        cancel_event = cancel_event or threading.Event()
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        generate_kwargs = dict(
+            **inputs,
+            max_length=max_length,
+            temperature=temperature,
+            top_p=top_p,
+            do_sample=True,
+            pad_token_id=self.tokenizer.eos_token_id,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel_event)])
+        )
+        
+        thread = threading.Thread(
+            target=self._generate_into_streamer,
+            args=(generate_kwargs, streamer),
+            name="llm-stream",
+            daemon=True
+        )
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            # Reached when generation ends or the consumer goes away
+            cancel_event.set()
+    
+    def _generate_into_streamer(self, generate_kwargs, streamer):
+        """Run generate() for stream_text, always closing the streamer"""
+        try:
+            with torch.no_grad():
+                self.model.generate(**generate_kwargs)
+        except Exception as e:
+            print(f"Error generating text: {e}")
+            streamer.end()
+    
     def unload_model(self):
         """Unload the model to free memory"""
         self.model = None
         self.tokenizer = None
+        with self._prefix_lock:
+            self._prefix_cache.clear()
         torch.cuda.empty_cache()
         print("Model unloaded and memory cleared.")
 
 
-# Create a global instance for the application
-phi2_loader = None
+def initialize_llm(model_name=DEFAULT_MODEL_NAME):
+    """Initialize an LLM in the model pool"""
+    return get_llm(model_name)
 
-def initialize_llm():
-    """Initialize the Phi-2 LLM"""
-    global phi2_loader
-    phi2_loader = Phi2Loader()
-    phi2_loader.load_model()
-    return phi2_loader
+def get_llm(model_name=DEFAULT_MODEL_NAME):
+    """Get the pooled LLM instance for a model name, loading it if needed"""
+    return get_model_pool().get(("llm", model_name))
 
-def get_llm():
-    """Get the global LLM instance"""
-    global phi2_loader
-    if phi2_loader is None:
-        initialize_llm()
-    return phi2_loader
+def checkout_llm(model_name=DEFAULT_MODEL_NAME):
+    """Context manager that pins an LLM while in use"""
+    return get_model_pool().checkout(("llm", model_name))
@@ -0,0 +1,307 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+Counters, gauges and histograms (optionally labelled) plus gauges sampled
+from a callback at scrape time. Disabled unless METRICS_ENABLED is set; the
+registry then hands out one shared no-op metric, so instrumented code pays a
+function call and nothing else
+"""
+
+import contextlib
+import math
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Timer:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _Child:
+    """One label combination of a metric"""
+
+    def __init__(self, metric):
+        self._metric = metric
+        self._lock = metric._lock
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild(_Child):
+    def __init__(self, metric):
+        super().__init__(metric)
+        self.counts = [0] * len(metric.buckets)
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.value += value
+            self.count += 1
+            for i, bound in enumerate(self._metric.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def time(self):
+        """Context manager observing the elapsed seconds"""
+        return _Timer(self)
+
+
+class Metric:
+    """A metric family; use labels(...) for labelled metrics or call inc/set/observe directly"""
+
+    kind = "untyped"
+    child_class = _Child
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.child_class(self))
+        return child
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        for key, child in items:
+            yield self.name, _format_labels(self.labelnames, key), child.value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def samples(self):
+        for name, labels, value in super().samples():
+            yield f"{name}_total", labels, value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    child_class = _HistogramChild
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(child.counts), child.count, child.value) for key, child in self._children.items()]
+        for key, counts, count, total in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), count
+
+
+class _CallbackGauge(Gauge):
+    """Gauge read from fn() at scrape time; fn returns a number or {label values: number}"""
+
+    def __init__(self, name: str, help: str, fn, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[Metrics] Could not sample {self.name}: {e}")
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class MetricsRegistry:
+    """Named metrics, created on first use and rendered in Prometheus text format"""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str = "", labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str = "", labelnames: tuple = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str = "", labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def register_callback(self, name: str, help: str, fn, labelnames: tuple = ()):
+        """Gauge sampled from fn() on every scrape (replaces an earlier one of the same name)"""
+        with self._lock:
+            self._metrics[name] = _CallbackGauge(name, help, fn, labelnames)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            # Counters are exposed with the _total suffix, so their family name carries it too
+            family = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _NoopMetric:
+    def labels(self, *values, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1.0):
+        pass
+
+    def dec(self, amount: float = 1.0):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return _NULL_CONTEXT
+
+
+_NOOP = _NoopMetric()
+
+
+class NoopRegistry:
+    """Registry used when metrics are off"""
+
+    enabled = False
+
+    def counter(self, *args, **kwargs):
+        return _NOOP
+
+    def gauge(self, *args, **kwargs):
+        return _NOOP
+
+    def histogram(self, *args, **kwargs):
+        return _NOOP
+
+    def register_callback(self, *args, **kwargs):
+        pass
+
+    def render(self) -> str:
+        return ""
+
+
+# Create a global instance
+_metrics = None
+
+def get_metrics():
+    """Get the process-wide registry (a no-op one unless METRICS_ENABLED is 1/true/yes)"""
+    global _metrics
+    if _metrics is None:
+        enabled = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+        _metrics = MetricsRegistry() if enabled else NoopRegistry()
+    return _metrics
+
+
+def stage_timer(component: str, stage: str):
+    """Context manager recording one stage in the stage_duration_seconds histogram"""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return _NULL_CONTEXT
+    return metrics.histogram(
+        "stage_duration_seconds", "Time spent per pipeline stage", ("component", "stage")
+    ).labels(component, stage).time()
+
+
+def observe_stage(component: str, stage: str, seconds: float):
+    """Record an already measured stage duration"""
+    get_metrics().histogram(
+        "stage_duration_seconds", "Time spent per pipeline stage", ("component", "stage")
+    ).labels(component, stage).observe(seconds)
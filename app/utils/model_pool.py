@@ -0,0 +1,203 @@
+"""
+Memory-budgeted pool of loaded models
+Keeps several diffusion and LLM checkpoints in one process, loads them on
+demand, and unloads the least recently used ones when their estimated memory
+exceeds the budget. Models checked out for inference are pinned and never
+evicted mid-request
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def estimate_module_bytes(*modules) -> int:
+    """Size of the parameters and buffers of torch modules (None entries are skipped)"""
+    total = 0
+    seen = set()
+    for module in modules:
+        if module is None or not hasattr(module, "parameters"):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            # Tied weights are shared tensors and only count once
+            if tensor.data_ptr() in seen:
+                continue
+            seen.add(tensor.data_ptr())
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class _PoolEntry:
+    def __init__(self, instance):
+        self.instance = instance
+        self.in_use = 0
+        self.bytes = 0
+        self.load_lock = threading.Lock()
+
+
+class ModelPool:
+    """
+    LRU pool of model wrappers with a memory budget
+
+    Pooled objects provide ensure_loaded() -> bool, unload_model() and
+    memory_bytes(). Unloading drops the weights but keeps the wrapper, so
+    callers holding a reference get the model reloaded on their next checkout.
+    """
+
+    def __init__(self, factory, max_bytes: int = 8 * 1024 ** 3):
+        """
+        Args:
+            factory: Callable(key) -> unloaded model wrapper
+            max_bytes: Memory budget for loaded models
+        """
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> _PoolEntry, least recently used first
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _entry(self, key) -> _PoolEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _PoolEntry(self.factory(key))
+                self._entries[key] = entry
+            return entry
+
+    def _find(self, instance):
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.instance is instance:
+                    return key, entry
+        return None, None
+
+    def get(self, key, load: bool = True):
+        """
+        Return the model for key
+
+        Args:
+            key: Model key passed to the factory
+            load: Load it now (evicting others if needed) instead of on first pin
+        """
+        if not load:
+            return self._entry(key).instance
+        with self.checkout(key) as instance:
+            return instance
+
+    @contextmanager
+    def checkout(self, key):
+        """Load the model for key and pin it for the duration of the block"""
+        instance = self._entry(key).instance
+        with self.pin(instance):
+            yield instance
+
+    @contextmanager
+    def pin(self, instance):
+        """
+        Pin a model while it is in use, reloading it first if it was evicted
+
+        Instances that do not belong to the pool are yielded untouched.
+        """
+        key, entry = self._find(instance)
+        if entry is None:
+            yield instance
+            return
+
+        with self._lock:
+            entry.in_use += 1
+            self._entries.move_to_end(key)
+        try:
+            with entry.load_lock:
+                if entry.bytes == 0:
+                    if instance.ensure_loaded():
+                        self.loads += 1
+                    self._refresh(key, entry)
+            yield instance
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                # Lazily loaded components may have grown the model during use
+                self._refresh(key, entry)
+
+    def _refresh(self, key, entry: _PoolEntry):
+        with self._lock:
+            entry.bytes = entry.instance.memory_bytes()
+            self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """Unload idle models, least recently used first, until within budget"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if self.memory_bytes() <= self.max_bytes:
+                    return
+                if key == keep or entry.in_use > 0 or entry.bytes == 0:
+                    continue
+                print(f"[Model Pool] Evicting {key} ({entry.bytes / 1024 ** 2:.0f} MiB)")
+                entry.instance.unload_model()
+                entry.bytes = 0
+                self.evictions += 1
+            if self.memory_bytes() > self.max_bytes:
+                print(f"[Model Pool] Over budget: {self.memory_bytes() / 1024 ** 2:.0f} MiB "
+                      f"pinned or in use, budget {self.max_bytes / 1024 ** 2:.0f} MiB")
+
+    def memory_bytes(self) -> int:
+        """Estimated memory of every loaded model"""
+        with self._lock:
+            return sum(entry.bytes for entry in self._entries.values())
+
+    def get_stats(self) -> dict:
+        """Loaded models, their estimated size and pin counts"""
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "memory_bytes": self.memory_bytes(),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": {
+                    str(key): {"loaded": entry.bytes > 0, "bytes": entry.bytes, "in_use": entry.in_use}
+                    for key, entry in self._entries.items()
+                }
+            }
+
+
+_result_cache = None
+
+def _create_model(key):
+    """Pool factory for ("image", model_id) and ("llm", model_name) keys"""
+    global _result_cache
+    kind, name = key
+    if kind == "image":
+        from app.services.image_cache import ImageResultCache
+        from app.services.image_generator import ImageGenerator
+        from app.services.image_writer import get_image_writer
+        from app.services.output_store import get_output_store
+        from app.services.quality_policy import QualityPolicy
+        from app.services.semantic_cache import get_semantic_cache
+        from app.utils.cpu_acceleration import CpuAcceleration
+        # Cache keys (and semantic cache variants) include the model id, so every checkpoint can share one cache
+        if _result_cache is None:
+            _result_cache = ImageResultCache()
+        return ImageGenerator(model_id=name, result_cache=_result_cache,
+                              acceleration=CpuAcceleration.from_env(),
+                              quality_policy=QualityPolicy.from_env(),
+                              writer=get_image_writer(),
+                              output_store=get_output_store(),
+                              semantic_cache=get_semantic_cache())
+    if kind == "llm":
+        from app.utils.llm_loader import Phi2Loader
+        return Phi2Loader(model_name=name)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+# Create a global instance
+_model_pool = None
+
+def get_model_pool() -> ModelPool:
+    """Get or create the process-wide model pool (budget from MODEL_POOL_MAX_GB)"""
+    global _model_pool
+    if _model_pool is None:
+        max_gb = float(os.getenv("MODEL_POOL_MAX_GB", "8"))
+        _model_pool = ModelPool(_create_model, max_bytes=int(max_gb * 1024 ** 3))
+    return _model_pool
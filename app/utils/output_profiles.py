@@ -0,0 +1,145 @@
+"""
+Multi-platform export of a single render
+Each output profile describes a target size, how to fit the render into it
+(crop or pad), and the encoding; all profiles are produced from the one
+in-memory image with resizing and encoding spread over a thread pool
+"""
+
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+
+class OutputProfile:
+    """Target size, fit policy and encoding for one platform"""
+
+    def __init__(self, name: str, width: int, height: int, fit: str = "crop",
+                 format: str = "JPEG", quality: int = 90, background: str = "white"):
+        """
+        Args:
+            name: Profile name, used in file names
+            width: Output width in pixels
+            height: Output height in pixels
+            fit: "crop" fills the frame and trims the overflow, "pad" letterboxes
+            format: JPEG, WEBP or PNG
+            quality: Encoder quality for JPEG/WebP
+            background: Padding colour for fit="pad"
+        """
+        format = format.upper()
+        if fit not in ("crop", "pad"):
+            raise ValueError(f"Unknown fit policy: {fit}")
+        if format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported format: {format}")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.fit = fit
+        self.format = format
+        self.quality = quality
+        self.background = background
+
+    def render(self, image: Image.Image) -> Image.Image:
+        """Resize the render into this profile's frame"""
+        size = (self.width, self.height)
+        if self.fit == "crop":
+            image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            image = ImageOps.pad(image, size, Image.Resampling.LANCZOS, color=self.background)
+        if self.format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        return image
+
+    def encode(self, image: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        if self.format == "PNG":
+            image.save(buffer, format="PNG", optimize=False)
+        else:
+            image.save(buffer, format=self.format, quality=self.quality)
+        return buffer.getvalue()
+
+
+PLATFORM_PROFILES = {
+    "instagram_square": OutputProfile("instagram_square", 1080, 1080, "crop", "JPEG", 90),
+    "instagram_story": OutputProfile("instagram_story", 1080, 1920, "pad", "JPEG", 90),
+    "twitter": OutputProfile("twitter", 1600, 900, "crop", "JPEG", 85),
+    "linkedin": OutputProfile("linkedin", 1200, 627, "crop", "JPEG", 85),
+    "web": OutputProfile("web", 1024, 1024, "crop", "WEBP", 80)
+}
+
+
+def resolve_profiles(profiles: list) -> list:
+    """Accept profile names from PLATFORM_PROFILES or OutputProfile objects"""
+    resolved = []
+    for profile in profiles:
+        if isinstance(profile, str):
+            if profile not in PLATFORM_PROFILES:
+                raise ValueError(f"Unknown output profile: {profile}")
+            profile = PLATFORM_PROFILES[profile]
+        resolved.append(profile)
+    return resolved
+
+
+_encode_pool = None
+_encode_pool_lock = threading.Lock()
+
+def _get_encode_pool() -> ThreadPoolExecutor:
+    # PIL releases the GIL while resampling and encoding, so threads scale here
+    global _encode_pool
+    if _encode_pool is None:
+        with _encode_pool_lock:
+            if _encode_pool is None:
+                workers = int(os.getenv("EXPORT_THREADS", str(min(4, os.cpu_count() or 1))))
+                _encode_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-export")
+    return _encode_pool
+
+
+def _export_one(image: Image.Image, profile: OutputProfile, output_dir: str, basename: str) -> dict:
+    data = profile.encode(profile.render(image))
+    path = os.path.join(output_dir, f"{basename}_{profile.name}{FORMAT_EXTENSIONS[profile.format]}")
+    # Identical renders share file names and the API serves them, so replace the file in one step
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {
+        "path": path,
+        "width": profile.width,
+        "height": profile.height,
+        "format": profile.format,
+        "bytes": len(data)
+    }
+
+
+def export_profiles(image: Image.Image, profiles: list, output_dir: str, basename: str) -> dict:
+    """
+    Write one file per profile from a single in-memory render
+
+    Args:
+        image: The rendered image
+        profiles: Profile names or OutputProfile objects
+        output_dir: Directory for the exported files
+        basename: File name prefix; the profile name and extension are appended
+
+    Returns:
+        Dictionary of profile name -> path, width, height, format and bytes
+    """
+    profiles = resolve_profiles(profiles)
+    os.makedirs(output_dir, exist_ok=True)
+    image.load()  # decode once before the image is shared between threads
+    pool = _get_encode_pool()
+    futures = {
+        profile.name: pool.submit(_export_one, image, profile, output_dir, basename)
+        for profile in profiles
+    }
+    return {name: future.result() for name, future in futures.items()}
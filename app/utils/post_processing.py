@@ -0,0 +1,118 @@
+"""
+Composable post-processing stages for generated images
+Images flow between stages as PIL images or NumPy arrays without any
+encode/decode round trip; fonts are loaded once per process and every stage
+is timed
+"""
+
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from app.utils.metrics import observe_stage
+
+
+@lru_cache(maxsize=32)
+def load_font(name: str = "arial.ttf", size: int = 24):
+    """TrueType font, falling back to PIL's default; cached per (name, size)"""
+    try:
+        return ImageFont.truetype(name, size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def _as_pil(image):
+    if isinstance(image, Image.Image):
+        return image
+    return Image.fromarray(np.ascontiguousarray(image))
+
+
+def _as_array(image):
+    if isinstance(image, np.ndarray):
+        return image
+    return np.asarray(image)
+
+
+class Stage:
+    """A named post-processing step working on PIL images ("pil") or NumPy arrays ("array")"""
+
+    def __init__(self, name: str, fn, accepts: str = "pil"):
+        if accepts not in ("pil", "array"):
+            raise ValueError(f"Unknown image kind: {accepts}")
+        self.name = name
+        self.fn = fn
+        self.accepts = accepts
+
+    def __call__(self, image):
+        image = _as_pil(image) if self.accepts == "pil" else _as_array(image)
+        return self.fn(image)
+
+
+def resize(width: int, height: int, resample=Image.Resampling.BICUBIC) -> Stage:
+    """Resize to a fixed size (no-op when the image already has it)"""
+    def run(image):
+        if image.size == (width, height):
+            return image
+        return image.resize((width, height), resample)
+    return Stage("resize", run)
+
+
+def watermark(text: str, position: tuple = (10, 10), fill: str = "white",
+              font_name: str = "arial.ttf", font_size: int = 24) -> Stage:
+    """Draw text onto the image in place"""
+    def run(image):
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        ImageDraw.Draw(image).text(position, text, fill=fill, font=load_font(font_name, font_size))
+        return image
+    return Stage("watermark", run)
+
+
+class PostProcessor:
+    """Run an ordered list of stages and keep per-stage timing statistics"""
+
+    def __init__(self, stages: list):
+        """
+        Args:
+            stages: Stage objects applied in order
+        """
+        self.stages = list(stages)
+        self._lock = threading.Lock()
+        self._timings = {stage.name: [0, 0.0, 0.0] for stage in self.stages}  # runs, total ms, max ms
+
+    def run(self, image):
+        """
+        Apply every stage
+
+        Returns:
+            (processed PIL image, {stage name: milliseconds}) for this call
+        """
+        timings = {}
+        for stage in self.stages:
+            started = time.perf_counter()
+            image = stage(image)
+            elapsed = time.perf_counter() - started
+            observe_stage("postprocess", stage.name, elapsed)
+            timings[stage.name] = elapsed * 1000.0
+        with self._lock:
+            for name, ms in timings.items():
+                stats = self._timings[name]
+                stats[0] += 1
+                stats[1] += ms
+                stats[2] = max(stats[2], ms)
+        return _as_pil(image), {name: round(ms, 3) for name, ms in timings.items()}
+
+    def get_stats(self) -> dict:
+        """Average and max milliseconds per stage"""
+        with self._lock:
+            return {
+                name: {
+                    "runs": runs,
+                    "avg_ms": round(total / runs, 3) if runs else 0.0,
+                    "max_ms": round(max_ms, 3)
+                }
+                for name, (runs, total, max_ms) in self._timings.items()
+            }
@@ -2,6 +2,11 @@
 Prompt Enhancer for converting user briefs to enhanced prompts for image generation
 """
 
+import re
+
+# Splits a lowercased brief into words; keywords only match whole words
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
 class PromptEnhancer:
     """Enhance user briefs into detailed, high-quality image generation prompts"""
     
@@ -23,6 +28,41 @@ class PromptEnhancer:
             "furniture": "interior design context, room setting, modern aesthetic",
             "accessories": "jewelry or accessory display, elegant presentation"
         }
+        
+        # Checked in order: the first product type with a matching keyword wins
+        self.product_keywords = {
+            "shoes": ["shoe", "shoes", "sneaker", "boot", "running", "athletic"],
+            "apparel": ["shirt", "dress", "pants", "jacket", "hoodie", "sweater", "clothing"],
+            "electronics": ["phone", "smartphone", "iphone", "laptop", "headphone", "camera", "watch", "device"],
+            "beauty": ["lipstick", "makeup", "perfume", "cream", "cosmetic"],
+            "food": ["cake", "pizza", "burger", "food", "drink", "beverage"],
+            "furniture": ["chair", "table", "sofa", "bed", "furniture"],
+            "accessories": ["watch", "bag", "handbag", "belt", "scarf", "jewelry", "necklace", "bracelet", "diamond"]
+        }
+        
+        self.quality_map = {
+            "low": "standard quality",
+            "medium": "high quality, detailed",
+            "high": "ultra high quality, professional photography, intricate details",
+            "ultra": "4K ultra high definition, professional studio photography, masterpiece quality, intricate details, perfect lighting"
+        }
+        
+        self._keyword_index = self._build_keyword_index()
+    
+    def _build_keyword_index(self) -> dict:
+        """
+        Compile product_keywords into a word -> (priority, product type) index
+        
+        Plural forms are indexed too, so every word of a brief needs a single
+        dictionary lookup.
+        """
+        index = {}
+        for priority, (product_key, keywords) in enumerate(self.product_keywords.items()):
+            for keyword in keywords:
+                for form in (keyword, f"{keyword}s", f"{keyword}es"):
+                    if form not in index or index[form][0] > priority:
+                        index[form] = (priority, product_key)
+        return index
     
     def enhance_prompt(self, user_brief: str, style: str = "product_ad", quality: str = "high") -> str:
         """
@@ -47,13 +87,7 @@ class PromptEnhancer:
         context = self.product_contexts.get(product_type, "professional product photography")
         
         # Quality modifiers
-        quality_map = {
-            "low": "standard quality",
-            "medium": "high quality, detailed",
-            "high": "ultra high quality, professional photography, intricate details",
-            "ultra": "4K ultra high definition, professional studio photography, masterpiece quality, intricate details, perfect lighting"
-        }
-        quality_mod = quality_map.get(quality, quality_map["high"])
+        quality_mod = self.quality_map.get(quality, self.quality_map["high"])
         
         # Build enhanced prompt
         enhanced_prompt = f"""
@@ -68,21 +102,15 @@ Product photography style, commercial quality.
     
     def _identify_product_type(self, brief: str) -> str:
         """Identify product type from brief for better context"""
-        brief_lower = brief.lower()
-        
-        for product_key, keywords in {
-            "shoes": ["shoe", "shoes", "sneaker", "boot", "running", "athletic"],
-            "apparel": ["shirt", "dress", "pants", "jacket", "hoodie", "sweater", "clothing"],
-            "electronics": ["phone", "laptop", "headphone", "camera", "watch", "device"],
-            "beauty": ["lipstick", "makeup", "perfume", "cream", "cosmetic"],
-            "food": ["cake", "pizza", "burger", "food", "drink", "beverage"],
-            "furniture": ["chair", "table", "sofa", "bed", "furniture"],
-            "accessories": ["watch", "bag", "belt", "scarf", "jewelry", "necklace", "bracelet", "diamond"]
-        }.items():
-            if any(keyword in brief_lower for keyword in keywords):
-                return product_key
+        best = None
+        for word in _WORD_RE.findall(brief.lower()):
+            match = self._keyword_index.get(word)
+            if match is not None and (best is None or match[0] < best[0]):
+                best = match
+                if best[0] == 0:
+                    break
         
-        return "product"
+        return best[1] if best is not None else "product"
     
     def batch_enhance(self, briefs: list, style: str = "product_ad", quality: str = "high") -> list:
         """
@@ -97,6 +125,20 @@ Product photography style, commercial quality.
             List of enhanced prompts
         """
         return [self.enhance_prompt(brief, style, quality) for brief in briefs]
+    
+    def batch_enhance_file(self, input_path: str, output_path: str, **kwargs) -> dict:
+        """
+        Streaming batch_enhance for catalogs too large for memory
+        
+        Reads JSONL or Parquet in chunks and writes the rows back with an
+        added enhanced_prompt column. See app.utils.catalog_enhancer.enhance_catalog
+        for the options.
+        
+        Returns:
+            Run statistics (rows, seconds, rows_per_sec)
+        """
+        from app.utils.catalog_enhancer import enhance_catalog
+        return enhance_catalog(input_path, output_path, **kwargs)
 
 
 # Create a global instance
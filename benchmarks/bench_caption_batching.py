@@ -0,0 +1,66 @@
+"""
+Benchmark: batched caption decoding vs the per-caption generate() loop
+
+Usage:
+    python -m benchmarks.bench_caption_batching [--model tiny|distilgpt2] [--repeats 3]
+"""
+
+import argparse
+import statistics
+import time
+
+from app.services.caption_generator import CaptionGenerator
+from app.utils.brand_personas import get_persona, list_personas
+from benchmarks.tiny_models import load_llm
+
+PRODUCT = "Premium noise-canceling wireless headphones with 30-hour battery life"
+
+
+def sequential_multi_persona(generator: CaptionGenerator, product: str, num_captions: int = 2) -> dict:
+    """The previous implementation: one generate() call per caption per persona"""
+    result = {}
+    for persona_key in list_personas():
+        prompt = generator._craft_prompt(product, get_persona(persona_key))
+        captions = []
+        for _ in range(num_captions):
+            text = generator.llm.generate_text(prompt, max_length=150, temperature=0.8, top_p=0.9)
+            if text:
+                captions.append(text.replace(prompt, "").strip())
+        result[persona_key] = captions
+    return result
+
+
+def _time(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help='"tiny" random model or a Hugging Face model name')
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = CaptionGenerator()
+    generator.llm = load_llm(args.model)
+
+    # Warm up both paths once
+    sequential_multi_persona(generator, PRODUCT, num_captions=1)
+    generator.generate_multi_persona_captions(PRODUCT)
+
+    loop = _time(lambda: sequential_multi_persona(generator, PRODUCT), args.repeats)
+    batched = _time(lambda: generator.generate_multi_persona_captions(PRODUCT), args.repeats)
+
+    personas = len(list_personas())
+    print(f"Model: {args.model} | {personas} personas x 2 captions | {args.repeats} repeats")
+    print(f"  sequential loop ({personas * 2} generate calls): median {statistics.median(loop):.3f}s")
+    print(f"  batched (1 generate call):           median {statistics.median(batched):.3f}s")
+    print(f"  speedup: {statistics.median(loop) / statistics.median(batched):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
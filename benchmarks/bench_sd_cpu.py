@@ -0,0 +1,106 @@
+"""
+Benchmark: CPU acceleration knobs for the Stable Diffusion pipeline
+
+Each knob is timed on its own against the baseline (checkpoint scheduler,
+float32, default memory format), followed by everything combined.
+
+Usage:
+    python -m benchmarks.bench_sd_cpu [--model tiny|runwayml/stable-diffusion-v1-5]
+                                      [--size 64] [--steps 50] [--repeats 3] [--threads N] [--compile]
+
+The threads variant pins torch to --threads (default: the physical core count)
+while the baseline keeps torch's own default.
+"""
+
+import argparse
+import statistics
+import time
+
+import torch
+
+from app.utils.cpu_acceleration import CpuAcceleration, cpu_supports_bf16, physical_cpu_count
+from benchmarks.tiny_models import build_tiny_sd_pipeline
+
+PROMPT = "Professional product photography of red running shoes, studio lighting"
+
+
+def _load_pipeline(model: str):
+    if model == "tiny":
+        return build_tiny_sd_pipeline()
+    from diffusers import StableDiffusionPipeline
+    pipeline = StableDiffusionPipeline.from_pretrained(model, torch_dtype=torch.float32, safety_checker=None)
+    pipeline.set_progress_bar_config(disable=True)
+    return pipeline
+
+
+def _variants(args) -> dict:
+    """Name -> CpuAcceleration (None is the baseline)"""
+    knob_off = {"scheduler": "default", "max_steps": None, "bf16": "off", "channels_last": False}
+    variants = {
+        "baseline": None,
+        "dpm_solver": CpuAcceleration(**{**knob_off, "scheduler": "dpm", "max_steps": args.dpm_steps}),
+        "bf16_autocast": CpuAcceleration(**{**knob_off, "bf16": "on"}),
+        "channels_last": CpuAcceleration(**{**knob_off, "channels_last": True}),
+        "threads": CpuAcceleration(**{**knob_off, "num_threads": args.threads}),
+    }
+    if args.compile:
+        variants["torch_compile"] = CpuAcceleration(**{**knob_off, "compile": True})
+    variants["all"] = CpuAcceleration(
+        scheduler="dpm", max_steps=args.dpm_steps, bf16="auto", channels_last=True,
+        compile=args.compile, num_threads=args.threads
+    )
+    return variants
+
+
+def _time_variant(args, acceleration) -> dict:
+    default_threads = torch.get_num_threads()
+    pipeline = _load_pipeline(args.model)
+    steps = args.steps
+    autocast = None
+    if acceleration is not None:
+        acceleration.apply(pipeline)
+        steps = acceleration.steps(steps)
+        autocast = acceleration.autocast
+
+    def render():
+        with torch.no_grad():
+            if autocast is not None:
+                with autocast():
+                    return pipeline(PROMPT, height=args.size, width=args.size, num_inference_steps=steps)
+            return pipeline(PROMPT, height=args.size, width=args.size, num_inference_steps=steps)
+
+    render()  # warm-up (also triggers torch.compile)
+    timings = []
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - started)
+    torch.set_num_threads(default_threads)
+    return {"steps": steps, "median_s": statistics.median(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--dpm-steps", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=physical_cpu_count(),
+                        help="Thread count for the threads variant (default: physical cores)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--compile", action="store_true", help="Include torch.compile (slow first call)")
+    args = parser.parse_args()
+
+    print(f"Model: {args.model}, {args.size}x{args.size}, native bf16: {cpu_supports_bf16()}, "
+          f"threads: {args.threads} (torch default {torch.get_num_threads()})")
+    if args.threads == torch.get_num_threads():
+        print("Note: --threads matches torch's default, so the threads variant equals the baseline")
+    results = {name: _time_variant(args, acceleration) for name, acceleration in _variants(args).items()}
+    baseline = results["baseline"]["median_s"]
+    print(f"{'variant':<16}{'steps':>6}{'s/image':>10}{'speedup':>9}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['steps']:>6}{result['median_s']:>10.3f}{baseline / result['median_s']:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
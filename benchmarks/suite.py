@@ -0,0 +1,315 @@
+"""
+Benchmark suite for the hot paths, with JSON output and baseline comparison
+
+Groups:
+    micro    prompt enhancement (single and batch), post-processing, platform export
+    caption  CaptionGenerator on a tiny random-weight LLM
+    image    ImageGenerator on a tiny random-weight Stable Diffusion pipeline
+    api      the FastAPI app through an in-process client
+
+Every benchmark runs a few warm-up iterations, then records per-iteration
+latency; results hold n, mean and p50/p90/p95/p99/min/max in milliseconds.
+Models are random-weight and seeded, so runs are reproducible on one machine.
+
+Usage:
+    python -m benchmarks.suite [--groups micro,caption,image,api] [--scale 1.0]
+                               [--output results.json] [--baseline benchmarks/baseline.json]
+                               [--threshold 0.5] [--save-baseline]
+
+With --baseline, each benchmark's p50 is compared to the stored one and the
+exit status is 1 if any got slower by more than the threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import torch
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+BRIEFS = [
+    "Red running shoes", "Blue leather handbag", "Smartphone with sleek design",
+    "Organic green tea", "Vintage wrist watch", "Noise-canceling headphones",
+    "Minimalist desk lamp", "Handmade ceramic mug", "Electric mountain bike",
+    "Luxury perfume bottle"
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Linearly interpolated percentile (numpy's default method)"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(timings_s: list) -> dict:
+    """Latency statistics in milliseconds"""
+    ms = [t * 1000.0 for t in timings_s]
+    return {
+        "n": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 4),
+        "p50_ms": round(percentile(ms, 50), 4),
+        "p90_ms": round(percentile(ms, 90), 4),
+        "p95_ms": round(percentile(ms, 95), 4),
+        "p99_ms": round(percentile(ms, 99), 4),
+        "min_ms": round(min(ms), 4),
+        "max_ms": round(max(ms), 4)
+    }
+
+
+def run_benchmark(fn, iterations: int, warmup: int = None) -> dict:
+    """Warm up, then time fn() once per iteration"""
+    warmup = max(1, iterations // 10) if warmup is None else warmup
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def _micro(workdir: str) -> dict:
+    from PIL import Image
+    from app.utils.output_profiles import export_profiles
+    from app.utils.post_processing import PostProcessor, resize, watermark
+    from app.utils.prompt_enhancer import PromptEnhancer
+
+    enhancer = PromptEnhancer()
+    briefs = BRIEFS * 10
+    render = Image.effect_noise((512, 512), 64).convert("RGB")
+    processor = PostProcessor([resize(1024, 1024), watermark("My Social Media")])
+    export_dir = os.path.join(workdir, "exports")
+    return {
+        "prompt_enhance": (lambda: enhancer.enhance_prompt("Red running shoes", "product_ad", "high"), 2000),
+        "prompt_batch_enhance_100": (lambda: enhancer.batch_enhance(briefs, "lifestyle", "high"), 200),
+        "post_process_1024": (lambda: processor.run(render.copy()), 30),
+        "export_4_profiles": (lambda: export_profiles(
+            render, ["instagram_square", "instagram_story", "twitter", "linkedin"], export_dir, "bench"
+        ), 10)
+    }
+
+
+def _caption(workdir: str) -> dict:
+    from app.services.caption_generator import CaptionGenerator
+    from app.utils.brand_personas import get_all_personas
+    from app.utils.generation_engine import ContinuousBatchingEngine
+    from benchmarks.tiny_models import load_llm
+
+    generator = CaptionGenerator()
+    generator.llm = load_llm("tiny")
+    # The path the API serves by default (CAPTION_CONTINUOUS_BATCHING=1): a private
+    # engine over its own tiny model, with the persona prefixes warmed as initialize() does
+    engine_generator = CaptionGenerator(use_engine=True)
+    engine_generator.llm = load_llm("tiny")
+    engine_generator.engine = ContinuousBatchingEngine(engine_generator.llm, max_batch_size=8)
+    engine_generator.llm.warm_prefix_cache(
+        [engine_generator._persona_prefix(persona) for persona in get_all_personas().values()]
+    )
+    product = "Premium noise-canceling wireless headphones with 30-hour battery life"
+    return {
+        "caption_single": (lambda: generator.generate_caption(product, "luxury_brand", num_captions=1), 10),
+        "caption_multi_persona": (lambda: generator.generate_multi_persona_captions(product), 5),
+        "caption_engine_single": (
+            lambda: engine_generator.generate_caption(product, "luxury_brand", num_captions=1), 10
+        ),
+        "caption_engine_multi_persona": (lambda: engine_generator.generate_multi_persona_captions(product), 5)
+    }
+
+
+def _image(workdir: str) -> dict:
+    from app.services.image_generator import ImageGenerator
+    from app.services.quality_policy import QUALITY_TIERS, QualityPolicy
+    from benchmarks.tiny_models import build_tiny_sd_pipeline
+
+    tiers = {tier: {"num_inference_steps": 4, "height": 64, "width": 64} for tier in QUALITY_TIERS}
+    generator = ImageGenerator(quality_policy=QualityPolicy(tier_settings=tiers))
+    generator.pipeline = build_tiny_sd_pipeline()
+    output_dir = os.path.join(workdir, "images")
+    counter = iter(range(10 ** 9))
+    return {
+        "image_render_64px_4steps": (lambda: generator._run_pipeline(["Red running shoes"], 64, 64, 4, 7.5), 5),
+        "image_generate_64px_4steps": (lambda: generator.generate_image(
+            BRIEFS[next(counter) % len(BRIEFS)], output_dir=output_dir, seed=0
+        ), 5)
+    }
+
+
+def _api(workdir: str) -> dict:
+    # Keep the store and index of the run out of the working tree
+    os.environ.setdefault("OUTPUT_STORE_DIR", os.path.join(workdir, "store"))
+    from fastapi.testclient import TestClient
+    import app.main as main
+    from app.services.image_writer import get_image_writer
+
+    client = TestClient(main.app)
+    counter = iter(range(10 ** 9))
+
+    def submit_and_wait():
+        job_id = client.post("/result", json={"brief": f"Red running shoes {next(counter)}"}).json()["job_id"]
+        while True:
+            job = client.get(f"/result/{job_id}").json()
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(0.001)
+
+    job = submit_and_wait()
+    get_image_writer().flush()
+    image_url = job["result"]["image_url"]
+    etag = client.get(image_url).headers["etag"]
+    return {
+        "api_root": (lambda: client.get("/"), 200),
+        "api_result_job": (submit_and_wait, 30),
+        "api_image_full": (lambda: client.get(image_url), 50),
+        "api_image_304": (lambda: client.get(image_url, headers={"If-None-Match": etag}), 200),
+        "api_thumbnail": (lambda: client.get(f"{image_url}/thumbnail"), 100)
+    }
+
+
+GROUPS = {"micro": _micro, "caption": _caption, "image": _image, "api": _api}
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads()
+    }
+
+
+def run_suite(groups: list, scale: float = 1.0, quiet: bool = True) -> dict:
+    """
+    Run the selected groups
+
+    Args:
+        groups: Names from GROUPS
+        scale: Multiplier for every benchmark's iteration count
+        quiet: Swallow the code under test's print() output while timing
+
+    Returns:
+        Dictionary with meta and results (benchmark name -> statistics)
+    """
+    random.seed(0)
+    torch.manual_seed(0)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for group in groups:
+            output = io.StringIO() if quiet else sys.stdout
+            with contextlib.redirect_stdout(output):
+                benchmarks = GROUPS[group](workdir)
+                for name, (fn, iterations) in benchmarks.items():
+                    stats = run_benchmark(fn, max(1, int(iterations * scale)))
+                    results[name] = {"group": group, **stats}
+            for name in benchmarks:
+                print(f"  {name:<30}p50 {results[name]['p50_ms']:>10.3f} ms   "
+                      f"p95 {results[name]['p95_ms']:>10.3f} ms   n={results[name]['n']}")
+    return {"meta": _metadata(), "results": results}
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.5,
+            metric: str = "p50_ms", min_delta_ms: float = 0.05) -> list:
+    """
+    Compare results with a baseline run
+
+    Args:
+        results: "results" of the current run
+        baseline: "results" of the baseline run
+        threshold: Relative slowdown that counts as a regression (0.5 = 50%)
+        metric: Statistic compared
+        min_delta_ms: Absolute differences below this are noise, never regressions
+
+    Returns:
+        One row per current benchmark with baseline, current, ratio and status
+        (regression, improved, ok or new)
+    """
+    rows = []
+    for name, stats in results.items():
+        current = stats[metric]
+        if name not in baseline:
+            rows.append({"name": name, "baseline": None, "current": current, "ratio": None, "status": "new"})
+            continue
+        previous = baseline[name][metric]
+        ratio = current / previous if previous > 0 else float("inf")
+        if ratio > 1 + threshold and current - previous > min_delta_ms:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold) and previous - current > min_delta_ms:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": previous, "current": current,
+                     "ratio": round(ratio, 3), "status": status})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", default=",".join(GROUPS), help="Comma-separated groups to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="Iteration count multiplier")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="Allowed p50 slowdown (0.5 = 50%%); shared CI runners need the slack")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"Store this run as the baseline ({DEFAULT_BASELINE} unless --baseline is given)")
+    parser.add_argument("--verbose", action="store_true", help="Show output of the code under test")
+    args = parser.parse_args()
+
+    groups = [group.strip() for group in args.groups.split(",") if group.strip()]
+    unknown = [group for group in groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"Unknown groups: {unknown}; choose from {list(GROUPS)}")
+
+    run = run_suite(groups, scale=args.scale, quiet=not args.verbose)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(run["results"], baseline["results"], threshold=args.threshold)
+        print(f"\nAgainst baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+        for row in rows:
+            previous = f"{row['baseline']:.3f}" if row["baseline"] is not None else "-"
+            ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else ""
+            print(f"  {row['name']:<30}{previous:>12} -> {row['current']:>10.3f} ms {ratio:>8}  {row['status']}")
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
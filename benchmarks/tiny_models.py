@@ -0,0 +1,118 @@
+"""
+Tiny random-weight models for benchmarks and tests
+Built entirely offline so hot paths can be timed without downloading checkpoints
+"""
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import CLIPTextConfig, CLIPTextModel, GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+from app.utils.brand_personas import BRAND_PERSONAS
+from app.utils.llm_loader import Phi2Loader
+
+
+def build_tiny_tokenizer(vocab_size: int = 512) -> PreTrainedTokenizerFast:
+    """Byte-level BPE tokenizer trained on the persona definitions"""
+    corpus = [str(persona) for persona in BRAND_PERSONAS.values()]
+    corpus.append(
+        "You are a brand. Your tone is Your writing style is "
+        "Product: Generate a compelling marketing caption for social media:"
+    )
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(corpus * 4, trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<|endoftext|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False
+    ))
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<|endoftext|>",
+        eos_token="<|endoftext|>",
+        unk_token="<|endoftext|>"
+    )
+
+
+def build_tiny_llm(n_layer: int = 2, n_embd: int = 64, seed: int = 0) -> Phi2Loader:
+    """Return a Phi2Loader wrapping a randomly initialised GPT-2 sized for CPU benchmarks"""
+    tokenizer = build_tiny_tokenizer()
+    torch.manual_seed(seed)
+    config = GPT2Config(
+        vocab_size=len(tokenizer),
+        n_positions=512,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=2,
+        bos_token_id=tokenizer.eos_token_id,
+        eos_token_id=tokenizer.eos_token_id
+    )
+    loader = Phi2Loader(model_name="tiny-random-gpt2")
+    loader.device = "cpu"
+    loader.tokenizer = tokenizer
+    loader.model = GPT2LMHeadModel(config).eval()
+    return loader
+
+
+def build_tiny_sd_pipeline(seed: int = 0, block_out_channels: tuple = (32, 64)):
+    """Randomly initialised Stable Diffusion pipeline with the real UNet/VAE/CLIP architectures"""
+    from diffusers import AutoencoderKL, PNDMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+
+    tokenizer = build_tiny_tokenizer()
+    tokenizer.model_max_length = 77
+    tokenizer.pad_token = tokenizer.eos_token
+    torch.manual_seed(seed)
+    unet = UNet2DConditionModel(
+        block_out_channels=block_out_channels,
+        layers_per_block=1,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32,
+        norm_num_groups=32
+    )
+    vae = AutoencoderKL(
+        block_out_channels=block_out_channels,
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D",) * 2,
+        up_block_types=("UpDecoderBlock2D",) * 2,
+        latent_channels=4,
+        norm_num_groups=32
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        intermediate_size=37,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        max_position_embeddings=tokenizer.model_max_length,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    ))
+    pipeline = StableDiffusionPipeline(
+        vae=vae.eval(),
+        text_encoder=text_encoder.eval(),
+        tokenizer=tokenizer,
+        unet=unet.eval(),
+        scheduler=PNDMScheduler(skip_prk_steps=True, steps_offset=1),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False
+    )
+    pipeline.set_progress_bar_config(disable=True)
+    return pipeline
+
+
+def load_llm(model_name: str = "tiny") -> Phi2Loader:
+    """Tiny random model for "tiny", otherwise a real checkpoint through Phi2Loader"""
+    if model_name == "tiny":
+        return build_tiny_llm()
+    loader = Phi2Loader(model_name=model_name)
+    if not loader.load_model():
+        raise RuntimeError(f"Could not load {model_name}")
+    return loader
@@ -0,0 +1,159 @@
+"""
+Tests for the image micro-batching scheduler
+Uses a fake render function so no Stable Diffusion weights are needed
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image
+
+from app.services.batch_scheduler import BatchScheduler
+from app.services.image_generator import ImageGenerator
+
+
+class FakeRenderer:
+    """Records every batched call and returns the prompts as 'images'"""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, prompts, height, width, steps, guidance_scale, seeds):
+        with self.lock:
+            self.calls.append((list(prompts), height, width, steps, guidance_scale))
+        time.sleep(self.delay)
+        return [f"image:{prompt}" for prompt in prompts]
+
+
+def test_concurrent_requests_share_one_call():
+    """Requests with the same parameters are rendered together"""
+    renderer = FakeRenderer()
+    scheduler = BatchScheduler(renderer, max_batch_size=4, max_wait_ms=200)
+
+    futures = [scheduler.submit(f"prompt {i}", num_inference_steps=20) for i in range(4)]
+    results = [future.result(timeout=5) for future in futures]
+    scheduler.shutdown()
+
+    assert len(renderer.calls) == 1
+    assert [r.image for r in results] == [f"image:prompt {i}" for i in range(4)]
+    assert all(r.batch_size == 4 for r in results)
+
+
+def test_incompatible_requests_are_not_mixed():
+    """Different sizes, steps or guidance scales go into separate batches"""
+    renderer = FakeRenderer()
+    scheduler = BatchScheduler(renderer, max_batch_size=8, max_wait_ms=50)
+
+    a = scheduler.submit("a", num_inference_steps=20)
+    b = scheduler.submit("b", num_inference_steps=30)
+    c = scheduler.submit("c", height=768, width=768, num_inference_steps=20)
+    d = scheduler.submit("d", num_inference_steps=20)
+    for future in (a, b, c, d):
+        future.result(timeout=5)
+    scheduler.shutdown()
+
+    batches = sorted(sorted(call[0]) for call in renderer.calls)
+    assert batches == [["a", "d"], ["b"], ["c"]]
+
+
+def test_max_batch_size_is_respected():
+    """A burst larger than max_batch_size is split into several calls"""
+    renderer = FakeRenderer()
+    scheduler = BatchScheduler(renderer, max_batch_size=3, max_wait_ms=100)
+
+    futures = [scheduler.submit(f"p{i}") for i in range(7)]
+    for future in futures:
+        future.result(timeout=5)
+    scheduler.shutdown()
+
+    assert all(len(call[0]) <= 3 for call in renderer.calls)
+    stats = scheduler.get_stats()
+    assert stats["requests"] == 7
+    assert stats["batches"] == len(renderer.calls)
+    assert stats["queue_depth"] == 0
+
+
+def test_lone_request_is_flushed_after_max_wait():
+    """A single request does not wait longer than the configured window"""
+    renderer = FakeRenderer()
+    scheduler = BatchScheduler(renderer, max_batch_size=16, max_wait_ms=30)
+
+    started = time.monotonic()
+    result = scheduler.submit("alone").result(timeout=5)
+    elapsed = time.monotonic() - started
+    scheduler.shutdown()
+
+    assert result.batch_size == 1
+    assert elapsed < 1.0
+    assert scheduler.get_stats()["max_queue_wait_ms"] >= 25
+
+
+def test_pipeline_errors_reach_every_caller():
+    """A failing pipeline call fails the futures instead of hanging them"""
+    def broken(prompts, *args):
+        raise RuntimeError("out of memory")
+
+    scheduler = BatchScheduler(broken, max_batch_size=2, max_wait_ms=50)
+    futures = [scheduler.submit("x"), scheduler.submit("y")]
+    for future in futures:
+        try:
+            future.result(timeout=5)
+            assert False, "expected the render to fail"
+        except RuntimeError as e:
+            assert "out of memory" in str(e)
+    scheduler.shutdown()
+
+
+def test_bad_brief_only_fails_its_own_batch_entry():
+    """A brief the prompt enhancer rejects does not fail the rest of the batch"""
+    class PickyEnhancer:
+        def enhance_prompt(self, brief, style, quality):
+            if "cursed" in brief:
+                raise ValueError("unsupported brief")
+            return f"photo of {brief}"
+
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(list(prompt))
+        return SimpleNamespace(images=[Image.new("RGB", (8, 8)) for _ in prompt])
+
+    generator = ImageGenerator(max_batch_size=4, max_batch_wait_ms=50)
+    generator.pipeline = fake_pipeline
+    generator.prompt_enhancer = PickyEnhancer()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = generator.batch_generate_images(["Red shoes", "cursed lamp", "Gold necklace"], output_dir=tmp)
+
+    assert "error" not in results[0] and "error" not in results[2]
+    assert "unsupported brief" in results[1]["error"]
+    assert calls == [["photo of Red shoes", "photo of Gold necklace"]]
+    generator.scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_concurrent_requests_share_one_call,
+        test_incompatible_requests_are_not_mixed,
+        test_max_batch_size_is_respected,
+        test_lone_request_is_flushed_after_max_wait,
+        test_pipeline_errors_reach_every_caller,
+        test_bad_brief_only_fails_its_own_batch_entry,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
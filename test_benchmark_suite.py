@@ -0,0 +1,40 @@
+"""
+Tests for the benchmark suite's statistics and baseline comparison
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmarks.suite import compare, percentile, run_suite, summarize
+
+
+def test_percentiles_interpolate():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.5
+    assert percentile(values, 95) == 95.05
+    assert percentile([3.0], 99) == 3.0
+
+    stats = summarize([0.001, 0.002, 0.003])
+    assert stats["n"] == 3 and stats["p50_ms"] == 2.0 and stats["max_ms"] == 3.0
+
+
+def test_compare_flags_regressions_beyond_noise():
+    baseline = {"slow": {"p50_ms": 10.0}, "fast": {"p50_ms": 10.0}, "tiny": {"p50_ms": 0.001},
+                "same": {"p50_ms": 10.0}}
+    current = {"slow": {"p50_ms": 20.0}, "fast": {"p50_ms": 4.0}, "tiny": {"p50_ms": 0.01},
+               "same": {"p50_ms": 11.0}, "added": {"p50_ms": 1.0}}
+
+    status = {row["name"]: row["status"] for row in compare(current, baseline, threshold=0.5)}
+
+    assert status == {"slow": "regression", "fast": "improved", "tiny": "ok", "same": "ok", "added": "new"}
+
+
+def test_micro_group_runs(capsys):
+    run = run_suite(["micro"], scale=0.01)
+
+    assert set(run["results"]) >= {"prompt_enhance", "prompt_batch_enhance_100"}
+    assert run["results"]["prompt_enhance"]["n"] == 20
+    assert run["meta"]["python"]
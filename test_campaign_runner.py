@@ -0,0 +1,152 @@
+"""
+Tests for the resumable bulk campaign runner
+Uses fake caption/image functions so no models are needed
+"""
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.campaign_runner import read_campaign, run_campaign
+
+
+class Crash(BaseException):
+    """Simulates the process dying mid-run"""
+
+
+def _write_campaign(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps({"brief": f"Product {i}", "persona": "luxury_brand", "num_captions": 2}) + "\n")
+
+
+def _captions(brief, persona, num_captions):
+    return [f"{persona}: {brief} #{n}" for n in range(num_captions)]
+
+
+def _read_output(output_dir):
+    return pq.read_table(output_dir).sort_by("row").to_pylist()
+
+
+def test_rows_are_written_as_parquet_parts(tmp_path):
+    source = tmp_path / "campaign.jsonl"
+    _write_campaign(source, 25)
+
+    stats = run_campaign(str(source), str(tmp_path / "out"), concurrency=3, flush_rows=10,
+                         caption_fn=_captions, image_fn=lambda b, s, q: f"/img/{b}.png", progress=False)
+
+    rows = _read_output(str(tmp_path / "out"))
+    assert stats["rows"] == 25 and stats["parts"] == 3
+    assert [row["row"] for row in rows] == list(range(25))
+    assert rows[7]["captions"] == ["luxury_brand: Product 7 #0", "luxury_brand: Product 7 #1"]
+    assert rows[7]["image_path"] == "/img/Product 7.png"
+
+
+def test_failed_rows_are_recorded_not_fatal(tmp_path):
+    source = tmp_path / "campaign.jsonl"
+    _write_campaign(source, 5)
+
+    def flaky_image(brief, style, quality):
+        if brief == "Product 2":
+            raise RuntimeError("pipeline exploded")
+        return "ok.png"
+
+    stats = run_campaign(str(source), str(tmp_path / "out"), caption_fn=_captions,
+                         image_fn=flaky_image, progress=False)
+
+    rows = _read_output(str(tmp_path / "out"))
+    assert stats["errors"] == 1
+    assert rows[2]["error"] == "pipeline exploded" and rows[3]["error"] is None
+
+
+def test_malformed_lines_are_recorded_and_checkpointed(tmp_path):
+    source = tmp_path / "campaign.jsonl"
+    _write_campaign(source, 3)
+    with open(source, "a", encoding="utf-8") as f:
+        f.write('{"brief": "Product 3", \n')
+        f.write('["not", "an", "object"]\n')
+        f.write(json.dumps({"brief": "Product 5"}) + "\n")
+
+    stats = run_campaign(str(source), str(tmp_path / "out"), caption_fn=_captions,
+                         image_fn=lambda b, s, q: "ok.png", progress=False)
+
+    rows = _read_output(str(tmp_path / "out"))
+    assert stats["rows"] == 6 and stats["errors"] == 2
+    assert rows[3]["error"].startswith("Invalid row on line 4")
+    assert "expected a JSON object" in rows[4]["error"]
+    assert rows[5]["brief"] == "Product 5" and rows[5]["error"] is None
+    # The resume moves past them instead of failing at the same line
+    resumed = run_campaign(str(source), str(tmp_path / "out"), caption_fn=_captions,
+                           image_fn=lambda b, s, q: "ok.png", progress=False)
+    assert resumed["rows"] == 0 and resumed["skipped"] == 6
+
+
+def test_crashed_run_resumes_without_redoing_rows(tmp_path):
+    source = tmp_path / "campaign.jsonl"
+    output_dir = str(tmp_path / "out")
+    _write_campaign(source, 30)
+    calls = []
+    lock = threading.Lock()
+
+    def crashing_image(brief, style, quality):
+        with lock:
+            calls.append(brief)
+            if len(calls) == 17:
+                raise Crash()
+        return "ok.png"
+
+    with pytest.raises(Crash):
+        run_campaign(str(source), output_dir, concurrency=1, flush_rows=5,
+                     caption_fn=_captions, image_fn=crashing_image, progress=False)
+    with open(os.path.join(output_dir, "_checkpoint.json"), encoding="utf-8") as f:
+        checkpointed = {row for part in json.load(f)["parts"] for row in part["rows"]}
+    assert 5 <= len(checkpointed) < 17
+
+    calls.clear()
+    stats = run_campaign(str(source), output_dir, concurrency=2, flush_rows=5,
+                         caption_fn=_captions, image_fn=lambda b, s, q: calls.append(b) or "ok.png",
+                         progress=False)
+
+    # Only rows that never reached a checkpointed part are generated again
+    assert stats["skipped"] == len(checkpointed)
+    assert stats["rows"] == 30 - len(checkpointed)
+    assert not {f"Product {row}" for row in checkpointed} & set(calls)
+    rows = _read_output(output_dir)
+    assert [row["row"] for row in rows] == list(range(30))
+    assert not any(name.endswith(".tmp") for name in os.listdir(output_dir))
+
+
+def test_failed_rows_are_retried_only_when_asked(tmp_path):
+    source = tmp_path / "campaign.jsonl"
+    output_dir = str(tmp_path / "out")
+    _write_campaign(source, 6)
+
+    def flaky_image(brief, style, quality):
+        if brief in ("Product 1", "Product 4"):
+            raise RuntimeError("pipeline exploded")
+        return "ok.png"
+
+    run_campaign(str(source), output_dir, flush_rows=3, caption_fn=_captions, image_fn=flaky_image, progress=False)
+    calls = []
+    retry = lambda b, s, q: calls.append(b) or "retried.png"
+
+    assert run_campaign(str(source), output_dir, caption_fn=_captions, image_fn=retry, progress=False)["rows"] == 0
+    stats = run_campaign(str(source), output_dir, caption_fn=_captions, image_fn=retry,
+                         retry_errors=True, progress=False)
+
+    assert sorted(calls) == ["Product 1", "Product 4"]
+    assert stats["rows"] == 2 and stats["skipped"] == 4 and stats["errors"] == 0
+    rows = read_campaign(output_dir).to_pylist()
+    assert [row["row"] for row in rows] == list(range(6))
+    assert [row["image_path"] for row in rows] == ["ok.png", "retried.png", "ok.png", "ok.png", "retried.png", "ok.png"]
+    assert all(row["error"] is None for row in rows)
+    assert run_campaign(str(source), output_dir, caption_fn=_captions, image_fn=retry,
+                        retry_errors=True, progress=False)["rows"] == 0
@@ -0,0 +1,90 @@
+"""
+Tests for batched caption decoding
+Uses a tiny random-weight GPT-2 so no checkpoint download is needed
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.caption_generator import CaptionGenerator
+from app.utils.brand_personas import get_persona, list_personas
+from benchmarks.tiny_models import build_tiny_llm
+
+PRODUCT = "Red running shoes"
+
+
+def _generator_counting_calls():
+    generator = CaptionGenerator()
+    generator.llm = build_tiny_llm()
+    calls = []
+    original = generator.llm.model.generate
+
+    def counting_generate(*args, **kwargs):
+        calls.append(kwargs)
+        return original(*args, **kwargs)
+
+    generator.llm.model.generate = counting_generate
+    return generator, calls
+
+
+def test_num_captions_use_one_generate_call():
+    generator, calls = _generator_counting_calls()
+    captions = generator.generate_caption(PRODUCT, "tech_startup", num_captions=3)
+
+    assert len(calls) == 1
+    assert calls[0]["input_ids"].shape[0] == 3
+    assert isinstance(captions, list) and len(captions) == 3
+    assert all(isinstance(caption, str) for caption in captions)
+
+
+def test_multi_persona_fan_out_is_one_batch():
+    generator, calls = _generator_counting_calls()
+    result = generator.generate_multi_persona_captions(PRODUCT)
+
+    assert len(calls) == 1
+    assert list(result) == list_personas()
+    assert all(len(captions) == 2 for captions in result.values())
+
+
+def test_prompt_is_not_echoed_back():
+    generator, _ = _generator_counting_calls()
+    for caption in generator.generate_caption(PRODUCT, "luxury_brand", num_captions=2):
+        assert "Generate a compelling marketing caption" not in caption
+
+
+def test_unknown_persona_keeps_its_error_entry():
+    generator, _ = _generator_counting_calls()
+    result = generator.generate_multi_persona_captions(PRODUCT, ["luxury_brand", "unknown"])
+
+    assert result["unknown"] == {"error": "Unknown persona: unknown"}
+    assert len(result["luxury_brand"]) == 2
+
+
+def test_persona_prefix_is_prefilled_once():
+    """Repeated captions for a persona reuse the cached preamble KV state"""
+    generator, calls = _generator_counting_calls()
+    llm = generator.llm
+    prefix = generator._persona_prefix(get_persona("eco_friendly"))
+    prefix_tokens = len(llm.tokenizer(prefix)["input_ids"])
+
+    generator.generate_caption(PRODUCT, "eco_friendly", num_captions=1)
+    generator.generate_caption("Bamboo toothbrush", "eco_friendly", num_captions=2)
+
+    stats = llm.get_prefix_cache_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["saved_prefill_tokens"] == prefix_tokens
+    # generate() only had to prefill what the cache does not already hold
+    assert calls[-1]["past_key_values"].get_seq_length() >= prefix_tokens
+
+
+def test_prefix_cache_is_bounded():
+    generator, _ = _generator_counting_calls()
+    llm = generator.llm
+    llm.max_prefix_entries = 2
+    for persona_key in list_personas():
+        generator.generate_caption(PRODUCT, persona_key)
+    assert llm.get_prefix_cache_stats()["entries"] == 2
@@ -0,0 +1,83 @@
+"""
+Tests for the Server-Sent Events caption streaming endpoint
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+class FakeCaptionGenerator:
+    """Streams a fixed caption and remembers the cancel event it was given"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.cancel_event = None
+
+    def stream_caption(self, product_description, persona_key, cancel_event=None):
+        self.cancel_event = cancel_event
+        for token in self.tokens:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield token
+
+
+def _events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event = {"event": "message"}
+        for line in block.split("\n"):
+            field, _, value = line.partition(": ")
+            event[field] = json.loads(value) if field == "data" else value
+        events.append(event)
+    return events
+
+
+def test_tokens_are_streamed_as_sse(monkeypatch):
+    fake = FakeCaptionGenerator([" Run", " faster", " today!"])
+    monkeypatch.setattr(main, "get_caption_generator", lambda: fake)
+    client = TestClient(main.app)
+
+    resp = client.get("/captions/stream", params={
+        "product_description": "Red running shoes",
+        "persona_key": "tech_startup"
+    })
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(resp.text)
+    assert [e["data"]["token"] for e in events[:-1]] == [" Run", " faster", " today!"]
+    assert events[-1]["event"] == "done"
+    assert events[-1]["data"]["caption"] == "Run faster today!"
+    assert fake.cancel_event.is_set()
+
+
+def test_generation_errors_become_error_events(monkeypatch):
+    class Broken(FakeCaptionGenerator):
+        def stream_caption(self, product_description, persona_key, cancel_event=None):
+            yield " partial"
+            raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(main, "get_caption_generator", lambda: Broken([]))
+    client = TestClient(main.app)
+
+    events = _events(client.get("/captions/stream", params={
+        "product_description": "x", "persona_key": "luxury_brand"
+    }).text)
+    assert events[-1]["event"] == "error"
+    assert "model crashed" in events[-1]["data"]["error"]
+
+
+def test_unknown_persona_is_404():
+    client = TestClient(main.app)
+    resp = client.get("/captions/stream", params={
+        "product_description": "x", "persona_key": "not_a_persona"
+    })
+    assert resp.status_code == 404
@@ -0,0 +1,68 @@
+"""
+Tests for the caption Celery tasks, queue routing and priority lanes
+Task bodies are called in-process, so no broker is needed
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+
+import app.services.caption_tasks as caption_tasks
+from app.celery_worker import PRIORITY_LANES, celery_app, send_task_in_lane
+from app.services.caption_generator import CaptionGenerator
+from benchmarks.tiny_models import build_tiny_llm
+
+
+def _tiny_generator():
+    generator = CaptionGenerator()
+    generator.llm = build_tiny_llm()
+    return generator
+
+
+def test_caption_tasks_run_on_their_own_queue():
+    routes = celery_app.conf.task_routes
+    assert routes[caption_tasks.generate_caption_task.name]["queue"] == "caption_queue"
+    assert routes[caption_tasks.generate_multi_persona_captions_task.name]["queue"] == "caption_queue"
+    assert routes["app.services.image_tasks.generate_image_task"]["queue"] == "image_queue"
+    assert celery_app.conf.task_annotations[caption_tasks.generate_caption_task.name]["rate_limit"]
+
+
+def test_caption_task_body(monkeypatch):
+    monkeypatch.setattr(caption_tasks, "get_caption_generator", _tiny_generator)
+    result = caption_tasks.generate_caption_task.run(
+        {"product_description": "Red running shoes", "persona_key": "tech_startup", "num_captions": 2}
+    )
+    assert result["persona_key"] == "tech_startup"
+    assert len(result["captions"]) == 2
+
+
+def test_multi_persona_task_body(monkeypatch):
+    monkeypatch.setattr(caption_tasks, "get_caption_generator", _tiny_generator)
+    result = caption_tasks.generate_multi_persona_captions_task.run(
+        {"product_description": "Red running shoes", "personas": ["luxury_brand", "eco_friendly"]}
+    )
+    assert list(result["captions"]) == ["luxury_brand", "eco_friendly"]
+
+
+class RecordingTask:
+    def __init__(self):
+        self.sent = []
+
+    def apply_async(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+def test_interactive_lane_outranks_bulk():
+    task = RecordingTask()
+    send_task_in_lane(task, {"product_description": "a"}, lane="bulk")
+    send_task_in_lane(task, {"product_description": "b"})
+
+    bulk, interactive = (sent["priority"] for sent in task.sent)
+    assert interactive < bulk  # the Redis transport serves lower numbers first
+    assert sorted(PRIORITY_LANES.values()) == celery_app.conf.broker_transport_options["priority_steps"]
+    with pytest.raises(ValueError):
+        send_task_in_lane(task, {}, lane="urgent")
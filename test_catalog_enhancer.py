@@ -0,0 +1,89 @@
+"""
+Tests for the compiled product-type matcher and streaming catalog enhancement
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.utils.catalog_enhancer import enhance_catalog
+from app.utils.prompt_enhancer import PromptEnhancer
+
+BRIEFS = ["Red running shoes", "Blue silk dress", "Gold necklace", "Chocolate cake", "Modern chair"]
+
+
+def test_product_type_detection():
+    enhancer = PromptEnhancer()
+    cases = [
+        ("Red Nike running shoes", "shoes"),
+        ("Colorful summer sneakers", "shoes"),
+        ("Cotton T-shirt", "apparel"),
+        ("iPhone 15 Pro", "electronics"),
+        ("Premium wireless headphones", "electronics"),
+        ("Gold luxury watch", "electronics"),  # electronics is checked before accessories
+        ("Luxury face cream", "beauty"),
+        ("Chocolate cake", "food"),
+        ("Modern chair", "furniture"),
+        ("Diamond bracelet", "accessories"),
+        ("Blue leather handbag", "accessories"),
+        ("Unknown product", "product"),
+    ]
+    for brief, expected in cases:
+        assert enhancer._identify_product_type(brief) == expected, brief
+
+
+def test_keywords_match_whole_words_only():
+    """Substrings inside longer words no longer trigger a product type"""
+    enhancer = PromptEnhancer()
+    assert enhancer._identify_product_type("Embedded sensor kit") == "product"
+    assert enhancer._identify_product_type("Leather bedside lamp") == "product"
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def test_jsonl_catalog_in_chunks_across_processes():
+    enhancer = PromptEnhancer()
+    rows = [{"sku": i, "brief": BRIEFS[i % len(BRIEFS)]} for i in range(23)]
+    rows[3]["style"] = "luxury"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "catalog.jsonl")
+        target = os.path.join(tmp, "out", "enhanced.jsonl")
+        _write_jsonl(source, rows)
+
+        stats = enhance_catalog(source, target, chunk_size=5, workers=2, progress=False)
+        with open(target, encoding="utf-8") as f:
+            output = [json.loads(line) for line in f]
+
+    assert stats["rows"] == 23
+    assert stats["chunks"] == 5
+    assert stats["rows_per_sec"] > 0
+    assert [row["sku"] for row in output] == list(range(23))
+    assert output[0]["enhanced_prompt"] == enhancer.enhance_prompt(BRIEFS[0])
+    assert output[3]["enhanced_prompt"] == enhancer.enhance_prompt(BRIEFS[3], style="luxury")
+
+
+def test_parquet_round_trip():
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "catalog.parquet")
+        target = os.path.join(tmp, "enhanced.parquet")
+        pq.write_table(pa.Table.from_pylist([{"title": b} for b in BRIEFS * 3]), source)
+
+        stats = enhance_catalog(source, target, brief_field="title", chunk_size=4, progress=False)
+        table = pq.read_table(target)
+
+    assert stats["rows"] == 15
+    assert table.column_names == ["title", "enhanced_prompt"]
+    assert table.num_rows == 15
@@ -0,0 +1,79 @@
+"""
+Tests for the opt-in CPU acceleration mode of the image generator
+Uses a tiny random-weight Stable Diffusion pipeline so no checkpoint download is needed
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import torch
+from PIL import Image
+
+from app.services.image_generator import ImageGenerator
+from app.utils.cpu_acceleration import CpuAcceleration
+from benchmarks.tiny_models import build_tiny_sd_pipeline
+
+
+def test_disabled_unless_requested(monkeypatch):
+    monkeypatch.delenv("SD_CPU_ACCEL", raising=False)
+    assert CpuAcceleration.from_env() is None
+
+    monkeypatch.setenv("SD_CPU_ACCEL", "1")
+    monkeypatch.setenv("SD_CPU_BF16", "off")
+    monkeypatch.setenv("SD_CPU_MAX_STEPS", "25")
+    acceleration = CpuAcceleration.from_env()
+    assert acceleration.scheduler == "dpm"
+    assert acceleration.bf16 is False
+    assert acceleration.steps(50) == 25 and acceleration.steps(10) == 10
+
+
+def test_apply_swaps_scheduler_and_memory_format():
+    pipeline = build_tiny_sd_pipeline()
+    CpuAcceleration(bf16="off").apply(pipeline)
+
+    assert type(pipeline.scheduler).__name__ == "DPMSolverMultistepScheduler"
+    weight = pipeline.unet.conv_in.weight
+    assert weight.is_contiguous(memory_format=torch.channels_last)
+
+
+def test_generator_caps_steps_and_autocasts(tmp_path):
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append({**kwargs, "autocast": torch.is_autocast_enabled("cpu")})
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    generator = ImageGenerator(acceleration=CpuAcceleration(bf16="on", max_steps=20))
+    generator.pipeline = fake_pipeline
+    result = generator.generate_image("Red running shoes", output_dir=str(tmp_path))
+
+    assert result["inference_steps"] == 20
+    assert calls == [{**calls[0], "num_inference_steps": 20, "autocast": True}]
+    assert generator._cache_model_id() != generator.model_id
+
+
+def test_tiny_pipeline_renders_in_bf16():
+    acceleration = CpuAcceleration(bf16="on", max_steps=2)
+    generator = ImageGenerator(acceleration=acceleration)
+    generator.pipeline = acceleration.apply(build_tiny_sd_pipeline())
+
+    images = generator._run_pipeline(["red running shoes"], 64, 64, acceleration.steps(50), 7.5)
+    assert images[0].size == (64, 64)
+
+
+def test_unseeded_prompts_leave_the_global_rng_alone():
+    def fake_pipeline(prompt, generator=None, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (8, 8)) for _ in prompt])
+
+    generator = ImageGenerator()
+    generator.pipeline = fake_pipeline
+    torch.manual_seed(1234)
+    expected = torch.rand(3)
+
+    torch.manual_seed(1234)
+    generator._call_pipeline(["a", "b"], 8, 8, 1, 7.5, [7, None])
+    assert torch.equal(torch.rand(3), expected)
@@ -0,0 +1,178 @@
+"""
+Tests for the continuous-batching generation engine
+Uses a tiny random-weight GPT-2 so no checkpoint download is needed
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import app.utils.generation_engine as generation_engine
+import app.utils.model_pool as model_pool
+from app.services.caption_generator import CaptionGenerator
+from app.utils.generation_engine import ContinuousBatchingEngine
+from app.utils.llm_loader import DEFAULT_MODEL_NAME
+from app.utils.model_pool import ModelPool
+from benchmarks.tiny_models import build_tiny_llm
+
+PROMPTS = [
+    "You are a Luxury Lifestyle brand.",
+    "Product: Red running shoes",
+    "Hi",
+    "Your tone is caring, motivating, supportive",
+]
+
+_loader = build_tiny_llm()
+
+
+def _reference(prompt: str, max_new_tokens: int) -> str:
+    """Greedy output of a plain, unbatched generate() call"""
+    tokenizer = _loader.tokenizer
+    inputs = tokenizer(prompt, return_tensors="pt")
+    output = _loader.model.generate(
+        **inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id
+    )
+    return tokenizer.decode(output[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+def _reference_after_prefix(prefix: str, prompt: str, max_new_tokens: int) -> str:
+    """Greedy generate() output for a prefix and prompt tokenized apart, as the engine does"""
+    tokenizer = _loader.tokenizer
+    input_ids = torch.cat([
+        tokenizer(prefix, return_tensors="pt")["input_ids"],
+        tokenizer(prompt, return_tensors="pt", add_special_tokens=False)["input_ids"]
+    ], dim=1)
+    output = _loader.model.generate(
+        input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens,
+        do_sample=False, pad_token_id=tokenizer.eos_token_id
+    )
+    return tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def test_batched_greedy_matches_generate():
+    """Sequences of different lengths decoded together give the same text as alone"""
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=4)
+    futures = [engine.submit(p, max_new_tokens=8 + i, temperature=0) for i, p in enumerate(PROMPTS)]
+    outputs = [future.result(timeout=30) for future in futures]
+    engine.shutdown()
+
+    for i, prompt in enumerate(PROMPTS):
+        assert outputs[i] == _reference(prompt, 8 + i)
+    assert engine.get_stats()["avg_batch_size"] > 1
+
+
+def test_requests_join_a_running_batch():
+    """Late arrivals join between tokens without disturbing running sequences"""
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=2)
+    futures = []
+    for prompt in PROMPTS:
+        futures.append(engine.submit(prompt, max_new_tokens=16, temperature=0))
+        time.sleep(0.005)
+    outputs = [future.result(timeout=30) for future in futures]
+    engine.shutdown()
+
+    assert outputs == [_reference(prompt, 16) for prompt in PROMPTS]
+    assert engine.get_stats()["completed"] == len(PROMPTS)
+
+
+def test_stop_strings_and_per_request_sampling():
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=4)
+    full = _reference(PROMPTS[1], 24)
+    stop = full[5:8]
+    greedy = engine.submit(PROMPTS[1], max_new_tokens=24, temperature=0, stop=[stop])
+    sampled = engine.submit(PROMPTS[1], max_new_tokens=24, temperature=1.0, top_p=0.5)
+
+    assert greedy.result(timeout=30) == full[:full.find(stop)]
+    assert isinstance(sampled.result(timeout=30), str)
+    engine.shutdown()
+
+
+def test_max_length_sets_the_default_budget():
+    """Like generate(max_length=...), the budget is whatever the prompt leaves"""
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=2)
+    prompt_length = len(_loader.tokenizer(PROMPTS[0])["input_ids"])
+    output = engine.submit(PROMPTS[0], max_length=prompt_length + 80, temperature=0).result(timeout=30)
+    capped = engine.submit(PROMPTS[0], max_new_tokens=5, max_length=prompt_length + 80,
+                           temperature=0).result(timeout=30)
+    engine.shutdown()
+
+    assert output == _reference(PROMPTS[0], 80)
+    assert capped == _reference(PROMPTS[0], 5)
+
+
+def test_prefixed_prompts_reuse_the_prefix_cache():
+    """Prompts after a cached prefix decode exactly like the full prompt, next to plain ones"""
+    prefixes = [PROMPTS[0], PROMPTS[3]]
+    _loader.warm_prefix_cache(prefixes)
+    hits = _loader.get_prefix_cache_stats()["hits"]
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=8)
+    requests = [(prefixes[0], " Product: shoes"), (prefixes[0], " Hi"),
+                (prefixes[1], " Product: a very long description of a red running shoe")]
+    futures = [engine.submit(prompt, prefix=prefix, max_new_tokens=12, temperature=0) for prefix, prompt in requests]
+    plain = engine.submit(PROMPTS[1], max_new_tokens=12, temperature=0)
+
+    assert [future.result(timeout=30) for future in futures] == [
+        _reference_after_prefix(prefix, prompt, 12) for prefix, prompt in requests
+    ]
+    assert plain.result(timeout=30) == _reference(PROMPTS[1], 12)
+    engine.shutdown()
+    # One lookup per distinct prefix in the joining batch
+    assert _loader.get_prefix_cache_stats()["hits"] - hits >= 2
+
+
+def test_async_stream_and_cancellation():
+    engine = ContinuousBatchingEngine(_loader, max_batch_size=4)
+
+    async def collect():
+        return [text async for text in engine.stream(PROMPTS[0], max_new_tokens=10, temperature=0)]
+
+    assert "".join(asyncio.run(collect())) == _reference(PROMPTS[0], 10)
+
+    cancel = threading.Event()
+    future = engine.submit(PROMPTS[0], max_new_tokens=10000, cancel_event=cancel)
+    time.sleep(0.05)
+    cancel.set()
+    assert len(future.result(timeout=10)) > 0
+    assert engine.get_stats()["active"] == 0
+    engine.shutdown()
+
+
+def test_caption_generator_is_served_by_the_engine():
+    generator = CaptionGenerator()
+    generator.llm = _loader
+    generator.engine = ContinuousBatchingEngine(_loader, max_batch_size=8)
+
+    captions = generator.generate_caption("Red running shoes", "tech_startup", num_captions=3)
+    multi = generator.generate_multi_persona_captions("Red running shoes", ["luxury_brand", "eco_friendly"])
+    streamed = list(generator.stream_caption("Red running shoes", "luxury_brand"))
+
+    assert len(captions) == 3 and all(isinstance(caption, str) for caption in captions)
+    assert [len(v) for v in multi.values()] == [2, 2]
+    assert isinstance("".join(streamed), str)
+    assert generator.engine.get_stats()["completed"] == 3 + 4 + 1
+    # Persona preambles come from the prefix cache instead of being prefilled every time
+    assert generator.llm.get_prefix_cache_stats()["hits"] > 0
+    generator.engine.shutdown()
+
+
+def test_global_engine_keeps_its_model_checked_out(monkeypatch):
+    pool = ModelPool(lambda key: build_tiny_llm(), max_bytes=0)
+    monkeypatch.setattr(model_pool, "_model_pool", pool)
+    monkeypatch.setattr(generation_engine, "_engine", None)
+
+    engine = generation_engine.get_generation_engine(max_batch_size=2)
+    pool.get(("llm", "other"))   # over budget: idle models are evicted
+
+    key = str(("llm", DEFAULT_MODEL_NAME))
+    assert pool.get_stats()["models"][key]["in_use"] == 1
+    assert engine.loader.model is not None
+    assert engine.submit(PROMPTS[0], max_new_tokens=4, temperature=0).result(timeout=30)
+    generation_engine.shutdown_generation_engine()
+    assert pool.get_stats()["models"][key]["in_use"] == 0
@@ -0,0 +1,259 @@
+"""
+Tests for the content-addressed image result cache and the semantic near-duplicate cache
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image
+
+from app.services.image_cache import ImageResultCache
+from app.services.image_generator import ImageGenerator
+from app.services.image_writer import ImageWriter
+
+
+def _write_png(directory: str, name: str, size: int = 64) -> str:
+    path = os.path.join(directory, name)
+    Image.new("RGB", (size, size), color="red").save(path)
+    return path
+
+
+def _key(prompt: str, seed=None) -> str:
+    return ImageResultCache.make_key(prompt, "product_ad", "high", 50, 7.5, 512, 512, seed, "model")
+
+
+def test_key_covers_every_parameter():
+    """Changing any input produces a different key"""
+    base = _key("Red running shoes")
+    assert base == _key("Red running shoes")
+    assert base != _key("Red running shoes", seed=1)
+    assert base != ImageResultCache.make_key("Red running shoes", "luxury", "high", 50, 7.5, 512, 512, None, "model")
+    assert base != ImageResultCache.make_key("Red running shoes", "product_ad", "high", 50, 7.5, 512, 512, None, "other")
+
+
+def test_hit_miss_and_lru_eviction():
+    """The least recently used entry is evicted once the size budget is exceeded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = _write_png(tmp, "source.png")
+        entry_size = os.path.getsize(source)
+        cache = ImageResultCache(os.path.join(tmp, "cache"), max_bytes=entry_size * 2)
+
+        assert cache.get(_key("a")) is None
+        cache.put(_key("a"), source)
+        cache.put(_key("b"), source)
+        assert cache.get(_key("a")) is not None  # "a" is now most recently used
+        cache.put(_key("c"), source)
+
+        assert cache.get(_key("b")) is None
+        assert cache.get(_key("a")) is not None
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["entries"] == 2
+        assert stats["hits"] == 2
+        assert stats["misses"] == 2
+
+
+def test_index_survives_restart():
+    """A new cache instance picks up the files written by a previous one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = _write_png(tmp, "source.png")
+        cache_dir = os.path.join(tmp, "cache")
+        ImageResultCache(cache_dir).put(_key("a"), source)
+        assert ImageResultCache(cache_dir).get(_key("a")) is not None
+
+
+def test_generator_skips_pipeline_on_hit():
+    """A repeated brief is answered from the cache without calling the pipeline"""
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(prompt)
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = ImageGenerator(result_cache=ImageResultCache(os.path.join(tmp, "cache")))
+        generator.pipeline = fake_pipeline
+
+        first = generator.generate_image("Red running shoes", output_dir=tmp)
+        generator.pipeline = None  # a hit must not need the model at all
+        second = generator.generate_image("Red running shoes", output_dir=tmp)
+
+        assert first["cache_hit"] is False
+        assert second["cache_hit"] is True
+        assert len(calls) == 1
+        assert os.path.exists(second["image_path"])
+        assert generator.get_cache_stats()["hits"] == 1
+
+
+class BagOfWordsEmbedder:
+    """Deterministic stand-in for sentence-transformers: hashed word counts"""
+
+    def __call__(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), 64), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().replace("shoes", "shoe").split():
+                vectors[row, zlib.crc32(word.encode()) % 64] += 1.0
+        return vectors
+
+
+def _semantic_cache(directory, **kwargs):
+    from app.services.semantic_cache import SemanticImageCache
+    return SemanticImageCache(directory, embedder=BagOfWordsEmbedder(), threshold=0.8, **kwargs)
+
+
+def test_semantic_cache_matches_paraphrases_within_style():
+    with tempfile.TemporaryDirectory() as tmp:
+        image = _write_png(tmp, "shoe.png")
+        cache = _semantic_cache(os.path.join(tmp, "index"))
+        cache.add("red running shoe", "product_ad", "high", image)
+
+        match = cache.lookup("Red running shoes", "product_ad", "high")
+        assert match is not None and match["image_path"] == image
+        assert cache.lookup("Red running shoes", "luxury", "high") is None
+        assert cache.lookup("Blue leather handbag", "product_ad", "high") is None
+
+
+def test_semantic_index_persists_and_evicts_oldest():
+    with tempfile.TemporaryDirectory() as tmp:
+        image = _write_png(tmp, "img.png")
+        index_dir = os.path.join(tmp, "index")
+        cache = _semantic_cache(index_dir, max_entries=2)
+        cache.add_batch(["gold necklace", "silver laptop", "red running shoe"], "product_ad", "high", [image] * 3)
+        cache.save()
+        assert cache.get_stats()["evictions"] == 1
+
+        reloaded = _semantic_cache(index_dir, max_entries=2)
+        assert reloaded.lookup("gold necklace", "product_ad", "high") is None
+        assert reloaded.lookup("silver laptop", "product_ad", "high") is not None
+
+
+def test_generator_reuses_render_for_paraphrased_brief():
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(prompt)
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = ImageGenerator(semantic_cache=_semantic_cache(os.path.join(tmp, "index")))
+        generator.pipeline = fake_pipeline
+
+        first = generator.generate_image("red running shoe", output_dir=tmp)
+        second = generator.generate_image("Red running shoes", output_dir=tmp)
+
+        assert len(calls) == 1
+        assert second["cache_hit"] is True
+        assert second["image_path"] == first["image_path"]
+        assert second["semantic_match"]["brief"] == "red running shoe"
+
+
+def test_semantic_partitions_separate_render_settings():
+    with tempfile.TemporaryDirectory() as tmp:
+        image = _write_png(tmp, "shoe.png")
+        index_dir = os.path.join(tmp, "index")
+        cache = _semantic_cache(index_dir)
+        cache.add("red running shoe", "product_ad", "high", image, variant="model-a|40|512x512")
+        cache.save()
+
+        reloaded = _semantic_cache(index_dir)
+        assert reloaded.lookup("Red running shoes", "product_ad", "high", "model-a|40|512x512") is not None
+        assert reloaded.lookup("Red running shoes", "product_ad", "high", "model-b|40|512x512") is None
+        assert reloaded.lookup("Red running shoes", "product_ad", "high", "model-a|20|512x512") is None
+
+
+def test_semantic_entry_is_added_once_the_write_lands():
+    class Gate:
+        def __init__(self, event):
+            self.event = event
+
+        def save(self, f, format=None, **kwargs):
+            self.event.wait(5)
+            Image.new("RGB", (4, 4)).save(f, format=format)
+
+    def fake_pipeline(prompt, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ImageWriter(num_threads=1)
+        gate = threading.Event()
+        writer.submit(Gate(gate), os.path.join(tmp, "blocker.png"))
+        cache = _semantic_cache(os.path.join(tmp, "index"))
+        generator = ImageGenerator(semantic_cache=cache, writer=writer)
+        generator.pipeline = fake_pipeline
+
+        first = generator.generate_image("red running shoe", output_dir=tmp)
+        assert cache.get_stats()["entries"] == 0
+
+        gate.set()
+        writer.flush(5)
+        second = generator.generate_image("Red running shoes", output_dir=tmp)
+        assert cache.get_stats()["entries"] == 1
+        assert second["cache_hit"] is True and second["image_path"] == first["image_path"]
+        writer.shutdown()
+
+
+def test_semantic_cache_flush_saves_pending_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        image = _write_png(tmp, "shoe.png")
+        index_dir = os.path.join(tmp, "index")
+        cache = _semantic_cache(index_dir)
+        cache.add("red running shoe", "product_ad", "high", image)
+        assert not os.path.exists(os.path.join(index_dir, "entries.json"))
+
+        cache.flush()
+        assert _semantic_cache(index_dir).lookup("Red running shoes", "product_ad", "high") is not None
+
+
+def test_pooled_generators_share_the_env_configured_semantic_cache(monkeypatch, tmp_path):
+    import app.services.output_store as output_store
+    import app.services.semantic_cache as semantic_cache
+    import app.utils.model_pool as model_pool
+
+    monkeypatch.setattr(semantic_cache, "_semantic_cache", None)
+    monkeypatch.delenv("SEMANTIC_CACHE_DIR", raising=False)
+    assert semantic_cache.get_semantic_cache() is None
+
+    monkeypatch.setenv("SEMANTIC_CACHE_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(output_store, "get_output_store", lambda: output_store.OutputStore(str(tmp_path / "store")))
+    monkeypatch.setattr(model_pool, "_result_cache", ImageResultCache(str(tmp_path / "cache")))
+    cache = semantic_cache.get_semantic_cache()
+    assert cache is semantic_cache.get_semantic_cache()
+    assert cache.index_dir == str(tmp_path / "index")
+    assert model_pool._create_model(("image", "model-a")).semantic_cache is cache
+    assert model_pool._create_model(("image", "model-b")).semantic_cache is cache
+
+
+def test_sentence_transformer_is_loaded_once_under_concurrency(monkeypatch, tmp_path):
+    import time
+    import numpy as np
+    from app.services.semantic_cache import SemanticImageCache
+
+    loads = []
+
+    class SlowSentenceTransformer:
+        def __init__(self, model_name):
+            time.sleep(0.01)  # widen the window between the check and the assignment
+            loads.append(model_name)
+
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 8), dtype="float32")
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        SimpleNamespace(SentenceTransformer=SlowSentenceTransformer))
+    cache = SemanticImageCache(str(tmp_path / "index"))
+    threads = [threading.Thread(target=cache._embed, args=(["red shoe"],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
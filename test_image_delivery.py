@@ -0,0 +1,139 @@
+"""
+Tests for the image delivery endpoints
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.main as main
+from app.services.output_store import OutputStore
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    store = OutputStore(str(tmp_path))
+    monkeypatch.setattr(main, "get_output_store", lambda: store)
+    image = Image.effect_noise((300, 200), 64).convert("RGB")
+    path = store.reserve(image, "Red shoes", style="product_ad", quality="high")
+    image.save(path)
+    store.mark_written(path)
+    return store, store.key_for_path(path), Path(path).read_bytes()
+
+
+def test_image_is_served_with_strong_etag_and_304(stored):
+    store, key, data = stored
+    client = TestClient(main.app)
+
+    resp = client.get(f"/images/{key}")
+    assert resp.status_code == 200
+    assert resp.content == data
+    assert resp.headers["etag"] == f'"{key}"'
+    assert "immutable" in resp.headers["cache-control"]
+
+    cached = client.get(f"/images/{key}", headers={"If-None-Match": f'"other", W/"{key}"'})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_range_requests(stored):
+    store, key, data = stored
+    client = TestClient(main.app)
+
+    part = client.get(f"/images/{key}", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == data[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(data)}"
+
+    tail = client.get(f"/images/{key}", headers={"Range": "bytes=-5"})
+    assert tail.content == data[-5:]
+
+    assert client.get(f"/images/{key}", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+
+
+def test_thumbnail_is_rendered_once(stored):
+    store, key, _ = stored
+    client = TestClient(main.app)
+
+    first = client.get(f"/images/{key}/thumbnail?size=128")
+    thumb = Path(store.thumbnail_path(key, 128))
+    mtime = thumb.stat().st_mtime_ns
+    second = client.get(f"/images/{key}/thumbnail?size=128")
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(first.content)).size == (128, 85)
+    assert thumb.stat().st_mtime_ns == mtime
+    assert client.get(f"/images/{key}/thumbnail?size=100").status_code == 400
+
+
+def test_unknown_images_are_404(stored):
+    client = TestClient(main.app)
+    assert client.get("/images/" + "0" * 32).status_code == 404
+    assert client.get("/images/../../etc/passwd").status_code == 404
+
+
+def test_job_result_links_to_image(stored, monkeypatch):
+    store, key, _ = stored
+    from app.services.job_queue import JobQueue
+    monkeypatch.setattr(main, "generate_image", lambda brief, style, quality, render_settings=None: store.path_for(key))
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    job_id = client.post("/result", json={"brief": "Red shoes"}).json()["job_id"]
+    queue.shutdown(wait=True)
+    result = client.get(f"/result/{job_id}").json()["result"]
+
+    assert result["image_url"] == f"/images/{key}"
+    assert client.get(result["thumbnail_url"]).status_code == 200
+
+
+def test_job_exports_are_served_from_the_store(stored, monkeypatch):
+    store, key, _ = stored
+    from app.services.job_queue import JobQueue
+    from app.utils.output_profiles import export_profiles
+
+    def fake_exports(brief, style, quality, output_profiles, render_settings=None):
+        with Image.open(store.path_for(key)) as image:
+            exports = export_profiles(image, output_profiles, store.export_dir(key), key)
+        return {"image_path": store.path_for(key), "exports": exports}
+
+    monkeypatch.setattr(main, "generate_image_exports", fake_exports)
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    job_id = client.post("/result", json={"brief": "Red shoes", "profiles": ["linkedin", "web"]}).json()["job_id"]
+    queue.shutdown(wait=True)
+    exports = client.get(f"/result/{job_id}").json()["result"]["exports"]
+
+    linkedin = client.get(exports["linkedin"]["url"])
+    assert exports["linkedin"]["url"] == f"/images/{key}/exports/linkedin"
+    assert linkedin.status_code == 200
+    assert linkedin.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(linkedin.content)).size == (1200, 627)
+    assert client.get(exports["web"]["url"]).headers["content-type"] == "image/webp"
+    assert client.get(f"/images/{key}/exports/twitter").status_code == 404
+    assert client.get(f"/images/{key}/exports/myspace").status_code == 404
+
+    store.gc(max_age_days=-1)
+    assert not Path(store.export_dir(key)).exists()
+
+
+def test_reserved_but_unwritten_image_is_404(stored):
+    store, _, _ = stored
+    client = TestClient(main.app)
+    path = store.reserve(Image.new("RGB", (8, 8), color="red"), "Lost write")
+    key = store.key_for_path(path)
+
+    assert client.get(f"/images/{key}").status_code == 404
+    assert client.get(f"/images/{key}/thumbnail").status_code == 404
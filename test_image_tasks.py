@@ -0,0 +1,136 @@
+"""
+Tests for the batched image_queue Celery task
+Task bodies are called in-process, so no broker is needed
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from PIL import Image
+
+import app.services.image_tasks as image_tasks
+from app.services.blob_store import BlobStore, FilesystemBlobStore, InMemoryBlobStore
+from app.services.image_generator import ImageGenerator
+
+
+def _generator_with_fake_pipeline(calls):
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(list(prompt))
+        if any("cursed" in p for p in prompt):
+            raise RuntimeError("NaN latents")
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    generator = ImageGenerator()
+    generator.pipeline = fake_pipeline
+    return generator
+
+
+def _apply_concurrently(prompts, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(image_tasks, "get_blob_store", lambda: InMemoryBlobStore())
+    results = [None] * len(prompts)
+
+    def run(i, prompt):
+        results[i] = image_tasks.generate_image_batched_task.run({"prompt": prompt})
+
+    threads = [threading.Thread(target=run, args=(i, p)) for i, p in enumerate(prompts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_concurrent_messages_share_one_pipeline_call(tmp_path, monkeypatch):
+    calls = []
+    generator = _generator_with_fake_pipeline(calls)
+    monkeypatch.setattr(image_tasks, "get_image_generator", lambda model_id: generator)
+    monkeypatch.setattr(image_tasks, "IMAGE_TASK_FLUSH_MS", 500)
+
+    prompts = ["Red running shoes", "Gold necklace", "Modern chair", "Chocolate cake"]
+    results = _apply_concurrently(prompts, tmp_path, monkeypatch)
+
+    assert len(calls) == 1 and len(calls[0]) == 4
+    assert [result["user_brief"] for result in results] == prompts
+    assert all(result["batch_size"] == 4 for result in results)
+
+
+def test_bad_prompt_only_fails_its_own_message(tmp_path, monkeypatch):
+    calls = []
+    generator = _generator_with_fake_pipeline(calls)
+    monkeypatch.setattr(image_tasks, "get_image_generator", lambda model_id: generator)
+    monkeypatch.setattr(image_tasks, "IMAGE_TASK_FLUSH_MS", 500)
+
+    results = _apply_concurrently(["Red running shoes", "cursed lamp", "Gold necklace"], tmp_path, monkeypatch)
+
+    assert "error" not in results[0] and "error" not in results[2]
+    assert "NaN latents" in results[1]["error"]
+    assert image_tasks._task_scheduler(generator).get_stats()["failed_batches"] == 1
+    assert len(calls) == 4  # the failed batch, then each prompt on its own
+
+
+def test_batched_task_leaves_other_renders_unbatched(tmp_path, monkeypatch):
+    calls = []
+    generator = _generator_with_fake_pipeline(calls)
+    monkeypatch.setattr(image_tasks, "get_image_generator", lambda model_id: generator)
+    monkeypatch.setattr(image_tasks, "IMAGE_TASK_FLUSH_MS", 500)
+    _apply_concurrently(["Red running shoes", "Gold necklace"], tmp_path, monkeypatch)
+
+    started = time.perf_counter()
+    result = generator.generate_image("Modern chair")
+
+    assert generator.scheduler is None
+    assert result["batch_size"] == 1 and result["queue_wait_ms"] == 0.0
+    assert time.perf_counter() - started < 0.5  # no collection window
+
+
+def test_result_carries_blob_reference_not_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = FilesystemBlobStore(str(tmp_path / "blobs"))
+    generator = _generator_with_fake_pipeline([])
+    monkeypatch.setattr(image_tasks, "get_blob_store", lambda: store)
+    monkeypatch.setattr(image_tasks, "get_image_generator", lambda: generator)
+
+    result = image_tasks.generate_image_task.run({"prompt": "Red running shoes"})
+
+    assert "image_path" not in result
+    assert result["image"]["content_type"] == "image/png"
+    data = store.get(result["image"]["key"])
+    assert data.startswith(b"\x89PNG") and len(data) == result["image"]["bytes"]
+
+
+def test_blob_store_is_content_addressed(tmp_path):
+    store = FilesystemBlobStore(str(tmp_path))
+    first = store.put(b"same bytes")
+    assert store.put(b"same bytes") == first
+    assert store.put(b"other bytes")["key"] != first["key"]
+    store.delete(first["key"])
+    assert not store.exists(first["key"])
+
+
+def test_incomplete_blob_store_cannot_be_created():
+    class WriteOnlyStore(BlobStore):
+        def _write(self, key, data):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnlyStore()
+
+
+def test_results_use_binary_serializer():
+    from kombu.serialization import dumps, loads
+    from app.celery_worker import celery_app
+
+    assert celery_app.conf.result_serializer == "ormsgpack"
+    assert celery_app.conf.result_expires > 0
+    payload = {"image": {"key": "ab12.png", "bytes": 1234}, "batch_size": 4, "queue_wait_ms": 1.5}
+    content_type, encoding, body = dumps(payload, serializer="ormsgpack")
+    assert isinstance(body, bytes) and len(body) < len(str(payload))
+    assert loads(body, content_type, encoding) == payload
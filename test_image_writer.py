@@ -0,0 +1,127 @@
+"""
+Tests for the background image writer
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from PIL import Image
+
+from app.services.image_cache import ImageResultCache
+from app.services.image_generator import ImageGenerator
+from app.services.image_writer import ImageWriter
+
+
+class GatedImage:
+    """Image stand-in whose save blocks until the gate opens"""
+
+    def __init__(self, gate):
+        self.gate = gate
+
+    def save(self, f, format=None, **kwargs):
+        self.gate.wait(5)
+        Image.new("RGB", (4, 4)).save(f, format=format)
+
+
+def test_write_is_atomic_and_waitable(tmp_path):
+    writer = ImageWriter(num_threads=1)
+    gate = threading.Event()
+    path = str(tmp_path / "out" / "render.png")
+
+    handle = writer.submit(GatedImage(gate), path)
+
+    assert not handle.done()
+    assert not Path(path).exists()
+    gate.set()
+    assert writer.wait(path, timeout=5) == path
+    assert handle.wait(5) == path
+    with Image.open(path) as image:
+        assert image.format == "PNG"
+    assert [p.name for p in (tmp_path / "out").iterdir()] == ["render.png"]
+    assert writer.get_stats()["written"] == 1
+    writer.shutdown()
+
+
+def test_full_queue_applies_backpressure(tmp_path):
+    writer = ImageWriter(num_threads=1, max_pending=1)
+    gate = threading.Event()
+    writer.submit(GatedImage(gate), str(tmp_path / "a.png"))
+    writer.submit(GatedImage(gate), str(tmp_path / "b.png"))
+
+    third = threading.Thread(target=writer.submit, args=(GatedImage(gate), str(tmp_path / "c.png")))
+    third.start()
+    third.join(0.2)
+    assert third.is_alive()
+
+    gate.set()
+    third.join(5)
+    assert writer.flush(timeout=5)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.png", "b.png", "c.png"]
+    writer.shutdown()
+
+
+def test_failed_write_surfaces_on_wait(tmp_path):
+    writer = ImageWriter(num_threads=1)
+    handle = writer.submit(Image.new("RGB", (4, 4)), str(tmp_path / "render.unknownext"), format="NOPE")
+
+    with pytest.raises(Exception):
+        handle.wait(5)
+    assert writer.get_stats()["failed"] == 1
+    assert list(tmp_path.iterdir()) == []
+    writer.shutdown()
+
+
+def test_shutdown_flushes_and_rejects_new_writes(tmp_path):
+    writer = ImageWriter(num_threads=2)
+    paths = [str(tmp_path / f"{i}.png") for i in range(10)]
+    for path in paths:
+        writer.submit(Image.new("RGB", (64, 64)), path)
+
+    assert writer.shutdown(timeout=10)
+    assert all(Path(path).exists() for path in paths)
+    with pytest.raises(RuntimeError):
+        writer.submit(Image.new("RGB", (4, 4)), str(tmp_path / "late.png"))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_writer_created_before_fork_works_in_child(tmp_path):
+    writer = ImageWriter(num_threads=1)
+    writer.submit(Image.new("RGB", (4, 4)), str(tmp_path / "parent.png")).wait(5)
+    path = str(tmp_path / "child.png")
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            writer.submit(Image.new("RGB", (4, 4)), path).wait(5)
+            os._exit(0)
+        except BaseException:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert Path(path).exists()
+    writer.shutdown()
+
+
+def test_generator_caches_render_once_write_lands(tmp_path):
+    def fake_pipeline(prompt, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    writer = ImageWriter(num_threads=1)
+    generator = ImageGenerator(result_cache=ImageResultCache(str(tmp_path / "cache")), writer=writer)
+    generator.pipeline = fake_pipeline
+
+    first = generator.generate_image("Red running shoes", output_dir=str(tmp_path))
+    writer.wait(first["image_path"], timeout=5)
+    second = generator.generate_image("Red running shoes", output_dir=str(tmp_path))
+
+    assert Path(first["image_path"]).exists()
+    assert second["cache_hit"] is True
+    writer.shutdown()
@@ -0,0 +1,107 @@
+"""
+Tests for the non-blocking /result job API
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.services.job_queue import JobQueue, QueueFullError
+from app.services.output_store import OutputStore
+
+
+@pytest.fixture(autouse=True)
+def output_store(tmp_path, monkeypatch):
+    """Keep the store index the job body opens out of the working tree"""
+    store = OutputStore(str(tmp_path / "store"))
+    monkeypatch.setattr(main, "get_output_store", lambda: store)
+    return store
+
+
+def _wait_for(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/result/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_lifecycle(monkeypatch):
+    """Submission returns 202 with a job id; the job later reports its result"""
+    monkeypatch.setattr(main, "generate_image", lambda brief, style, quality, render_settings=None: f"/tmp/{brief}.png")
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    resp = client.post("/result", json={"brief": "Red running shoes"})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    job = _wait_for(client, job_id)
+    assert job["status"] == "done"
+    assert job["result"]["image_path"] == "/tmp/Red running shoes.png"
+    assert job["result"]["style"] == "product_ad"
+
+
+def test_failed_job_reports_error(monkeypatch):
+    """Exceptions inside the generator surface as a failed job"""
+    def broken(brief, style, quality, render_settings=None):
+        raise RuntimeError("model exploded")
+
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "generate_image", broken)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    job = _wait_for(client, client.post("/result", json={"brief": "x"}).json()["job_id"])
+    assert job["status"] == "failed"
+    assert "model exploded" in job["error"]
+
+
+def test_unknown_job_is_404():
+    client = TestClient(main.app)
+    assert client.get("/result/does-not-exist").status_code == 404
+
+
+def test_full_queue_returns_429(monkeypatch):
+    """Once workers and pending slots are taken, new jobs are rejected with Retry-After"""
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_pending=1)
+    monkeypatch.setattr(main, "generate_image", lambda brief, style, quality, render_settings=None: release.wait(5))
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    try:
+        assert client.post("/result", json={"brief": "a"}).status_code == 202
+        assert client.post("/result", json={"brief": "b"}).status_code == 202
+        resp = client.post("/result", json={"brief": "c"})
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+    finally:
+        release.set()
+        queue.shutdown()
+    assert queue.depth() == 0
+
+
+def test_queue_rejects_beyond_capacity():
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_pending=0)
+    queue.submit(release.wait, 5)
+    try:
+        queue.submit(release.wait, 5)
+        assert False, "expected QueueFullError"
+    except QueueFullError as e:
+        assert e.retry_after >= 1
+    finally:
+        release.set()
+        queue.shutdown()
@@ -0,0 +1,91 @@
+"""
+Tests for the metrics registry and the /metrics endpoint
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.main as main
+import app.utils.metrics as metrics_module
+from app.services.image_generator import ImageGenerator
+from app.utils.metrics import MetricsRegistry, NoopRegistry, stage_timer
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "_metrics", registry)
+    return registry
+
+
+def test_text_format(registry):
+    registry.counter("requests", "Requests", ("outcome",)).labels("ok").inc(3)
+    registry.gauge("depth", "Depth").set(2)
+    histogram = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.labels(stage='say "hi"').observe(value)
+    registry.register_callback("loaded", "Loaded", lambda: {"sd": 1}, ("model",))
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{outcome="ok"} 3' in text
+    assert "depth 2" in text
+    assert 'latency_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="say \\"hi\\"",le="1"} 2' in text
+    assert 'latency_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="say \\"hi\\""} 3' in text
+    assert 'loaded{model="sd"} 1' in text
+
+
+def test_disabled_metrics_are_noops(monkeypatch):
+    monkeypatch.setattr(metrics_module, "_metrics", None)
+    monkeypatch.delenv("METRICS_ENABLED", raising=False)
+
+    registry = metrics_module.get_metrics()
+    assert isinstance(registry, NoopRegistry)
+    with stage_timer("image", "denoise"):
+        registry.counter("x").labels("a").inc()
+    assert registry.render() == ""
+    assert TestClient(main.app).get("/metrics").status_code == 404
+
+
+def test_generator_records_stages_and_steps(registry):
+    def fake_pipeline(prompt, num_inference_steps, callback_on_step_end=None, **kwargs):
+        for step in range(num_inference_steps):
+            callback_on_step_end(None, step, step, {})
+        return SimpleNamespace(images=[Image.new("RGB", (8, 8)) for _ in prompt])
+
+    generator = ImageGenerator()
+    generator.pipeline = fake_pipeline
+    generator._run_pipeline(["a", "b"], 8, 8, 5, 7.5)
+    generator.generate_image("Red shoes", num_inference_steps=3, output_dir="/tmp/metrics_test")
+
+    text = registry.render()
+    assert 'stage_duration_seconds_count{component="image",stage="denoise"} 2' in text
+    assert 'stage_duration_seconds_count{component="image",stage="decode"} 2' in text
+    assert 'stage_duration_seconds_count{component="image",stage="prompt_enhance"} 1' in text
+    assert "diffusion_steps_total 13" in text
+    assert 'image_requests_total{outcome="rendered"} 1' in text
+    assert "image_requests_in_flight 0" in text
+
+
+def test_metrics_endpoint(registry):
+    main._register_metrics()
+    with stage_timer("week4", "generate"):
+        pass
+
+    resp = TestClient(main.app).get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "job_queue_depth " in resp.text
+    assert 'stage_duration_seconds_count{component="week4",stage="generate"} 1' in resp.text
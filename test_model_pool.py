@@ -0,0 +1,86 @@
+"""
+Tests for the memory-budgeted model pool
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.utils.model_pool import ModelPool
+from benchmarks.tiny_models import build_tiny_llm
+
+
+class FakeModel:
+    """Model wrapper whose weights weigh a fixed number of bytes"""
+
+    def __init__(self, name, size=100):
+        self.name = name
+        self.size = size
+        self.loaded = False
+        self.loads = 0
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.loaded = True
+            self.loads += 1
+        return True
+
+    def unload_model(self):
+        self.loaded = False
+
+    def memory_bytes(self):
+        return self.size if self.loaded else 0
+
+
+def test_least_recently_used_model_is_evicted():
+    pool = ModelPool(FakeModel, max_bytes=250)
+    a = pool.get("brand-a")
+    pool.get("brand-b")
+    pool.get("brand-a")  # "brand-b" is now least recently used
+    pool.get("brand-c")
+
+    stats = pool.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["memory_bytes"] == 200
+    assert stats["models"]["brand-b"]["loaded"] is False
+    assert a.loaded and a.loads == 1
+
+
+def test_pinned_model_is_never_evicted():
+    pool = ModelPool(FakeModel, max_bytes=150)
+    with pool.checkout("brand-a") as a:
+        b = pool.get("brand-b")
+        assert a.loaded  # pinned, so the pool goes over budget instead
+        assert pool.get_stats()["models"]["brand-a"]["in_use"] == 1
+    # Once "brand-a" is released the idle model makes room for it
+    assert a.loaded and not b.loaded
+    assert pool.memory_bytes() <= 150
+
+
+def test_evicted_model_reloads_on_next_pin():
+    pool = ModelPool(FakeModel, max_bytes=100)
+    a = pool.get("brand-a")
+    pool.get("brand-b")
+    assert not a.loaded
+
+    with pool.pin(a):
+        assert a.loaded and a.loads == 2
+    assert pool.get_stats()["loads"] == 3
+
+
+def test_unpooled_instances_pass_through():
+    pool = ModelPool(FakeModel, max_bytes=100)
+    outsider = FakeModel("outsider")
+    with pool.pin(outsider) as model:
+        assert model is outsider
+    assert not outsider.loaded
+
+
+def test_llm_memory_estimate_counts_weights():
+    llm = build_tiny_llm()
+    params = sum(p.numel() * p.element_size() for p in llm.model.parameters())
+    assert llm.memory_bytes() >= params
+    llm.unload_model()
+    assert llm.memory_bytes() == 0
@@ -0,0 +1,109 @@
+"""
+Tests for eager model loading and the readiness endpoint
+"""
+
+import contextlib
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+import app.services.caption_generator as caption_generator
+import app.services.image_generator as image_generator
+import app.utils.model_pool as model_pool
+from app.services.model_warmup import ModelWarmup, _warm_image, _warm_llm
+
+
+def _noop():
+    pass
+
+
+def _fail():
+    raise RuntimeError("checkpoint missing")
+
+
+def test_models_are_loaded_and_timed_in_order():
+    order = []
+    warmers = {
+        "llm": (lambda: order.append("llm load"), lambda: order.append("llm warm")),
+        "image": (lambda: order.append("image load"), lambda: order.append("image warm"))
+    }
+    warmup = ModelWarmup(["llm", "image"], warmers)
+    assert not warmup.is_ready()
+
+    warmup.start()
+    assert warmup.wait(timeout=5)
+    assert order == ["llm load", "llm warm", "image load", "image warm"]
+    for status in warmup.get_status()["models"].values():
+        assert status["status"] == "ready"
+        assert status["load_s"] >= 0 and status["warmup_s"] >= 0
+
+
+def test_failed_or_unknown_model_is_never_ready():
+    warmup = ModelWarmup(["llm", "video"], {"llm": (_fail, _noop)})
+    warmup.run()
+
+    status = warmup.get_status()
+    assert status["ready"] is False
+    assert status["models"]["llm"] == {"status": "failed", "load_s": None, "warmup_s": None,
+                                       "error": "checkpoint missing"}
+    assert status["models"]["video"]["error"] == "Unknown model: video"
+
+
+def test_ready_endpoint_flips_after_warmup(monkeypatch):
+    release = threading.Event()
+    warmup = ModelWarmup(["llm"], {"llm": (_noop, release.wait)})
+    monkeypatch.setattr(main, "get_model_warmup", lambda: warmup)
+
+    with TestClient(main.app) as client:  # runs the startup hook
+        assert client.get("/health").status_code == 200
+        resp = client.get("/health/ready")
+        assert resp.status_code == 503
+        assert resp.json()["ready"] is False
+
+        release.set()
+        warmup.wait(timeout=5)
+        resp = client.get("/health/ready")
+        assert resp.status_code == 200
+        assert resp.json()["models"]["llm"]["status"] == "ready"
+
+
+def test_llm_warmup_runs_inside_a_pin(monkeypatch):
+    events = []
+
+    class FakeLLM:
+        def generate_batch(self, prompts, max_length):
+            events.append("generate")
+            return [["caption"]]
+
+    @contextlib.contextmanager
+    def pin(instance):
+        events.append("pin")
+        yield instance
+        events.append("unpin")
+
+    generator = SimpleNamespace(engine=None, llm=FakeLLM(), initialize=lambda: None)
+    monkeypatch.setattr(caption_generator, "get_caption_generator", lambda: generator)
+    monkeypatch.setattr(model_pool, "get_model_pool", lambda: SimpleNamespace(pin=pin))
+
+    _warm_llm()
+    assert events == ["pin", "generate", "unpin"]
+
+
+def test_image_warmup_uses_public_warm_up(monkeypatch):
+    calls = []
+
+    class FakeGenerator:
+        def warm_up(self, size, steps):
+            calls.append((size, steps))
+
+    monkeypatch.setattr(image_generator, "get_image_generator", lambda: FakeGenerator())
+    monkeypatch.setenv("WARMUP_IMAGE_SIZE", "64")
+    _warm_image()
+    assert calls == [(64, 2)]
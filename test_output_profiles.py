@@ -0,0 +1,159 @@
+"""
+Tests for multi-platform export from a single render
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+import app.services.week4_image_generator as week4
+import app.utils.output_profiles as output_profiles
+from app.services.image_cache import ImageResultCache
+from app.services.image_generator import ImageGenerator
+from app.services.image_writer import ImageWriter
+from app.services.output_store import OutputStore
+from app.utils.output_profiles import PLATFORM_PROFILES, OutputProfile, export_profiles
+
+
+def test_every_profile_is_exported_with_its_size_and_format(tmp_path):
+    render = Image.new("RGB", (512, 512), color="red")
+    profiles = ["instagram_square", "instagram_story", "twitter", "linkedin",
+                OutputProfile("thumb", 128, 128, fit="pad", format="png")]
+
+    exports = export_profiles(render, profiles, str(tmp_path), "shoes")
+
+    assert list(exports) == ["instagram_square", "instagram_story", "twitter", "linkedin", "thumb"]
+    for name, export in exports.items():
+        with Image.open(export["path"]) as image:
+            assert image.size == (export["width"], export["height"])
+            assert image.format == export["format"]
+    assert exports["thumb"]["path"].endswith("shoes_thumb.png")
+    assert exports["twitter"]["width"] == PLATFORM_PROFILES["twitter"].width
+
+
+def test_pad_keeps_whole_render_and_crop_fills_frame(tmp_path):
+    render = Image.new("RGB", (512, 512), color="black")
+    profiles = [OutputProfile("pad", 90, 160, fit="pad", format="PNG"),
+                OutputProfile("crop", 90, 160, fit="crop", format="PNG")]
+
+    exports = export_profiles(render, profiles, str(tmp_path), "x")
+
+    with Image.open(exports["pad"]["path"]) as padded:
+        assert padded.getpixel((45, 0)) == (255, 255, 255)
+        assert padded.getpixel((45, 80)) == (0, 0, 0)
+    with Image.open(exports["crop"]["path"]) as cropped:
+        assert cropped.getpixel((45, 0)) == (0, 0, 0)
+
+
+def test_invalid_profiles_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        OutputProfile("bad", 10, 10, format="GIF")
+    with pytest.raises(ValueError):
+        export_profiles(Image.new("RGB", (8, 8)), ["myspace"], str(tmp_path), "x")
+
+
+def test_week4_exports_from_in_memory_render(tmp_path, monkeypatch):
+    store = OutputStore(str(tmp_path / "store"))
+    monkeypatch.setattr(week4, "get_output_store", lambda: store)
+    opened = []
+    monkeypatch.setattr(week4.Image, "open", lambda *a, **k: opened.append(a))
+
+    result = week4.generate_image_exports("Red shoes", output_profiles=["linkedin", "twitter"])
+
+    key = store.key_for_path(result["image_path"])
+    assert sorted(result["exports"]) == ["linkedin", "twitter"]
+    assert result["exports"]["linkedin"]["path"] == store.export_path(key, "linkedin", ".jpg")
+    assert Path(result["exports"]["linkedin"]["path"]).exists()
+    assert opened == []
+
+
+def test_generator_exports_fresh_renders_and_cache_hits(tmp_path):
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(prompt)
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64)) for _ in prompt])
+
+    generator = ImageGenerator(result_cache=ImageResultCache(str(tmp_path / "cache")))
+    generator.pipeline = fake_pipeline
+
+    first = generator.generate_image("Red running shoes", output_dir=str(tmp_path),
+                                     output_profiles=["instagram_square", "twitter"])
+    second = generator.generate_image("Red running shoes", output_dir=str(tmp_path),
+                                      output_profiles=["linkedin"])
+
+    assert len(calls) == 1
+    assert sorted(first["exports"]) == ["instagram_square", "twitter"]
+    assert second["cache_hit"] is True
+    assert os.path.exists(second["exports"]["linkedin"]["path"])
+    assert "exports" not in generator.generate_image("Red running shoes", output_dir=str(tmp_path))
+
+
+def test_encode_pool_is_created_once_under_concurrency(monkeypatch):
+    monkeypatch.setattr(output_profiles, "_encode_pool", None)
+    created = []
+    real_pool = output_profiles.ThreadPoolExecutor
+
+    def slow_pool(*args, **kwargs):
+        time.sleep(0.01)  # widen the window between the check and the assignment
+        created.append(real_pool(*args, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(output_profiles, "ThreadPoolExecutor", slow_pool)
+    threads = [threading.Thread(target=output_profiles._get_encode_pool) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    created[0].shutdown()
+
+
+def test_generator_with_output_store_exports_into_the_store(tmp_path):
+    def fake_pipeline(prompt, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64), color="teal") for _ in prompt])
+
+    store = OutputStore(str(tmp_path / "store"))
+    writer = ImageWriter(num_threads=1)
+    generator = ImageGenerator(writer=writer, output_store=store)
+    generator.pipeline = fake_pipeline
+
+    result = generator.generate_image("Teal scarf", output_dir=str(tmp_path / "flat"),
+                                      output_profiles=["linkedin"])
+    writer.wait(result["image_path"], timeout=5)
+    key = store.key_for_path(result["image_path"])
+
+    assert result["exports"]["linkedin"]["path"] == store.export_path(key, "linkedin", ".jpg")
+    assert not (tmp_path / "flat").exists()
+    store.gc(max_age_days=-1)
+    assert not os.path.exists(result["exports"]["linkedin"]["path"])
+    writer.shutdown()
+
+
+def test_exports_replace_existing_files_atomically(tmp_path, monkeypatch):
+    replaced = []
+    real_replace = os.replace
+
+    def spy_replace(src, dst):
+        # The finished file is complete before it takes the served name
+        with Image.open(src) as image:
+            image.load()
+        replaced.append(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(output_profiles.os, "replace", spy_replace)
+    exports = export_profiles(Image.new("RGB", (64, 64)), ["linkedin", "web"], str(tmp_path), "x")
+
+    assert sorted(replaced) == sorted(export["path"] for export in exports.values())
+    assert sorted(os.listdir(tmp_path)) == ["x_linkedin.jpg", "x_web.webp"]
@@ -0,0 +1,123 @@
+"""
+Tests for the content-addressed output store
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image
+
+from app.services.image_generator import ImageGenerator
+from app.services.image_writer import ImageWriter
+from app.services.output_store import ImageRecord, OutputStore
+
+
+def _store_image(store, color, brief="Red shoes", style="product_ad", size=32):
+    image = Image.new("RGB", (size, size), color=color)
+    path = store.reserve(image, brief, f"{brief}, studio", style, "high", {"num_inference_steps": 20})
+    image.save(path)
+    store.mark_written(path)
+    return path
+
+
+def _age(store, path, days):
+    key = os.path.basename(path)[:-4]
+    with store._session.begin() as session:
+        session.get(ImageRecord, key).created_at = datetime.now() - timedelta(days=days)
+
+
+def test_paths_are_sharded_by_content(tmp_path):
+    store = OutputStore(str(tmp_path))
+    red = _store_image(store, "red")
+    again = _store_image(store, "red", brief="Crimson shoes")
+    blue = _store_image(store, "blue")
+
+    key = os.path.basename(red)[:-4]
+    assert red == again
+    assert red != blue
+    assert red == os.path.join(str(tmp_path), key[:2], key[2:4], key + ".png")
+    assert store.get(key)["brief"] == "Red shoes"
+    assert store.get(key)["params"] == {"num_inference_steps": 20}
+    assert store.get_stats()["images"] == 2
+
+
+def test_concurrent_reserve_of_identical_render(tmp_path):
+    store = OutputStore(str(tmp_path))
+    errors = []
+
+    def reserve(image, barrier, paths, i):
+        barrier.wait()
+        try:
+            paths.append(store.reserve(image, f"Red shoes {i}", style="product_ad"))
+        except Exception as e:
+            errors.append(e)
+
+    for shade in range(10):
+        image = Image.new("RGB", (32, 32), color=(shade, 0, 0))
+        barrier = threading.Barrier(4)
+        paths = []
+        threads = [threading.Thread(target=reserve, args=(image, barrier, paths, i)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(paths)) == 1
+
+    assert errors == []
+    assert store.get_stats()["images"] == 10
+
+
+def test_lookup_by_brief_style_and_date(tmp_path):
+    store = OutputStore(str(tmp_path))
+    old = _store_image(store, "red")
+    _store_image(store, "green")
+    _store_image(store, "blue", brief="Blue bag", style="luxury")
+    _age(store, old, 10)
+
+    assert len(store.find(brief="Red shoes")) == 2
+    assert [r["brief"] for r in store.find(style="luxury")] == ["Blue bag"]
+    recent = store.find(brief="Red shoes", since=datetime.now() - timedelta(days=1))
+    assert len(recent) == 1 and recent[0]["path"] != old
+    assert store.find(until=datetime.now() - timedelta(days=5))[0]["path"] == old
+
+
+def test_gc_enforces_age_then_size(tmp_path):
+    store = OutputStore(str(tmp_path))
+    paths = [_store_image(store, color, size=64) for color in ("red", "green", "blue", "white")]
+    for days, path in zip((30, 3, 2, 1), paths):
+        _age(store, path, days)
+
+    assert store.gc(max_age_days=7)["removed"] == 1
+    assert not os.path.exists(paths[0])
+
+    one_file = os.path.getsize(paths[3])
+    stats = store.gc(max_total_bytes=one_file)
+    assert stats["removed"] == 2
+    assert [os.path.exists(p) for p in paths[1:]] == [False, False, True]
+    assert store.get_stats()["total_bytes"] == one_file
+
+
+def test_generator_saves_into_store(tmp_path):
+    def fake_pipeline(prompt, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (64, 64), color="purple") for _ in prompt])
+
+    store = OutputStore(str(tmp_path / "store"))
+    writer = ImageWriter(num_threads=1)
+    generator = ImageGenerator(writer=writer, output_store=store)
+    generator.pipeline = fake_pipeline
+
+    result = generator.generate_image("Purple hat", style="vibrant", output_dir=str(tmp_path / "unused"))
+    writer.wait(result["image_path"], timeout=5)
+
+    record = store.find(brief="Purple hat", style="vibrant")[0]
+    assert record["path"] == result["image_path"]
+    assert record["size_bytes"] == os.path.getsize(result["image_path"])
+    assert record["params"]["image_size"] == "64x64"
+    writer.shutdown()
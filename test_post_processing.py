@@ -0,0 +1,54 @@
+"""
+Tests for the post-processing stage pipeline
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from PIL import Image
+
+import app.services.week4_image_generator as week4
+from app.services.output_store import OutputStore
+from app.utils.post_processing import PostProcessor, Stage, load_font, resize, watermark
+
+
+def test_stages_pass_images_and_arrays_through():
+    invert = Stage("invert", lambda array: 255 - array, accepts="array")
+    processor = PostProcessor([resize(32, 32), invert, watermark("hi", font_size=8)])
+
+    image, timings = processor.run(Image.new("RGB", (16, 16), color="black"))
+
+    assert image.size == (32, 32)
+    assert image.getpixel((31, 31)) == (255, 255, 255)
+    assert list(timings) == ["resize", "invert", "watermark"]
+    assert processor.get_stats()["invert"]["runs"] == 1
+
+
+def test_array_input_is_accepted():
+    image, _ = PostProcessor([resize(8, 8)]).run(np.zeros((4, 4, 3), dtype=np.uint8))
+    assert image.size == (8, 8)
+
+
+def test_font_is_loaded_once():
+    load_font.cache_clear()
+    for _ in range(3):
+        watermark("brand", font_size=12)(Image.new("RGB", (64, 64)))
+    assert load_font.cache_info().misses == 1
+
+
+def test_week4_skips_png_round_trip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(week4, "get_output_store", lambda: OutputStore(str(tmp_path / "store")))
+    opened = []
+    monkeypatch.setattr(week4.Image, "open", lambda *a, **k: opened.append(a) or Image.new("RGB", (1, 1)))
+
+    path = week4.generate_image("Red running shoes")
+
+    week4.get_image_writer().wait(path)
+    assert opened == []
+    assert (tmp_path / path).exists()
+    assert week4.get_postprocess_stats()["resize"]["runs"] >= 1
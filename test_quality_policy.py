@@ -0,0 +1,153 @@
+"""
+Tests for the load-adaptive quality policy
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.main as main
+from app.services.image_generator import ImageGenerator
+from app.services.job_queue import JobQueue
+from app.services.output_store import OutputStore
+from app.services.quality_policy import DEFAULT_TIER_SETTINGS, QualityPolicy
+
+
+@pytest.fixture(autouse=True)
+def output_store(tmp_path, monkeypatch):
+    """Keep the store index the job body opens out of the working tree"""
+    store = OutputStore(str(tmp_path / "store"))
+    monkeypatch.setattr(main, "get_output_store", lambda: store)
+    return store
+
+
+def _policy_with_latency(seconds, tier="high", **kwargs):
+    policy = QualityPolicy(**kwargs)
+    for _ in range(10):
+        policy.record(tier, seconds)
+    return policy
+
+
+def test_tiers_map_to_steps_and_resolution():
+    policy = QualityPolicy()
+    for tier, settings in DEFAULT_TIER_SETTINGS.items():
+        plan = policy.plan(tier, queue_depth=100)
+        assert plan["quality"] == tier and not plan["degraded"]
+        assert plan["num_inference_steps"] == settings["num_inference_steps"]
+        assert plan["height"] == settings["height"]
+    assert policy.plan("bogus")["quality"] == "high"
+
+
+def test_steps_down_under_queue_pressure():
+    policy = _policy_with_latency(10.0, p95_target_s=30.0, concurrency=2)
+
+    assert policy.plan("high", queue_depth=2)["quality"] == "high"   # 10s * (1 + 2/2) = 20s
+    plan = policy.plan("high", queue_depth=6)                         # 40s for high, 25s for medium
+    assert plan == {"requested_quality": "high", "quality": "medium", "degraded": True,
+                    **DEFAULT_TIER_SETTINGS["medium"]}
+    assert policy.get_stats()["degraded"] == 1
+
+
+def test_never_goes_below_lowest_tier():
+    policy = _policy_with_latency(100.0, p95_target_s=1.0)
+    assert policy.plan("ultra", queue_depth=50)["quality"] == "low"
+
+
+def test_unknown_latency_does_not_degrade():
+    policy = QualityPolicy(p95_target_s=0.001)
+    assert policy.plan("ultra", queue_depth=50)["quality"] == "ultra"
+
+
+def test_generator_reports_served_tier(tmp_path):
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(images=[Image.new("RGB", (kwargs["width"], kwargs["height"])) for _ in prompt])
+
+    generator = ImageGenerator(quality_policy=_policy_with_latency(60.0, p95_target_s=30.0))
+    generator.pipeline = fake_pipeline
+    result = generator.generate_image("Red running shoes", quality="high", output_dir=str(tmp_path))
+
+    assert result["quality"] == "low"
+    assert result["requested_quality"] == "high" and result["quality_degraded"] is True
+    assert result["image_size"] == "384x384"
+    assert calls[0]["num_inference_steps"] == DEFAULT_TIER_SETTINGS["low"]["num_inference_steps"]
+
+
+def test_generator_without_result_cache_records_latency(tmp_path):
+    def fake_pipeline(prompt, **kwargs):
+        return SimpleNamespace(images=[Image.new("RGB", (kwargs["width"], kwargs["height"])) for _ in prompt])
+
+    policy = QualityPolicy(p95_target_s=1.0)
+    generator = ImageGenerator(quality_policy=policy)
+    generator.pipeline = fake_pipeline
+    for i in range(3):
+        generator.generate_image(f"Red running shoes {i}", quality="medium", output_dir=str(tmp_path))
+
+    assert policy.get_stats()["p95_s"]["medium"] is not None
+
+
+def test_scheduled_batch_uses_served_tier_resolution(tmp_path):
+    calls = []
+
+    def fake_pipeline(prompt, **kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(images=[Image.new("RGB", (kwargs["width"], kwargs["height"])) for _ in prompt])
+
+    generator = ImageGenerator(max_batch_size=4, quality_policy=QualityPolicy())
+    generator.pipeline = fake_pipeline
+    results = generator.batch_generate_images(["Red shoes", "Blue bag"], quality="low", output_dir=str(tmp_path))
+
+    low = DEFAULT_TIER_SETTINGS["low"]
+    assert calls and all(call["height"] == low["height"] and call["width"] == low["width"] for call in calls)
+    assert [r["image_size"] for r in results] == [f"{low['width']}x{low['height']}"] * 2
+    assert all(r["quality"] == "low" and r["quality_degraded"] is False for r in results)
+
+
+def test_job_result_reports_served_tier(monkeypatch):
+    monkeypatch.setattr(main, "generate_image", lambda brief, style, quality, render_settings=None: f"/tmp/{quality}.png")
+    monkeypatch.setattr(main, "get_quality_policy", lambda: _policy_with_latency(1.0, "ultra", p95_target_s=0.5))
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    job_id = client.post("/result", json={"brief": "Red running shoes", "quality": "ultra"}).json()["job_id"]
+    queue.shutdown(wait=True)
+    result = client.get(f"/result/{job_id}").json()["result"]
+
+    assert result["requested_quality"] == "ultra"
+    assert result["quality"] != "ultra" and result["quality_degraded"] is True
+    assert result["image_path"] == f"/tmp/{result['quality']}.png"
+
+
+def test_degraded_job_renders_with_the_served_tier_settings(monkeypatch, output_store):
+    import app.services.week4_image_generator as week4
+
+    calls = []
+
+    class RecordingModel:
+        def generate(self, prompt, **settings):
+            calls.append(settings)
+            return Image.new("RGB", (settings["width"], settings["height"]))
+
+    monkeypatch.setattr(week4, "model", RecordingModel())
+    monkeypatch.setattr(week4, "get_output_store", lambda: output_store)
+    monkeypatch.setattr(main, "get_quality_policy", lambda: _policy_with_latency(1.0, "ultra", p95_target_s=0.5))
+    queue = JobQueue(max_workers=1)
+    monkeypatch.setattr(main, "get_job_queue", lambda: queue)
+    client = TestClient(main.app)
+
+    job_id = client.post("/result", json={"brief": "Red running shoes", "quality": "ultra"}).json()["job_id"]
+    queue.shutdown(wait=True)
+    result = client.get(f"/result/{job_id}").json()["result"]
+
+    assert result["quality_degraded"] is True
+    assert calls == [DEFAULT_TIER_SETTINGS[result["quality"]]]
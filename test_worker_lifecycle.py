@@ -0,0 +1,92 @@
+"""
+Tests for the Celery worker preload and recycling hooks
+Signals are sent in-process, so no broker or worker is needed
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pytest
+from celery.signals import worker_init, worker_process_init
+
+import app.services.worker_lifecycle as lifecycle
+
+
+def test_settings_from_environment(monkeypatch):
+    monkeypatch.setenv("WORKER_PRELOAD_MODE", "parent")
+    monkeypatch.setenv("WORKER_PRELOAD_MODELS", "image, llm")
+    monkeypatch.setenv("CELERY_MAX_TASKS_PER_CHILD", "200")
+    monkeypatch.setenv("CELERY_MAX_MEMORY_PER_CHILD_MB", "6144")
+
+    settings = lifecycle.worker_settings()
+    assert settings["models"] == ["image", "llm"]
+    assert settings["max_tasks_per_child"] == 200
+    assert settings["max_memory_per_child_kb"] == 6144 * 1024
+
+    monkeypatch.delenv("WORKER_PRELOAD_MODELS")
+    assert lifecycle.worker_settings()["models"] is None
+
+    monkeypatch.setenv("WORKER_PRELOAD_MODE", "eager")
+    with pytest.raises(ValueError):
+        lifecycle.worker_settings()
+
+
+@pytest.mark.parametrize("mode, signal, stage", [
+    ("parent", worker_init, "parent (before fork)"),
+    ("child", worker_process_init, "child"),
+])
+def test_models_load_at_the_configured_hook(monkeypatch, mode, signal, stage):
+    calls = []
+    monkeypatch.setattr(lifecycle, "preload_models", lambda models, stage: calls.append((models, stage)))
+    monkeypatch.setenv("WORKER_PRELOAD_MODE", mode)
+    monkeypatch.setenv("WORKER_PRELOAD_MODELS", "image, llm")
+    app = SimpleNamespace(conf=SimpleNamespace())
+    receivers = list(signal.receivers or [])
+
+    settings = lifecycle.configure_worker(app)
+    try:
+        signal.send(sender=None)
+    finally:
+        signal.receivers = receivers
+
+    assert (["image", "llm"], stage) in calls
+    assert app.conf.worker_proc_alive_timeout >= 60
+
+
+@pytest.mark.parametrize("consume_from, models", [
+    (["caption_queue"], ["llm"]),
+    (["image_queue"], ["image"]),
+    (["image_queue", "caption_queue"], ["image", "llm"]),
+    (["celery"], ["image"]),
+])
+def test_models_default_to_the_consumed_queues(monkeypatch, consume_from, models):
+    calls = []
+    monkeypatch.setattr(lifecycle, "preload_models", lambda models, stage: calls.append(models))
+    monkeypatch.setenv("WORKER_PRELOAD_MODE", "child")
+    monkeypatch.delenv("WORKER_PRELOAD_MODELS", raising=False)
+    # -Q is parsed after configure_worker runs, so the selection is only set afterwards
+    queues = SimpleNamespace(consume_from=None)
+    app = SimpleNamespace(conf=SimpleNamespace(), amqp=SimpleNamespace(queues=queues))
+    receivers = list(worker_process_init.receivers or [])
+    worker_process_init.receivers = []  # only this app's hook, not app.celery_worker's
+
+    lifecycle.configure_worker(app)
+    queues.consume_from = {name: None for name in consume_from}
+    try:
+        worker_process_init.send(sender=None)
+    finally:
+        worker_process_init.receivers = receivers
+
+    assert calls == [models]
+
+
+def test_preload_logs_per_process_timings(capsys):
+    warmers = {"image": (lambda: None, lambda: None)}
+    status = lifecycle.preload_models(["image"], "child", warmers)
+
+    assert status["ready"] is True
+    assert "child: image loaded in" in capsys.readouterr().out